@@ -0,0 +1,253 @@
+"""
+Cost-based admission control.
+Each export request gets a cost estimate from its payload dimensions (years,
+accounts, individuals, scenarios, Monte Carlo paths), read off the raw body
+with byte scans before any parsing (binary payloads: off their unpacked
+columns). An AdmissionController caps the cost units in flight on the
+instance: requests wait in arrival order for room, and those still waiting
+after a short timeout are turned away (429). No request may hold more than a
+share of the capacity, so one very large comparison cannot starve every
+small export.
+"""
+
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Dict, Optional
+
+
+# Cost model: one unit is roughly one millisecond of single-core work
+BASE_UNITS = 5.0               # request overhead (parse set-up, workbook shell)
+SCENARIO_YEAR_UNITS = 0.03     # per scenario and year (parse, aggregation)
+COLUMN_YEAR_UNITS = 0.0033     # per scenario, year and account/income column
+DETAIL_YEAR_UNITS = 0.2        # per scenario and year (full tabs: detailed sheet, charts)
+PATH_YEAR_UNITS = 0.00008      # per Monte Carlo path, year and account
+BYTE_UNITS = 0.00003           # per body byte when the body was not read up front
+ENCODED_EXPANSION = 4.0        # decoded size per byte of a compressed body (gzip on projection JSON)
+
+# Income columns per individual (employment, RRQ, PSV, RRIF, RRPE, other)
+INDIVIDUAL_COLUMNS = 6
+
+_YEAR_KEY = b'"yearsFromStart"'
+_PROJECTION_KEY = b'"projection"'
+_ASSET_TYPE = re.compile(rb'"runtimeType"\s*:\s*"(?:realEstate|rrsp|celi|cri|cash)"')
+_PROJECT_KEY = b'"project"'
+_BIRTHDATE_KEY = b'"birthdate"'
+_SPOUSE_AGE = re.compile(rb'"spouseAge"\s*:\s*-?\d')
+_PROJECTION_YEARS = re.compile(rb'"projectionYears"\s*:\s*(\d+)')
+_PATHS = re.compile(rb'"paths"\s*:\s*(\d+)')
+_MONTE_CARLO_KEY = b'"monteCarlo"'
+_SCENARIO_IDS = re.compile(rb'"scenarioIds"\s*:\s*\[([^\]]*)\]')
+
+
+@dataclass
+class RequestCost:
+    """Estimated size and cost of one export request."""
+    scenarios: int
+    years: int
+    accounts: int
+    individuals: int
+    paths: int  # Monte Carlo paths per scenario (0 without a simulation)
+    bytes: int
+    units: float
+
+
+def estimate_request_cost(body: Optional[bytes], content_length: Optional[int] = None,
+                          encoded: bool = False) -> RequestCost:
+    """
+    Estimate the cost of an export request before parsing it.
+
+    Dimensions are counted from distinctive keys in the raw JSON (one
+    "yearsFromStart" per projected year, one asset-type "runtimeType" per asset, ...),
+    which is a few memory scans rather than a parse. When only the content
+    length is known, the cost is proportional to the body size.
+
+    Args:
+        body: Request body (decoded), or None when it is streamed
+        content_length: Body size when body is None
+        encoded: The streamed body is compressed (its decoded size is estimated)
+
+    Returns:
+        RequestCost
+    """
+    if body is None:
+        size = content_length or 0
+        if encoded:
+            size = int(size * ENCODED_EXPANSION)
+        return RequestCost(scenarios=0, years=0, accounts=0, individuals=0, paths=0, bytes=size,
+                           units=BASE_UNITS + size * BYTE_UNITS)
+
+    if _PROJECT_KEY in body and _PROJECTION_KEY not in body:
+        # Project export: projected (and optionally simulated) server-side
+        from monte_carlo import DEFAULT_PATHS, MAX_PATHS
+        from projection_engine import DEFAULT_PROJECTION_YEARS, MAX_PROJECTION_YEARS
+
+        match = _SCENARIO_IDS.search(body)
+        scenarios = max(1, match.group(1).count(b'"') // 2) if match else 1
+        match = _PROJECTION_YEARS.search(body)
+        years = min(int(match.group(1)), MAX_PROJECTION_YEARS) if match else DEFAULT_PROJECTION_YEARS
+        individuals = max(1, body.count(_BIRTHDATE_KEY))
+        accounts = len(_ASSET_TYPE.findall(body))
+        paths = 0
+        if _MONTE_CARLO_KEY in body:
+            match = _PATHS.search(body)
+            paths = min(int(match.group(1)), MAX_PATHS) if match else DEFAULT_PATHS
+    else:
+        scenarios = max(1, body.count(_PROJECTION_KEY))
+        years = body.count(_YEAR_KEY) // scenarios
+        individuals = 2 if _SPOUSE_AGE.search(body) else 1
+        # Every scenario carries its own asset list
+        accounts = len(_ASSET_TYPE.findall(body)) // scenarios
+        paths = 0
+
+    return request_cost(scenarios, years, accounts, individuals, paths, len(body))
+
+
+def request_cost(scenarios: int, years: int, accounts: int, individuals: int, paths: int,
+                 size: int) -> RequestCost:
+    """
+    Cost of a request of known dimensions.
+
+    Used by estimate_request_cost for JSON bodies and for binary payloads,
+    whose dimensions are read off the unpacked columns (see binary_format.py).
+    """
+    columns = accounts + individuals * INDIVIDUAL_COLUMNS
+    units = BASE_UNITS + scenarios * years * (SCENARIO_YEAR_UNITS + columns * COLUMN_YEAR_UNITS)
+    units += scenarios * years * DETAIL_YEAR_UNITS
+    units += scenarios * paths * years * max(accounts, 1) * PATH_YEAR_UNITS
+    return RequestCost(scenarios=scenarios, years=years, accounts=accounts, individuals=individuals,
+                       paths=paths, bytes=size, units=units)
+
+
+def parse_cost(cost: RequestCost) -> RequestCost:
+    """
+    The part of a request's cost spent before its workbook is built: parsing,
+    plus the projection and Monte Carlo simulation of project exports.
+
+    Async requests hold this much admission while they are parsed; their
+    builds are bounded by the job queue instead.
+    """
+    return replace(cost, units=cost.units - cost.scenarios * cost.years * DETAIL_YEAR_UNITS)
+
+
+class AdmissionController:
+    """Caps the estimated cost units in flight; requests wait in arrival order for room."""
+
+    def __init__(self, capacity_units: float, queue_timeout: float = 5.0, max_request_share: float = 0.5,
+                 streaming_units: float = math.inf, async_units: float = math.inf):
+        """
+        Args:
+            capacity_units: Cost units allowed in flight at once
+            queue_timeout: Seconds a request may wait for room before being rejected
+            max_request_share: Largest share of the capacity one request holds
+                               (bigger estimates are charged this much)
+            streaming_units: Cost from which requests are built in constant-memory mode
+            async_units: Cost from which requests that accept it are queued as async jobs
+        """
+        self.capacity_units = capacity_units
+        self.queue_timeout = queue_timeout
+        self.max_request_units = capacity_units * max_request_share
+        self.streaming_units = streaming_units
+        self.async_units = async_units
+        self._in_flight = 0.0
+        self._waiting: deque = deque()
+        self._condition = threading.Condition()
+
+        # Counters reported in the timing logs
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+
+    def charge(self, cost: RequestCost) -> float:
+        """Units a request holds while it runs."""
+        return min(cost.units, self.max_request_units)
+
+    def acquire(self, cost: RequestCost, timeout: Optional[float] = None) -> Optional[float]:
+        """
+        Wait for room for a request.
+
+        Args:
+            cost: Estimated cost of the request
+            timeout: Longest wait in seconds (default queue_timeout; math.inf
+                     waits until there is room)
+
+        Returns:
+            The units charged (pass them to release()), or None when there
+            was no room within the timeout
+        """
+        units = self.charge(cost)
+        deadline = time.monotonic() + (self.queue_timeout if timeout is None else timeout)
+        with self._condition:
+            if not self._waiting and self._in_flight + units <= self.capacity_units:
+                self._in_flight += units
+                self.admitted += 1
+                return units
+
+            ticket = object()
+            self._waiting.append(ticket)
+            self.queued += 1
+            try:
+                while self._waiting[0] is not ticket or self._in_flight + units > self.capacity_units:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        return None
+                    self._condition.wait(None if math.isinf(remaining) else remaining)
+                self._in_flight += units
+                self.admitted += 1
+                return units
+            finally:
+                self._waiting.remove(ticket)
+                # The next waiter may fit now that the head has moved
+                self._condition.notify_all()
+
+    def release(self, units: float):
+        """Return the units of a finished request."""
+        with self._condition:
+            self._in_flight = max(0.0, self._in_flight - units)
+            self._condition.notify_all()
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait before retrying."""
+        with self._condition:
+            # Roughly the time to drain what is in flight and queued (one unit ~ 1 ms)
+            backlog_ms = self._in_flight + len(self._waiting) * self.max_request_units
+        return max(1, math.ceil(backlog_ms / 1000))
+
+    def stats(self) -> Dict[str, float]:
+        """Admission counters and current load."""
+        with self._condition:
+            return {
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'rejected': self.rejected,
+                'in_flight_units': round(self._in_flight, 1),
+                'waiting': len(self._waiting),
+            }
+
+
+def create_admission_controller_from_env() -> Optional[AdmissionController]:
+    """
+    Build the process-wide admission controller from environment variables.
+
+    EXPORT_ADMISSION_CAPACITY       Cost units in flight per instance (default 2000, 0 disables)
+    EXPORT_ADMISSION_QUEUE_SECONDS  Longest wait for room before a 429 (default 5)
+    EXPORT_ADMISSION_MAX_SHARE      Largest capacity share held by one request (default 0.5)
+    EXPORT_STREAMING_UNITS          Cost from which workbooks are built in constant-memory mode (default 500)
+    EXPORT_ASYNC_UNITS              Cost from which requests sent with 'Prefer: respond-async'
+                                    become async jobs (default 2000)
+    """
+    capacity_units = float(os.environ.get('EXPORT_ADMISSION_CAPACITY', 2000))
+    if capacity_units <= 0:
+        return None
+    return AdmissionController(
+        capacity_units,
+        queue_timeout=float(os.environ.get('EXPORT_ADMISSION_QUEUE_SECONDS', 5)),
+        max_request_share=float(os.environ.get('EXPORT_ADMISSION_MAX_SHARE', 0.5)),
+        streaming_units=float(os.environ.get('EXPORT_STREAMING_UNITS', 500)),
+        async_units=float(os.environ.get('EXPORT_ASYNC_UNITS', 2000)),
+    )
@@ -0,0 +1,93 @@
+"""
+Precomputed aggregates for projection data.
+Reduces a columnar projection once and exposes per-year totals by asset type,
+income source and expense category, plus projection-wide KPIs, so sheet
+builders never rescan the raw maps.
+"""
+
+from typing import Dict, List, Optional
+import numpy as np
+
+from columnar import ColumnarProjection, INCOME_SOURCES
+
+
+# Asset types shown in the detailed sheet (see Asset.from_dict for the mapping)
+ASSET_TYPES = ['realEstate', 'rrsp', 'celi', 'cri', 'cash']
+
+# Expense categories shown in the detailed sheet, in display order
+EXPENSE_CATEGORIES = ['housing', 'transport', 'dailyLiving', 'recreation', 'health', 'family']
+
+
+class ProjectionAggregates:
+    """Per-year, per-type totals computed with whole-array reductions."""
+
+    def __init__(self, projection: ColumnarProjection, asset_type_map: Dict[str, str]):
+        self.num_years = projection.num_years
+        self.has_couples = projection.has_couples
+
+        # Membership matrix [accounts, types]: one matmul buckets every year at once
+        asset_types = list(ASSET_TYPES)
+        for asset_type in asset_type_map.values():
+            if asset_type not in asset_types:
+                asset_types.append(asset_type)
+        membership = np.zeros((len(projection.account_ids), len(asset_types)))
+        type_index = {asset_type: idx for idx, asset_type in enumerate(asset_types)}
+        for account_idx, account_id in enumerate(projection.account_ids):
+            asset_type = asset_type_map.get(account_id)
+            if asset_type is not None:
+                membership[account_idx, type_index[asset_type]] = 1.0
+
+        # Per-year totals, indexed as [asset_type][year_index]
+        accounts = projection.accounts
+        self.withdrawals_by_type = self._by_type(accounts['withdrawals_by_account'] @ membership, asset_types)
+        self.contributions_by_type = self._by_type(accounts['contributions_by_account'] @ membership, asset_types)
+        self.balances_by_type = self._by_type(accounts['assets_end_of_year'] @ membership, asset_types)
+        self.total_returns: List[float] = accounts['asset_returns'].sum(axis=1).tolist()
+
+        # Per-year income totals across individuals, indexed as [source][year_index]
+        income_totals = projection.income.sum(axis=1)
+        self.income_by_source: Dict[str, List[float]] = {
+            source: income_totals[:, idx].tolist() for idx, source in enumerate(INCOME_SOURCES)
+        }
+
+        # Per-year expenses, indexed as [category][year_index] (zeros when absent)
+        category_index = {category: idx for idx, category in enumerate(projection.category_ids)}
+        zeros = [0.0] * self.num_years
+        self.expenses_by_category: Dict[str, List[float]] = {
+            category: (projection.expenses_by_category[:, category_index[category]].tolist()
+                       if category in category_index else zeros)
+            for category in set(EXPENSE_CATEGORIES) | set(category_index)
+        }
+
+        # Projection-wide totals
+        metrics = projection.metrics
+        has_shortfall = projection.has_shortfall
+        self.total_income = float(metrics['total_income'].sum())
+        self.total_expenses = float(metrics['total_expenses'].sum())
+        self.total_tax = float(metrics['total_tax'].sum())
+        self.years_with_shortfall = int(has_shortfall.sum())
+        self.total_shortfall = float(metrics['shortfall_amount'][has_shortfall].sum())
+
+        self.initial_net_worth: Optional[float] = (
+            float(metrics['net_worth_start_of_year'][0]) if self.num_years else None
+        )
+        self.final_net_worth: Optional[float] = (
+            float(metrics['net_worth_end_of_year'][-1]) if self.num_years else None
+        )
+
+    @staticmethod
+    def _by_type(totals: np.ndarray, asset_types: List[str]) -> Dict[str, List[float]]:
+        """Split a [years, types] array into per-type row lists."""
+        return {asset_type: totals[:, idx].tolist() for idx, asset_type in enumerate(asset_types)}
+
+    def kpis(self) -> Dict[str, float]:
+        """Key metrics used by the summary and comparison sheets."""
+        return {
+            'Initial Net Worth': self.initial_net_worth if self.initial_net_worth is not None else 0,
+            'Final Net Worth': self.final_net_worth if self.final_net_worth is not None else 0,
+            'Total Income': self.total_income,
+            'Total Expenses': self.total_expenses,
+            'Total Tax': self.total_tax,
+            'Years with Shortfall': self.years_with_shortfall,
+            'Total Shortfall': self.total_shortfall,
+        }
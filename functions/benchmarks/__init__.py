@@ -0,0 +1 @@
+"""Benchmarks for the Excel export pipeline (run with: python -m benchmarks.run)."""
@@ -0,0 +1,115 @@
+"""
+Validation check of binary request bodies.
+
+Encodes the sample projection in the binary format (see binary_format.py),
+breaks one part of it at a time (scenarios, projection, columns, id lists,
+key dictionary, assets, events) and sends each body through
+generate_projection_excel: the intact body builds a workbook (200), every
+malformed one is refused with 400, never a 500 from deep in the loader or
+the workbook writer. Exits with status 1 on any unexpected status.
+
+Usage (from the functions/ directory):
+    python -m benchmarks.binary_check
+"""
+
+import contextlib
+import copy
+import io
+import json
+import sys
+from typing import Callable, Dict, List, Optional, Tuple
+
+import msgpack
+from werkzeug.test import EnvironBuilder
+from firebase_functions import https_fn
+
+from binary_format import encode_export_request
+from request_encoding import BINARY_CONTENT_TYPE
+from benchmarks.synthetic import load_seed, seed_request
+
+
+def _columns(payload: Dict) -> Dict:
+    return payload['projection']['columns']
+
+
+def _set_column(key: str, value) -> Callable[[Dict], None]:
+    def change(payload: Dict):
+        _columns(payload)[key] = value
+    return change
+
+
+def _set(key: str, value) -> Callable[[Dict], None]:
+    def change(payload: Dict):
+        payload[key] = value
+    return change
+
+
+def _set_projection(key: str, value) -> Callable[[Dict], None]:
+    def change(payload: Dict):
+        payload['projection'][key] = value
+    return change
+
+
+def _first_asset(value) -> Callable[[Dict], None]:
+    def change(payload: Dict):
+        payload['assets'][0] = value
+    return change
+
+
+def _events_rows(value) -> Callable[[Dict], None]:
+    def change(payload: Dict):
+        _columns(payload)['eventsOccurred'] = [value] * len(_columns(payload)['eventsOccurred'])
+    return change
+
+
+def cases() -> List[Tuple[str, Callable[[Dict], None], int]]:
+    """(label, change to the unpacked single-scenario payload, expected status) of each request sent."""
+    return [
+        ('intact', lambda payload: None, 200),
+        ('scenarios=5', _set('scenarios', 5), 400),
+        ('scenarios=[5]', _set('scenarios', [5]), 400),
+        ('projection=5', _set('projection', 5), 400),
+        ('columns=5', _set_projection('columns', 5), 400),
+        ('columns=[]', _set_projection('columns', []), 400),
+        ('accountIds=5', _set_column('accountIds', 5), 400),
+        ('categoryIds="abc"', _set_column('categoryIds', 'abc'), 400),
+        ('individualIds=[1.5]', _set_column('individualIds', [1.5]), 400),
+        ('keys=7', _set('keys', 7), 400),
+        ('keys=[7]', _set('keys', [7]), 400),
+        ('assets=5', _set('assets', 5), 400),
+        ('assets[0]=5', _first_asset(5), 400),
+        ('assets[0].id=[]', _first_asset({'id': [], 'runtimeType': 'rrsp'}), 400),
+        ('eventsOccurred rows=5', _events_rows(5), 400),
+        ('eventsOccurred rows="x"', _events_rows('x'), 400),
+    ]
+
+
+def post(body: bytes) -> Tuple[int, str]:
+    """Status and error message (if any) of one generate_projection_excel call."""
+    import main
+
+    environ = EnvironBuilder(method='POST', data=body,
+                             headers={'Content-Type': BINARY_CONTENT_TYPE}).get_environ()
+    with contextlib.redirect_stdout(io.StringIO()):  # Per-request performance log
+        response = main.generate_projection_excel(https_fn.Request(environ))
+    error = json.loads(response.get_data()).get('error', '') if response.status_code != 200 else ''
+    return response.status_code, error
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    payload = msgpack.unpackb(encode_export_request(seed_request(load_seed())), raw=False)
+    failures = 0
+    print(f'{"payload":<32} {"expected":>8} {"status":>6}  error')
+    for label, change, expected in cases():
+        broken = copy.deepcopy(payload)
+        change(broken)
+        status, error = post(msgpack.packb(broken, use_bin_type=True))
+        print(f'{label:<32} {expected:>8} {status:>6}  {error[:80]}')
+        failures += status != expected
+
+    print('OK' if not failures else f'FAIL: {failures} unexpected statuses')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+Equivalence check for the workbook engines.
+
+Generates every sample and synthetic payload with the reference XlsxWriter
+engine and the direct engine (see xlsx_direct.py), in both the in-memory and
+constant-memory modes, and compares the workbooks sheet by sheet: every
+cell's value and resolved style (number format, font, fill, border,
+alignment), merged ranges, column layout and frozen panes, plus the chart
+parts (series and cached data) byte for byte. Style indices and cell order
+may differ; what a user sees may not. The direct engine is checked cold
+(skeleton cache cleared, parts rendered by XlsxWriter) and warm (parts from
+cached skeletons). Also reports the generation time of each engine. Exits
+with status 1 on any difference. With an XlsxWriter release outside
+xlsx_direct.SUPPORTED_XLSXWRITER the direct engine and its skeleton cache
+are forced on for the check, so a new release can be verified before the
+range is widened.
+
+Usage (from the functions/ directory):
+    python -m benchmarks.engine_check               # small grid
+    python -m benchmarks.engine_check --years 30,100 --accounts 5,200
+"""
+
+import argparse
+import io
+import json
+import sys
+import time
+import zipfile
+from typing import Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+
+import xlsxwriter
+
+import excel_generator
+from request_parser import parse_export_request
+from excel_generator import generator_for_request
+from benchmarks.run import iter_payloads, _parse_list
+import xlsx_direct
+from xlsx_direct import SkeletonCache
+
+
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PACKAGE_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+ENGINES = ('xlsxwriter', 'direct')
+
+# Differences listed per payload before the rest are summarized
+MAX_REPORTED = 5
+
+
+def _tag(name: str) -> str:
+    return f'{{{MAIN_NS}}}{name}'
+
+
+def _attributes(element: Optional[ElementTree.Element]) -> Tuple:
+    """Element attributes and those of its children, as a comparable tuple."""
+    if element is None:
+        return ()
+    return (tuple(sorted(element.attrib.items())),
+            tuple((child.tag.split('}')[-1], tuple(sorted(child.attrib.items()))) for child in element))
+
+
+def _resolved_styles(archive: zipfile.ZipFile) -> List[Tuple]:
+    """Each cellXfs entry resolved to its number format code, font, fill, border and alignment."""
+    styles = ElementTree.fromstring(archive.read('xl/styles.xml'))
+    num_formats = {element.get('numFmtId'): element.get('formatCode')
+                   for element in styles.iter(_tag('numFmt'))}
+    fonts = list(styles.find(_tag('fonts')))
+    fills = list(styles.find(_tag('fills')))
+    borders = list(styles.find(_tag('borders')))
+
+    resolved = []
+    for xf in styles.find(_tag('cellXfs')):
+        resolved.append((
+            num_formats.get(xf.get('numFmtId'), xf.get('numFmtId')),
+            _attributes(fonts[int(xf.get('fontId', 0))]),
+            _attributes(fills[int(xf.get('fillId', 0))]),
+            _attributes(borders[int(xf.get('borderId', 0))]),
+            _attributes(xf.find(_tag('alignment'))),
+        ))
+    return resolved
+
+
+def _sheet_paths(archive: zipfile.ZipFile) -> Dict[str, str]:
+    """Sheet name -> worksheet part path."""
+    workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+    relationships = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    targets = {rel.get('Id'): rel.get('Target') for rel in relationships.iter(f'{{{PACKAGE_REL_NS}}}Relationship')}
+    return {sheet.get('name'): 'xl/' + targets[sheet.get(f'{{{REL_NS}}}id')]
+            for sheet in workbook.iter(_tag('sheet'))}
+
+
+def workbook_contents(data: bytes) -> Dict[Tuple[str, str], object]:
+    """
+    What a workbook shows, keyed by (sheet, cell reference or feature).
+
+    Cells map to (value, resolved style); values are numbers or strings
+    whichever way they were stored (shared or inline strings).
+    """
+    archive = zipfile.ZipFile(io.BytesIO(data))
+    styles = _resolved_styles(archive)
+    shared_strings = []
+    if 'xl/sharedStrings.xml' in archive.namelist():
+        shared_strings = [''.join(text.text or '' for text in item.iter(_tag('t')))
+                          for item in ElementTree.fromstring(archive.read('xl/sharedStrings.xml'))]
+
+    contents = {}
+    for name, path in _sheet_paths(archive).items():
+        sheet = ElementTree.fromstring(archive.read(path))
+        for cell in sheet.iter(_tag('c')):
+            cell_type = cell.get('t')
+            value_element = cell.find(_tag('v'))
+            if cell_type == 's':
+                value = shared_strings[int(value_element.text)]
+            elif cell_type == 'inlineStr':
+                value = ''.join(text.text or '' for text in cell.iter(_tag('t')))
+            elif value_element is not None:
+                value = float(value_element.text)
+            else:
+                value = None
+            contents[(name, cell.get('r'))] = (value, styles[int(cell.get('s', 0))])
+
+        contents[(name, 'dimension')] = _attributes(sheet.find(_tag('dimension')))
+        contents[(name, 'merges')] = sorted(merge.get('ref') for merge in sheet.iter(_tag('mergeCell')))
+        contents[(name, 'columns')] = [_attributes(col) for col in sheet.iter(_tag('col'))]
+        contents[(name, 'pane')] = _attributes(sheet.find(f'.//{_tag("pane")}'))
+        contents[(name, 'outline')] = _attributes(sheet.find(_tag('sheetFormatPr')))
+
+    # Charts (series ranges and their cached data) must match exactly
+    for path in archive.namelist():
+        if path.startswith('xl/charts/'):
+            contents[('charts', path)] = archive.read(path)
+    return contents
+
+
+def compare_workbooks(reference: bytes, candidate: bytes) -> List[str]:
+    """Differences between two workbooks, one line each."""
+    expected = workbook_contents(reference)
+    actual = workbook_contents(candidate)
+    differences = []
+    for key in sorted(set(expected) | set(actual), key=str):
+        if expected.get(key) != actual.get(key):
+            differences.append(f'{key[0]}!{key[1]}: {_describe(expected.get(key), actual.get(key))}')
+    return differences
+
+
+def _describe(expected, actual) -> str:
+    """One difference; whole parts are cut down to where they first differ."""
+    if isinstance(expected, bytes) and isinstance(actual, bytes):
+        offset = next((idx for idx, (a, b) in enumerate(zip(expected, actual)) if a != b),
+                      min(len(expected), len(actual)))
+        start = max(0, offset - 40)
+        return (f'differ at byte {offset}: {expected[start:offset + 40]!r} != '
+                f'{actual[start:offset + 40]!r}')
+    return f'{expected!r} != {actual!r}'
+
+
+def _generate(generator, constant_memory: bool, engine: str) -> Tuple[bytes, float]:
+    start = time.perf_counter()
+    data = generator.generate(constant_memory, engine=engine)
+    return data, (time.perf_counter() - start) * 1000
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Check that the workbook engines produce the same workbooks')
+    parser.add_argument('--years', type=_parse_list, default=[30, 100])
+    parser.add_argument('--individuals', type=_parse_list, default=[1, 2])
+    parser.add_argument('--accounts', type=_parse_list, default=[5, 50])
+    parser.add_argument('--scenarios', type=_parse_list, default=[3])
+    parser.add_argument('--iterations', type=int, default=3,
+                        help='Timed runs per engine (at least 2); the fastest is reported')
+    args = parser.parse_args(argv)
+
+    if not excel_generator.DIRECT_ENGINE_ENABLED:
+        print(f'XlsxWriter {xlsxwriter.__version__} is outside the supported range; checking the direct engine anyway')
+        excel_generator.DIRECT_ENGINE_ENABLED = True
+        xlsx_direct.skeleton_cache = SkeletonCache(256)
+
+    failures = 0
+    print(f'{"payload":<28} {"mode":<9} {"xlsxwriter":>11} {"direct":>9} {"cold":>9}  result')
+    for label, body in iter_payloads(args.years, args.individuals, args.accounts, args.scenarios):
+        generator = generator_for_request(parse_export_request(io.BytesIO(json.dumps(body).encode())))
+        for constant_memory in (False, True):
+            runs = {}
+            for engine in ENGINES:
+                if engine == 'direct' and xlsx_direct.skeleton_cache is not None:
+                    # The first run renders and caches the skeletons, the others reuse them
+                    xlsx_direct.skeleton_cache.clear()
+                runs[engine] = [_generate(generator, constant_memory, engine) for _ in range(max(2, args.iterations))]
+
+            reference = runs['xlsxwriter'][0][0]
+            differences = (compare_workbooks(reference, runs['direct'][0][0])
+                           + compare_workbooks(reference, runs['direct'][-1][0]))
+            timings = {engine: min(elapsed for _, elapsed in engine_runs) for engine, engine_runs in runs.items()}
+            mode = 'streaming' if constant_memory else 'memory'
+            result = 'same' if not differences else f'{len(differences)} differences'
+            print(f'{label:<28} {mode:<9} {timings["xlsxwriter"]:9.1f}ms {timings["direct"]:7.1f}ms '
+                  f'{runs["direct"][0][1]:7.1f}ms  {result}')
+            for difference in differences[:MAX_REPORTED]:
+                print(f'    {difference}')
+            failures += bool(differences)
+
+    print('OK' if not failures else f'FAIL: {failures} workbooks differ')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Import-time budget check for the function module.
+
+Imports main in a fresh interpreter with -X importtime, reports the slowest
+imports and fails (exit status 1) when the module takes longer than the
+budget to load or pulls in a module that must stay lazy (see prewarm.py).
+The Firebase SDK (SDK_MODULES) is imported first and reported on its own:
+every cold start pays for it and the repo does not own it, so the budget
+covers only the project's import path. Run it in CI next to the benchmarks
+to catch cold-start regressions.
+
+Usage (from the functions/ directory):
+    python -m benchmarks.import_budget                  # default budget
+    python -m benchmarks.import_budget --budget-ms 300 --top 15
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from prewarm import EXPORT_MODULES
+
+
+# Third-party modules imported before main and left out of the budget
+SDK_MODULES = ('firebase_functions.https_fn', 'firebase_functions.core')
+
+# Load time allowed for main on top of the SDK (about 20-30ms today; eager imports of
+# the export stack are caught separately through prewarm.EXPORT_MODULES)
+DEFAULT_BUDGET_MS = 100.0
+
+# Best of this many runs is compared with the budget (the first run warms the disk cache)
+DEFAULT_RUNS = 3
+
+_IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+@dataclass
+class ImportRecord:
+    """One line of -X importtime output."""
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def measure(module: str = 'main', preload: Sequence[str] = SDK_MODULES) -> List[ImportRecord]:
+    """Import the preload modules, then module, in a fresh interpreter and parse its -X importtime report."""
+    functions_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', '; '.join(f'import {name}' for name in [*preload, module])],
+        cwd=functions_dir, capture_output=True, text=True,
+        env={**os.environ, 'EXPORT_PREWARM': '0'},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'import {module} failed:\n{result.stderr}')
+
+    records = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            records.append(ImportRecord(name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return records
+
+
+def module_time_ms(records: List[ImportRecord], module: str) -> Optional[float]:
+    """Cumulative import time of a module, in milliseconds."""
+    for record in records:
+        if record.module == module:
+            return record.cumulative_us / 1000
+    return None
+
+
+def children(records: List[ImportRecord], module: str) -> List[ImportRecord]:
+    """Imports made directly by a top-level module (reported just before it, one level deeper)."""
+    found: List[ImportRecord] = []
+    for record in records:
+        if record.depth == 0:
+            if record.module == module:
+                return found
+            found = []
+        elif record.depth == 1:
+            found.append(record)
+    return []
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Check the import time of the function module')
+    parser.add_argument('--module', default='main', help='Module to import (default: main)')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help=f'Import time allowed on top of the SDK (default: {DEFAULT_BUDGET_MS:.0f}ms)')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help='Runs; the fastest one is checked')
+    parser.add_argument('--top', type=int, default=10, help='Slowest imports to list')
+    args = parser.parse_args(argv)
+
+    runs = [measure(args.module) for _ in range(max(1, args.runs))]
+    records = min(runs, key=lambda run: module_time_ms(run, args.module) or 0.0)
+    total_ms = module_time_ms(records, args.module) or 0.0
+
+    sdk_ms = sum(record.cumulative_us for record in records if record.depth == 0 and record.module in SDK_MODULES) / 1000
+    print(f'{args.module}: {total_ms:.1f}ms (budget {args.budget_ms:.0f}ms, best of {len(runs)}), '
+          f'plus {sdk_ms:.1f}ms for the Firebase SDK (not budgeted)')
+    print(f'Slowest top-level imports of {args.module}:')
+    for record in sorted(children(records, args.module), key=lambda record: -record.cumulative_us)[:args.top]:
+        print(f'  {record.cumulative_us / 1000:8.1f}ms  {record.module}')
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f'import took {total_ms:.1f}ms, over the {args.budget_ms:.0f}ms budget')
+    imported = {record.module for record in records}
+    eager = [module for module in EXPORT_MODULES if module in imported]
+    if eager:
+        failures.append(f'lazy modules imported at load time: {", ".join(eager)}')
+
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if not failures:
+        print('OK')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
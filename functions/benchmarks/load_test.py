@@ -0,0 +1,222 @@
+"""
+Load test for the self-hosted export server (server.py).
+
+Starts the server on a free local port (or targets a running one with --url),
+waits for /healthz and drives generate_projection_excel from concurrent
+keep-alive clients for a fixed duration, cycling through the testdata
+payloads: the sample projection, the sample project and a synthetic
+comparison export. Reports requests/second and latency percentiles overall
+and per payload, plus the response status counts. With several --workers
+values the server is restarted for each, which shows how throughput scales
+across cores. The server is stopped with SIGTERM, so every run also checks
+that draining finishes cleanly.
+
+Result and coalescing caches are disabled in the server unless --cache is
+given, so every request builds its workbook.
+
+Usage (from the functions/ directory; needs gunicorn):
+    python -m benchmarks.load_test                         # one run, one worker per core
+    python -m benchmarks.load_test --workers 1,2,4 --concurrency 8 --duration 20
+    python -m benchmarks.load_test --url http://localhost:8080
+"""
+
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from benchmarks.run import _parse_list, _percentile
+from benchmarks.synthetic import load_seed, load_plan, seed_request, synthetic_request
+
+FUNCTIONS_DIR = os.path.join(os.path.dirname(__file__), '..')
+EXPORT_PATH = '/generate_projection_excel'
+
+
+def load_payloads() -> List[Tuple[str, bytes]]:
+    """(label, JSON body) of each payload the clients send."""
+    seed = load_seed()
+    payloads = [
+        ('testdata', seed_request(seed)),
+        ('plan', {'project': load_plan()}),
+        ('y30-i2-a5-s3', synthetic_request(seed, 30, 2, 5, scenarios=3)),
+    ]
+    return [(label, json.dumps(body).encode()) for label, body in payloads]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _get(host: str, port: int, path: str) -> Tuple[int, bytes]:
+    connection = http.client.HTTPConnection(host, port, timeout=5)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def wait_until_healthy(host: str, port: int, timeout: float = 60.0) -> Dict:
+    """Poll /healthz until the server answers 200."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, body = _get(host, port, '/healthz')
+            if status == 200:
+                return json.loads(body)
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f'Server on {host}:{port} not healthy after {timeout:.0f}s')
+
+
+def start_server(port: int, workers: int, threads: int, cache: bool) -> subprocess.Popen:
+    """Start server.py in a subprocess listening on localhost."""
+    env = dict(os.environ)
+    if not cache:
+        env.update(EXPORT_CACHE_MAX_BYTES='0', EXPORT_COALESCE='0')
+    return subprocess.Popen(
+        [sys.executable, 'server.py', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--threads', str(threads)],
+        cwd=FUNCTIONS_DIR, env=env, stdout=subprocess.DEVNULL, stderr=tempfile.TemporaryFile(),
+    )
+
+
+def stop_server(process: subprocess.Popen, timeout: float = 60.0) -> Optional[int]:
+    """SIGTERM the server and wait for it to drain; returns its exit code (None if it had to be killed)."""
+    process.send_signal(signal.SIGTERM)
+    try:
+        return process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+        return None
+
+
+def drive(host: str, port: int, payloads: List[Tuple[str, bytes]], concurrency: int,
+          duration: float) -> Tuple[List[Tuple[str, int, float]], float]:
+    """
+    Send exports from concurrent keep-alive clients until the duration is over.
+
+    Returns:
+        ([(payload label, status, latency in seconds)], elapsed seconds)
+    """
+    results = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(offset: int):
+        connection = http.client.HTTPConnection(host, port, timeout=300)
+        samples = []
+        index = offset
+        while time.monotonic() < deadline:
+            label, body = payloads[index % len(payloads)]
+            index += 1
+            start = time.perf_counter()
+            try:
+                connection.request('POST', EXPORT_PATH, body, {'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+                if response.getheader('Connection', '').lower() == 'close':
+                    connection.close()
+            except (OSError, http.client.HTTPException):
+                status = 0  # Connection error; reconnect on the next request
+                connection.close()
+            samples.append((label, status, time.perf_counter() - start))
+        connection.close()
+        with lock:
+            results.extend(samples)
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client, args=(offset,)) for offset in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def report(title: str, results: List[Tuple[str, int, float]], elapsed: float) -> float:
+    """Print throughput and latency percentiles; returns the overall requests/second."""
+    print(title)
+    print(f'  {"payload":<16} {"requests":>9} {"req/s":>8} {"p50":>9} {"p90":>9} {"p99":>9}  statuses')
+    groups = [('all', results)] + [
+        (label, [sample for sample in results if sample[0] == label])
+        for label in dict.fromkeys(sample[0] for sample in results)
+    ]
+    for label, samples in groups:
+        if not samples:
+            continue
+        latencies = sorted(sample[2] * 1000 for sample in samples)
+        statuses = ', '.join(f'{status}: {count}' for status, count in sorted(Counter(s[1] for s in samples).items()))
+        print(f'  {label:<16} {len(samples):>9} {len(samples) / elapsed:8.1f} '
+              f'{_percentile(latencies, 0.50):7.1f}ms {_percentile(latencies, 0.90):7.1f}ms '
+              f'{_percentile(latencies, 0.99):7.1f}ms  {statuses}')
+    return len(results) / elapsed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Drive the self-hosted export server and report throughput')
+    parser.add_argument('--url', help='Running server to target instead of starting one')
+    parser.add_argument('--workers', type=_parse_list, default=[os.cpu_count() or 1],
+                        help='Worker processes per run, e.g. 1,2,4')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per worker')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent client connections')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load per run')
+    parser.add_argument('--warmup', type=float, default=2.0, help='Seconds of untimed load before each run')
+    parser.add_argument('--cache', action='store_true', help='Leave the result and coalescing caches on')
+    args = parser.parse_args(argv)
+
+    payloads = load_payloads()
+    print(f'Payloads: {", ".join(f"{label} ({len(body):,} bytes)" for label, body in payloads)}')
+
+    if args.url:
+        target = urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+        wait_until_healthy(host, port)
+        drive(host, port, payloads, args.concurrency, args.warmup)
+        results, elapsed = drive(host, port, payloads, args.concurrency, args.duration)
+        report(f'{args.url}, {args.concurrency} clients, {elapsed:.1f}s', results, elapsed)
+        return 0 if all(sample[1] == 200 for sample in results) else 1
+
+    failed = False
+    baseline = None
+    for workers in args.workers:
+        port = _free_port()
+        process = start_server(port, workers, args.threads, args.cache)
+        try:
+            wait_until_healthy('127.0.0.1', port)
+            drive('127.0.0.1', port, payloads, args.concurrency, args.warmup)
+            results, elapsed = drive('127.0.0.1', port, payloads, args.concurrency, args.duration)
+        finally:
+            exit_code = stop_server(process)
+        throughput = report(f'{workers} worker(s) x {args.threads} threads, {args.concurrency} clients, '
+                            f'{elapsed:.1f}s', results, elapsed)
+        baseline = baseline or throughput
+        print(f'  scaling: {throughput / baseline:.2f}x of the first run, '
+              f'drain: {"clean" if exit_code == 0 else f"exit code {exit_code}"}')
+        if exit_code != 0:
+            process.stderr.seek(0)
+            print(process.stderr.read().decode(errors='replace')[-2000:], file=sys.stderr)
+        failed |= exit_code != 0 or any(sample[1] != 200 for sample in results)
+
+    print('OK' if not failed else 'FAIL: errors or unclean shutdown')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Equivalence and size check for the request encodings.
+
+Encodes every sample and synthetic projection payload as plain JSON, gzip
+JSON, binary (see binary_format.py) and gzip binary, parses each one the way
+the handler does (buffered and, for gzip JSON, streamed) and checks that they
+all give the same parsed request, by export cache key. Reports the body size
+of each encoding relative to plain JSON and the parse time of JSON and binary
+bodies. Exits with status 1 on any difference.
+
+Usage (from the functions/ directory):
+    python -m benchmarks.payload_check               # small grid
+    python -m benchmarks.payload_check --years 30,100 --accounts 5,200 --scenarios 2,5
+"""
+
+import argparse
+import gzip
+import io
+import json
+import sys
+import time
+from typing import Callable, List, Optional
+
+from request_parser import parse_export_request
+from request_encoding import decode_body, decoding_stream
+from binary_format import encode_export_request, unpack_payload, parse_binary_request
+from export_cache import export_cache_key
+from benchmarks.run import iter_payloads, _parse_list
+
+
+def _best_ms(function: Callable[[], object], iterations: int) -> float:
+    """Fastest of several timed calls, in milliseconds."""
+    best = float('inf')
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def _key(export_request) -> str:
+    return export_cache_key(export_request.scenarios, export_request.is_multi_scenario)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Check that every request encoding parses to the same request')
+    parser.add_argument('--years', type=_parse_list, default=[30, 100])
+    parser.add_argument('--individuals', type=_parse_list, default=[1, 2])
+    parser.add_argument('--accounts', type=_parse_list, default=[5, 50])
+    parser.add_argument('--scenarios', type=_parse_list, default=[3])
+    parser.add_argument('--iterations', type=int, default=5, help='Timed parses per format; the fastest is reported')
+    args = parser.parse_args(argv)
+
+    failures = 0
+    print(f'{"payload":<24} {"json":>10} {"gzip":>6} {"binary":>7} {"bin+gz":>7} '
+          f'{"parse json":>11} {"binary":>8}  result')
+    for label, body in iter_payloads(args.years, args.individuals, args.accounts, args.scenarios):
+        if 'project' in body:
+            continue  # Project exports are JSON only
+        raw = json.dumps(body).encode()
+        gzipped = gzip.compress(raw)
+        binary = encode_export_request(body)
+        binary_gzipped = gzip.compress(binary)
+
+        expected = _key(parse_export_request(io.BytesIO(raw)))
+        candidates = {
+            'gzip': parse_export_request(io.BytesIO(decode_body(gzipped, 'gzip'))),
+            'gzip stream': parse_export_request(decoding_stream(io.BytesIO(gzipped), 'gzip')),
+            'binary': parse_binary_request(unpack_payload(binary)),
+            'binary gzip': parse_binary_request(unpack_payload(decode_body(binary_gzipped, 'gzip'))),
+        }
+        differences = [name for name, parsed in candidates.items() if _key(parsed) != expected]
+
+        json_ms = _best_ms(lambda: parse_export_request(io.BytesIO(raw)), args.iterations)
+        binary_ms = _best_ms(lambda: parse_binary_request(unpack_payload(binary)), args.iterations)
+        result = 'same' if not differences else f'differs: {", ".join(differences)}'
+        print(f'{label:<24} {len(raw):>10,} {len(gzipped) / len(raw):6.0%} {len(binary) / len(raw):7.0%} '
+              f'{len(binary_gzipped) / len(raw):7.0%} {json_ms:9.2f}ms {binary_ms:6.2f}ms  {result}')
+        failures += bool(differences)
+
+    print('OK' if not failures else f'FAIL: {failures} payloads differ')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Validation check of project export options.
+
+Sends the sample plan through generate_projection_excel with boundary and
+invalid option values (projectionYears, startYear, inflationRate, scenario
+ids, monteCarlo settings) and checks each response status: values in range build a
+workbook (200), anything else is refused with 400 before any projection
+work, never a 500 from deep in the engine or the workbook writer. Exits
+with status 1 on any unexpected status.
+
+Usage (from the functions/ directory):
+    python -m benchmarks.request_check
+"""
+
+import contextlib
+import io
+import json
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from werkzeug.test import EnvironBuilder
+from firebase_functions import https_fn
+
+from projection_engine import MAX_PROJECTION_YEARS
+from benchmarks.synthetic import load_plan
+
+
+def cases() -> List[Tuple[str, Dict, int]]:
+    """(label, request options, expected status) of each request sent."""
+    return [
+        ('projectionYears=1', {'projectionYears': 1}, 200),
+        (f'projectionYears={MAX_PROJECTION_YEARS}', {'projectionYears': MAX_PROJECTION_YEARS}, 200),
+        ('projectionYears=0', {'projectionYears': 0}, 400),
+        ('projectionYears=-5', {'projectionYears': -5}, 400),
+        (f'projectionYears={MAX_PROJECTION_YEARS + 1}', {'projectionYears': MAX_PROJECTION_YEARS + 1}, 400),
+        ('projectionYears=1000', {'projectionYears': 1000}, 400),
+        ('projectionYears=2.5', {'projectionYears': 2.5}, 400),
+        ('projectionYears=true', {'projectionYears': True}, 400),
+        ('startYear="soon"', {'startYear': 'soon'}, 400),
+        ('inflationRate="2%"', {'inflationRate': '2%'}, 400),
+        ('scenarioId="missing"', {'scenarioId': 'missing'}, 400),
+        ('scenarioIds=[base, missing]', {'scenarioIds': ['base-scenario', 'missing']}, 400),
+        ('scenarioIds=6 x base', {'scenarioIds': ['base-scenario'] * 6,
+                                  'monteCarlo': {'paths': 20000}}, 400),
+        ('monteCarlo.paths=0', {'monteCarlo': {'paths': 0}}, 400),
+        ('monteCarlo.paths=null', {'monteCarlo': {'paths': None}}, 400),
+        ('monteCarlo.paths=-1', {'monteCarlo': {'paths': -1}}, 400),
+        ('monteCarlo.paths=1e9', {'monteCarlo': {'paths': 1e9}}, 400),
+        ('monteCarlo.seed=-1', {'monteCarlo': {'seed': -1}}, 400),
+        ('monteCarlo.fanChart="false"', {'monteCarlo': {'fanChart': 'false'}}, 400),
+        ('monteCarlo.fanChart=0.0', {'monteCarlo': {'fanChart': 0.0}}, 400),
+        ('monteCarlo=true', {'monteCarlo': True}, 400),
+        ('monteCarlo=5', {'monteCarlo': 5}, 400),
+        ('monteCarlo=[]', {'monteCarlo': []}, 400),
+        ('monteCarlo.volatility="high"', {'monteCarlo': {'volatility': 'high'}}, 400),
+    ]
+
+
+def post(body: Dict) -> Tuple[int, str]:
+    """Status and error message (if any) of one generate_projection_excel call."""
+    import main
+
+    environ = EnvironBuilder(method='POST', data=json.dumps(body).encode(),
+                             headers={'Content-Type': 'application/json'}).get_environ()
+    with contextlib.redirect_stdout(io.StringIO()):  # Per-request performance log
+        response = main.generate_projection_excel(https_fn.Request(environ))
+    error = json.loads(response.get_data()).get('error', '') if response.status_code != 200 else ''
+    return response.status_code, error
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    project = load_plan()
+    failures = 0
+    print(f'{"options":<32} {"expected":>8} {"status":>6}  error')
+    for label, options, expected in cases():
+        status, error = post({'project': project, **options})
+        print(f'{label:<32} {expected:>8} {status:>6}  {error[:80]}')
+        failures += status != expected
+
+    print('OK' if not failures else f'FAIL: {failures} unexpected statuses')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
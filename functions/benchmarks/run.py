@@ -0,0 +1,369 @@
+"""
+Benchmark runner for the export pipeline.
+
+Times Projection.from_dict (per scenario and for whole comparison payloads,
+tolerant and complete), ColumnarProjection.from_dict, request parsing (JSON and
+binary), the projection engine, Monte Carlo simulation, ExcelGenerator.generate
+and MultiScenarioExcelGenerator.generate over the sample files and a grid of
+synthetic payloads, and reports latency percentiles, peak RSS, allocations
+and output size. Results can be saved as a baseline and compared later.
+
+Usage (from the functions/ directory):
+    python -m benchmarks.run                          # default grid
+    python -m benchmarks.run --quick                  # smallest/largest sizes only
+    python -m benchmarks.run --save benchmarks/results/baseline.json
+    python -m benchmarks.run --compare benchmarks/results/baseline.json
+"""
+
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from models import Projection, Asset
+from columnar import ColumnarProjection
+from request_parser import parse_export_request
+from binary_format import encode_export_request, parse_binary_request, unpack_payload
+from excel_generator import ExcelGenerator, MultiScenarioExcelGenerator
+from project_models import Project
+from projection_engine import calculate_projection
+from monte_carlo import run_monte_carlo
+from benchmarks.synthetic import load_seed, load_plan, seed_request, synthetic_request
+
+
+# Default grid (--quick keeps only the first and last value of each axis)
+DEFAULT_YEARS = [30, 60, 100]
+DEFAULT_INDIVIDUALS = [1, 2]
+DEFAULT_ACCOUNTS = [5, 50, 200]
+DEFAULT_SCENARIOS = [2, 5]
+
+# Monte Carlo case size (the target workload: 10k paths over 60 years)
+MONTE_CARLO_PATHS = 10000
+MONTE_CARLO_YEARS = 60
+
+# Relative slowdown / growth reported as a regression by --compare
+DEFAULT_THRESHOLD = 0.10
+
+_prepare_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _benchmark_pool() -> ProcessPoolExecutor:
+    """Process pool for the multi_generate_pool cases (started once, whatever EXPORT_WORKERS says)."""
+    global _prepare_pool
+    if _prepare_pool is None:
+        _prepare_pool = ProcessPoolExecutor(max_workers=max(2, os.cpu_count() or 1))
+    return _prepare_pool
+
+
+@dataclass
+class BenchmarkCase:
+    """One benchmarked function on one payload."""
+    name: str
+    run: Callable[[], Optional[int]]  # returns output size in bytes, if any
+
+
+@dataclass
+class BenchmarkResult:
+    """Measurements for one case."""
+    name: str
+    iterations: int
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    min_ms: float
+    mean_ms: float
+    peak_rss_kb: int
+    alloc_peak_kb: int   # peak traced Python allocations during one run
+    alloc_blocks: int    # memory blocks allocated and still live at the end of one run
+    output_bytes: Optional[int]
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS counter (Linux only). Returns whether it worked."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_kb() -> int:
+    """Peak resident set size in KB (since the last reset on Linux, else process lifetime)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports KB
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def measure(case: BenchmarkCase, iterations: int, warmup: int = 1) -> BenchmarkResult:
+    """Time a case, then run it once more under tracemalloc for allocation stats."""
+    for _ in range(warmup):
+        case.run()
+
+    gc.collect()
+    _reset_peak_rss()
+    timings = []
+    output_bytes = None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        output_bytes = case.run()
+        timings.append((time.perf_counter() - start) * 1000)
+    peak_rss = _peak_rss_kb()
+
+    # Allocation tracing slows the code down, so it gets its own run
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    case.run()
+    _, alloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    alloc_blocks = sys.getallocatedblocks() - blocks_before
+
+    timings.sort()
+    return BenchmarkResult(
+        name=case.name,
+        iterations=iterations,
+        p50_ms=_percentile(timings, 0.50),
+        p90_ms=_percentile(timings, 0.90),
+        p99_ms=_percentile(timings, 0.99),
+        min_ms=timings[0],
+        mean_ms=sum(timings) / len(timings),
+        peak_rss_kb=peak_rss,
+        alloc_peak_kb=alloc_peak // 1024,
+        alloc_blocks=alloc_blocks,
+        output_bytes=output_bytes,
+    )
+
+
+def _cases_for_request(label: str, body: Dict) -> List[BenchmarkCase]:
+    """Benchmark cases for one request body (single or multi-scenario)."""
+    raw = json.dumps(body).encode()
+
+    def parse():
+        parse_export_request(io.BytesIO(raw))
+        return len(raw)
+
+    cases = [BenchmarkCase(f'parse_request[{label}]', parse)]
+
+    if 'project' not in body:
+        binary = encode_export_request(body)
+
+        def parse_binary():
+            parse_binary_request(unpack_payload(binary))
+            return len(binary)
+
+        cases.append(BenchmarkCase(f'parse_binary[{label}]', parse_binary))
+
+    if 'project' in body:
+        project = Project.from_dict(body['project'])
+
+        def calculate():
+            calculate_projection(project)
+            return None
+
+        def simulate():
+            run_monte_carlo(project, paths=MONTE_CARLO_PATHS, projection_years=MONTE_CARLO_YEARS)
+            return None
+
+        cases.append(BenchmarkCase(f'calculate_projection[{label}]', calculate))
+        cases.append(BenchmarkCase(f'monte_carlo[{label}]', simulate))
+        return cases
+
+    if 'scenarios' in body:
+        projections = [scenario['projection'] for scenario in body['scenarios']]
+
+        def scenarios_from_dict():
+            for projection_data in projections:
+                Projection.from_dict(projection_data)
+            return None
+
+        def scenarios_from_dict_complete():
+            # Synthetic comparison payloads (couples) carry every field
+            for projection_data in projections:
+                Projection.from_dict(projection_data, complete=True)
+            return None
+
+        cases.append(BenchmarkCase(f'scenarios_from_dict[{label}]', scenarios_from_dict))
+        cases.append(BenchmarkCase(f'scenarios_from_dict_complete[{label}]', scenarios_from_dict_complete))
+
+        scenarios = [
+            {
+                'projection': Projection.from_dict(scenario['projection']),
+                'scenario_name': scenario['scenarioName'],
+                'assets': [Asset.from_dict(asset) for asset in scenario['assets']],
+            }
+            for scenario in body['scenarios']
+        ]
+
+        def multi_generate():
+            return len(MultiScenarioExcelGenerator(scenarios).generate())
+
+        def multi_generate_pool():
+            # Scenarios prepared on a process pool, for sizing EXPORT_PARALLEL_PREPARE_CELLS
+            return len(MultiScenarioExcelGenerator(scenarios, executor=_benchmark_pool()).generate())
+
+        cases.append(BenchmarkCase(f'multi_generate[{label}]', multi_generate))
+        cases.append(BenchmarkCase(f'multi_generate_pool[{label}]', multi_generate_pool))
+        return cases
+
+    projection_data = body['projection']
+    projection = Projection.from_dict(projection_data)
+    assets = [Asset.from_dict(asset) for asset in body['assets']]
+
+    def from_dict():
+        Projection.from_dict(projection_data)
+        return None
+
+    def columnar_from_dict():
+        ColumnarProjection.from_dict(projection_data)
+        return None
+
+    def generate():
+        return len(ExcelGenerator(projection, body['scenarioName'], assets).generate())
+
+    cases.append(BenchmarkCase(f'projection_from_dict[{label}]', from_dict))
+    cases.append(BenchmarkCase(f'columnar_from_dict[{label}]', columnar_from_dict))
+    cases.append(BenchmarkCase(f'generate[{label}]', generate))
+    return cases
+
+
+def iter_payloads(years: List[int], individuals: List[int], accounts: List[int],
+                  scenarios: List[int]) -> Iterator[Tuple[str, Dict]]:
+    """
+    Yield (label, request body) for the sample files and the synthetic grid.
+
+    Payloads are built lazily so only the one being measured is held in memory.
+    """
+    seed = load_seed()
+    yield 'testdata', seed_request(seed)
+    yield 'plan', {'project': load_plan()}
+
+    for num_years in years:
+        for num_individuals in individuals:
+            for num_accounts in accounts:
+                label = f'y{num_years}-i{num_individuals}-a{num_accounts}'
+                yield label, synthetic_request(seed, num_years, num_individuals, num_accounts)
+
+    # Comparison exports use couples, which exercise every column
+    for num_years in years:
+        for num_accounts in accounts:
+            for num_scenarios in scenarios:
+                label = f'y{num_years}-i2-a{num_accounts}-s{num_scenarios}'
+                yield label, synthetic_request(seed, num_years, 2, num_accounts, scenarios=num_scenarios)
+
+
+def compare(results: List[BenchmarkResult], baseline: Dict, threshold: float) -> List[str]:
+    """
+    Compare results against a saved baseline.
+
+    Returns:
+        List of regression descriptions (p50 latency, peak allocations or output size)
+    """
+    previous = {entry['name']: entry for entry in baseline.get('results', [])}
+    regressions = []
+    print(f"\n{'case':<48} {'p50 ms':>10} {'base':>10} {'change':>8}  {'alloc KB':>9} {'base':>9}")
+    for result in results:
+        entry = previous.get(result.name)
+        if entry is None:
+            print(f'{result.name:<48} {result.p50_ms:>10.2f} {"-":>10}')
+            continue
+        change = (result.p50_ms - entry['p50_ms']) / entry['p50_ms'] if entry['p50_ms'] else 0.0
+        print(f"{result.name:<48} {result.p50_ms:>10.2f} {entry['p50_ms']:>10.2f} {change:>+8.1%}  "
+              f"{result.alloc_peak_kb:>9} {entry['alloc_peak_kb']:>9}")
+        if change > threshold:
+            regressions.append(f'{result.name}: p50 {entry["p50_ms"]:.2f} -> {result.p50_ms:.2f} ms ({change:+.1%})')
+        if entry['alloc_peak_kb'] and result.alloc_peak_kb > entry['alloc_peak_kb'] * (1 + threshold):
+            regressions.append(f'{result.name}: alloc peak {entry["alloc_peak_kb"]} -> {result.alloc_peak_kb} KB')
+        if entry['output_bytes'] and result.output_bytes and \
+                result.output_bytes > entry['output_bytes'] * (1 + threshold):
+            regressions.append(f'{result.name}: output {entry["output_bytes"]} -> {result.output_bytes} bytes')
+    return regressions
+
+
+def _parse_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(',') if item]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the Excel export pipeline.')
+    parser.add_argument('--iterations', type=int, default=5, help='Timed runs per case (default 5)')
+    parser.add_argument('--years', type=_parse_list, default=DEFAULT_YEARS)
+    parser.add_argument('--individuals', type=_parse_list, default=DEFAULT_INDIVIDUALS)
+    parser.add_argument('--accounts', type=_parse_list, default=DEFAULT_ACCOUNTS)
+    parser.add_argument('--scenarios', type=_parse_list, default=DEFAULT_SCENARIOS)
+    parser.add_argument('--quick', action='store_true', help='Only the smallest and largest size on each axis')
+    parser.add_argument('--only', help='Only run cases whose name contains this string')
+    parser.add_argument('--save', metavar='PATH', help='Write results as a baseline JSON file')
+    parser.add_argument('--compare', metavar='PATH', help='Compare against a saved baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Relative change reported as a regression (default 0.10)')
+    args = parser.parse_args(argv)
+
+    axes = [args.years, args.individuals, args.accounts, args.scenarios]
+    if args.quick:
+        axes = [sorted({values[0], values[-1]}) for values in axes]
+
+    results = []
+    print(f"{'case':<48} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'RSS KB':>9} "
+          f"{'alloc KB':>9} {'blocks':>9} {'bytes':>10}")
+    for label, body in iter_payloads(*axes):
+        for case in _cases_for_request(label, body):
+            if args.only and args.only not in case.name:
+                continue
+            result = measure(case, args.iterations)
+            results.append(result)
+            print(
+                f'{result.name:<48} {result.p50_ms:>10.2f} {result.p90_ms:>10.2f} {result.p99_ms:>10.2f} '
+                f'{result.peak_rss_kb:>9} {result.alloc_peak_kb:>9} {result.alloc_blocks:>9} '
+                f'{result.output_bytes if result.output_bytes is not None else "-":>10}'
+            )
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump({
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'results': [asdict(result) for result in results],
+            }, f, indent=2)
+        print(f'\nBaseline saved to {args.save}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print('\nRegressions:')
+            for regression in regressions:
+                print(f'  - {regression}')
+            return 1
+        print('\nNo regressions.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
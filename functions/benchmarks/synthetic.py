@@ -0,0 +1,216 @@
+"""
+Synthetic export payloads for benchmarks.
+Starts from the sample files in testdata/ (start year, ages, inflation,
+account balances and asset types) and scales them to any number of years,
+individuals, accounts and scenarios. Output is deterministic for a given seed.
+"""
+
+import glob
+import json
+import os
+import random
+from typing import Dict, List, Optional
+
+from columnar import INCOME_SOURCES
+from aggregates import EXPENSE_CATEGORIES
+
+
+TESTDATA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'testdata')
+
+# Sample project export with expenses and real estate events, for the projection engine
+PLAN_FILE = os.path.join(os.path.dirname(__file__), '..', '..', 'andre_anne_retirement_plan.json')
+
+# Accounts are drawn from these types when the seed project has none
+DEFAULT_ASSET_TYPES = ['realEstate', 'rrsp', 'celi', 'cri', 'cash']
+
+# Years before retirement (contributions, employment income) in the synthetic plan
+WORKING_YEARS = 7
+
+
+def load_seed(testdata_dir: str = TESTDATA_DIR) -> Dict:
+    """
+    Load the sample projection and project files.
+
+    Returns:
+        Dict with 'projection' (projection JSON) and 'assets' (asset JSON list)
+    """
+    projection_files = sorted(glob.glob(os.path.join(testdata_dir, 'projection_*.json')))
+    project_files = sorted(glob.glob(os.path.join(testdata_dir, 'project_*.json')))
+    if not projection_files:
+        raise FileNotFoundError(f'No projection_*.json in {testdata_dir}')
+
+    with open(projection_files[0]) as f:
+        projection = json.load(f)
+    assets = []
+    if project_files:
+        with open(project_files[0]) as f:
+            assets = json.load(f).get('assets', [])
+    return {'projection': projection, 'assets': assets}
+
+
+def load_plan(path: str = PLAN_FILE) -> Dict:
+    """Load the sample project export."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def seed_request(seed: Dict) -> Dict:
+    """Single-scenario request body for the unmodified sample files."""
+    return {
+        'projection': seed['projection'],
+        'scenarioName': seed['projection'].get('scenario', 'Base Scenario'),
+        'assets': [{'id': asset['id'], 'runtimeType': asset['runtimeType']} for asset in seed['assets']],
+    }
+
+
+def synthetic_projection(seed: Dict, years: int, individuals: int, accounts: int,
+                         random_seed: int = 0, scenario_id: Optional[str] = None) -> Dict:
+    """
+    Build a fully populated projection JSON of the requested size.
+
+    Args:
+        seed: Sample data from load_seed()
+        years: Number of projected years (e.g. 30-100)
+        individuals: 1 (single) or 2 (couple)
+        accounts: Number of asset accounts (e.g. 5-200)
+        random_seed: Seed for the per-account and per-year variation
+        scenario_id: Scenario id (defaults to the sample's)
+
+    Returns:
+        Dict: Projection JSON as sent by the client (camelCase keys)
+    """
+    rng = random.Random(random_seed)
+    base = seed['projection']
+    first_year = base['years'][0] if base.get('years') else {}
+    start_year = base.get('startYear', 2025)
+    inflation = base.get('inflationRate', 0.02)
+    primary_age = first_year.get('primaryAge') or 58
+    spouse_age = first_year.get('spouseAge') or primary_age
+
+    # Cycle the sample accounts (balance and type) to reach the requested count
+    sample_balances = list(first_year.get('assetsStartOfYear', {}).values()) or [100000.0]
+    account_ids = [f'acct-{idx:04d}' for idx in range(accounts)]
+    balances = [sample_balances[idx % len(sample_balances)] * rng.uniform(0.5, 1.5) for idx in range(accounts)]
+    return_rates = [rng.uniform(0.01, 0.07) for _ in range(accounts)]
+    individual_ids = [f'person-{idx + 1}' for idx in range(individuals)]
+
+    year_list = []
+    for idx in range(years):
+        growth = (1 + inflation) ** idx
+        working = idx < WORKING_YEARS
+
+        # Income per individual: employment while working, pensions afterwards
+        income_by_individual = {}
+        for person_idx, individual_id in enumerate(individual_ids):
+            age = (primary_age if person_idx == 0 else spouse_age) + idx
+            income = {source: 0.0 for source in INCOME_SOURCES}
+            if working:
+                income['employment'] = 85000.0 * growth * rng.uniform(0.9, 1.1)
+            if age >= 65:
+                income['rrq'] = 16000.0 * growth
+                income['psv'] = 8500.0 * growth
+            if age >= 72:
+                income['rrif'] = 12000.0 * growth
+            income['other'] = rng.uniform(0, 2000)
+            income_by_individual[individual_id] = income
+        total_income = sum(sum(income.values()) for income in income_by_individual.values())
+
+        expenses = {category: rng.uniform(2000, 20000) * growth * individuals for category in EXPENSE_CATEGORIES}
+        total_expenses = sum(expenses.values())
+        federal_tax = total_income * 0.12
+        quebec_tax = total_income * 0.14
+        total_tax = federal_tax + quebec_tax
+        after_tax = total_income - total_tax
+        net_cash_flow = after_tax - total_expenses
+
+        # Spread the cash flow over the accounts as contributions or withdrawals
+        start = dict(zip(account_ids, balances))
+        returns = {account_id: balance * rate for account_id, balance, rate in zip(account_ids, balances, return_rates)}
+        share = abs(net_cash_flow) / accounts
+        flows = {account_id: share * rng.uniform(0.5, 1.5) for account_id in account_ids}
+        contributions = flows if net_cash_flow >= 0 else {}
+        withdrawals = flows if net_cash_flow < 0 else {}
+        balances = [
+            start[account_id] + returns[account_id] + contributions.get(account_id, 0.0)
+            - withdrawals.get(account_id, 0.0)
+            for account_id in account_ids
+        ]
+        end = dict(zip(account_ids, balances))
+
+        shortfall = -net_cash_flow if net_cash_flow < 0 and idx % 9 == 4 else 0.0
+        year = {
+            'year': start_year + idx,
+            'yearsFromStart': idx,
+            'primaryAge': primary_age + idx,
+            'incomeByIndividual': income_by_individual,
+            'totalIncome': total_income,
+            'taxableIncome': total_income,
+            'federalTax': federal_tax,
+            'quebecTax': quebec_tax,
+            'totalTax': total_tax,
+            'afterTaxIncome': after_tax,
+            'totalExpenses': total_expenses,
+            'expensesByCategory': expenses,
+            'withdrawalsByAccount': withdrawals,
+            'contributionsByAccount': contributions,
+            'totalWithdrawals': sum(withdrawals.values()),
+            'totalContributions': sum(contributions.values()),
+            'celiContributionRoom': 7000.0 * growth,
+            'netCashFlow': net_cash_flow,
+            'assetsStartOfYear': start,
+            'assetsEndOfYear': end,
+            'assetReturns': returns,
+            'netWorthStartOfYear': sum(start.values()),
+            'netWorthEndOfYear': sum(end.values()),
+            'eventsOccurred': ['retirement'] if idx == WORKING_YEARS else [],
+            'hasShortfall': shortfall > 0,
+            'shortfallAmount': shortfall,
+        }
+        if individuals > 1:
+            year['spouseAge'] = spouse_age + idx
+        year_list.append(year)
+
+    return {
+        'scenarioId': scenario_id or base.get('scenarioId', 'base'),
+        'projectId': base.get('projectId', 'synthetic'),
+        'startYear': start_year,
+        'endYear': start_year + years - 1,
+        'inflationRate': inflation,
+        'useConstantDollars': base.get('useConstantDollars', False),
+        'calculatedAt': base.get('calculatedAt', '2025-01-01T00:00:00.000'),
+        'years': year_list,
+    }
+
+
+def synthetic_assets(seed: Dict, accounts: int) -> List[Dict]:
+    """Asset list matching synthetic_projection's account ids, cycling the sample asset types."""
+    types = [asset['runtimeType'] for asset in seed['assets']] or DEFAULT_ASSET_TYPES
+    return [{'id': f'acct-{idx:04d}', 'runtimeType': types[idx % len(types)]} for idx in range(accounts)]
+
+
+def synthetic_request(seed: Dict, years: int, individuals: int, accounts: int,
+                      scenarios: int = 1, random_seed: int = 0) -> Dict:
+    """
+    Build an export request body.
+
+    With scenarios == 1 this is the single-scenario shape; otherwise the
+    multi-scenario comparison shape with one varied projection per scenario.
+    """
+    assets = synthetic_assets(seed, accounts)
+    if scenarios == 1:
+        return {
+            'projection': synthetic_projection(seed, years, individuals, accounts, random_seed),
+            'scenarioName': 'Synthetic',
+            'assets': assets,
+        }
+    return {
+        'scenarios': [
+            {
+                'projection': synthetic_projection(seed, years, individuals, accounts, random_seed + idx,
+                                                   scenario_id=f'scenario-{idx + 1}'),
+                'scenarioName': f'Scenario {idx + 1}',
+                'assets': assets,
+            }
+            for idx in range(scenarios)
+        ],
+    }
@@ -0,0 +1,56 @@
+"""
+Tax check of the projection engine's own output.
+
+Projects every scenario of the sample project files (testdata/project_*.json
+and the sample plan) and runs tax.check_projection_taxes on the result, the
+way EXPORT_TAX_CHECK=1 does in the handler: with each individual's birth
+year, and with the primary/spouse ages alone (client projections). The
+engine computes its taxes with the same tables, so no year may differ; with
+primary/spouse ages only, the years of a third individual with income are
+reported as unchecked rather than as mismatches. Exits with status 1 on any
+mismatched year.
+
+Usage (from the functions/ directory):
+    python -m benchmarks.tax_check
+"""
+
+import glob
+import io
+import json
+import os
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from request_parser import parse_export_request
+from tax import check_projection_taxes
+from benchmarks.synthetic import TESTDATA_DIR, load_plan
+
+
+def iter_projects() -> Iterator[Tuple[str, Dict]]:
+    """(label, project export) of each sample project."""
+    for path in sorted(glob.glob(os.path.join(TESTDATA_DIR, 'project_*.json'))):
+        with open(path) as f:
+            yield os.path.basename(path), json.load(f)
+    yield 'plan', load_plan()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    failures = 0
+    print(f'{"project":<40} {"scenario":<20} {"ages":<15} {"checked":>7} {"unchecked":>9} {"mismatched":>10}  max diff')
+    for label, project in iter_projects():
+        scenario_ids = [scenario['id'] for scenario in project.get('scenarios', [])] or [None]
+        body = {'project': project, 'scenarioIds': scenario_ids} if len(scenario_ids) > 1 else {'project': project}
+        for scenario in parse_export_request(io.BytesIO(json.dumps(body).encode())).scenarios:
+            for ages, birth_years in (('birth years', scenario['birth_years']), ('primary/spouse', None)):
+                check = check_projection_taxes(scenario['projection'], birth_years=birth_years)
+                print(f'{label[:40]:<40} {scenario["scenario_name"][:20]:<20} {ages:<15} {check.years_checked:>7} '
+                      f'{len(check.unchecked_years):>9} {len(check.mismatched_years):>10}  '
+                      f'${check.max_difference:,.2f}')
+                failures += not check.ok
+
+    print('OK' if not failures else f'FAIL: {failures} checks with mismatched years')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
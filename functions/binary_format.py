@@ -0,0 +1,359 @@
+"""
+Compact columnar request format.
+An alternative to the JSON request body for projection exports (Content-Type
+application/vnd.retire1.projection+msgpack). Instead of one object per year
+with long camelCase keys and per-account maps keyed by UUID, each projection
+carries one array per metric and one [years x ids] matrix per keyed map, and
+ids repeated across scenarios can be sent once in a key dictionary. Arrays
+arrive as packed little-endian binary and are loaded straight into a
+ColumnarProjection with numpy, without per-year dict lookups.
+
+Layout (a MessagePack map, same shapes as the JSON request):
+
+    {"projection": P, "scenarioName": str, "assets": [A, ...]}
+    or {"scenarios": [{"projection": P, "scenarioName": str, "assets": [...]}, ...]}
+    plus "keys": [str, ...]   optional; wherever an id is expected, an
+                              integer i stands for keys[i]
+
+    A: {"id": id, "runtimeType": str}
+    P: the JSON projection header (scenarioId, projectId, startYear, endYear,
+       useConstantDollars, inflationRate, calculatedAt) and
+       "columns": {
+           "year", "yearsFromStart":       int64 [years]
+           "primaryAge", "spouseAge":      float64 [years], NaN when absent (optional)
+           "hasShortfall":                 bool [years] (optional)
+           <SCALAR_METRICS JSON keys>:     float64 [years]
+           "accountIds": [id, ...]
+           <ACCOUNT_MAPS JSON keys>:       float64 [years x accounts]
+           "categoryIds": [id, ...], "expensesByCategory": float64 [years x categories]
+           "individualIds": [id, ...], "incomeByIndividual": float64 [years x individuals x INCOME_SOURCES]
+           "eventsOccurred":               [[str, ...] per year] (optional)
+       }
+
+Numeric columns are bin values holding little-endian int64/float64 (one
+byte per year for hasShortfall) or plain MessagePack arrays; matrices are
+flattened row by row. Columns that are optional in the JSON request may be
+left out and read as zeros. Project exports stay JSON only: they are small,
+and the projection is computed server-side.
+"""
+
+from typing import Dict, List, Optional, Sequence
+import msgpack
+import numpy as np
+
+from columnar import ColumnarProjection, SCALAR_METRICS, ACCOUNT_MAPS, INCOME_SOURCES
+from models import Asset, parse_calculated_at
+from request_parser import ParsedExportRequest, SINGLE_SCENARIO_NAME, MULTI_SCENARIO_NAME
+from request_encoding import BodyDecodingError
+from admission import RequestCost, request_cost
+
+
+# Projection header: ColumnarProjection field -> key
+HEADER_FIELDS = {
+    'scenario_id': 'scenarioId',
+    'project_id': 'projectId',
+    'start_year': 'startYear',
+    'end_year': 'endYear',
+    'use_constant_dollars': 'useConstantDollars',
+    'inflation_rate': 'inflationRate',
+    'calculated_at': 'calculatedAt',
+}
+
+_INT64 = np.dtype('<i8')
+_FLOAT64 = np.dtype('<f8')
+
+_UNPACK_ERRORS = (ValueError, TypeError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError)
+
+
+def unpack_payload(body: bytes) -> Dict:
+    """
+    Unpack a binary request body.
+
+    Only the MessagePack framing is decoded here (packed arrays stay bytes),
+    which is cheap enough to run before admission for the cost estimate.
+
+    Raises:
+        BodyDecodingError: The body is not a MessagePack map
+    """
+    try:
+        payload = msgpack.unpackb(body, raw=False)
+    except _UNPACK_ERRORS as e:
+        raise BodyDecodingError(f'Invalid binary request body: {str(e) or type(e).__name__}') from e
+    if not isinstance(payload, dict):
+        raise BodyDecodingError('Invalid binary request body: expected a map')
+    return payload
+
+
+def estimate_payload_cost(payload: Dict, size: int) -> RequestCost:
+    """
+    Admission cost of an unpacked binary payload.
+
+    Dimensions come from the column lengths and id lists (the largest
+    scenario counts for all of them); malformed parts count as empty and are
+    reported by parse_binary_request.
+    """
+    scenarios = payload.get('scenarios') if 'scenarios' in payload else [payload]
+    scenarios = [scenario for scenario in scenarios if isinstance(scenario, dict)] \
+        if isinstance(scenarios, list) else []
+    years = accounts = individuals = 0
+    for scenario in scenarios:
+        projection = scenario.get('projection')
+        columns = projection.get('columns') if isinstance(projection, dict) else None
+        if not isinstance(columns, dict):
+            continue
+        years = max(years, _length(columns.get('year'), _INT64.itemsize))
+        accounts = max(accounts, _length(columns.get('accountIds'), 1))
+        individuals = max(individuals, _length(columns.get('individualIds'), 1))
+    return request_cost(max(1, len(scenarios)), years, accounts, max(1, individuals), 0, size)
+
+
+def _length(values, itemsize: int) -> int:
+    """Number of values in a packed (itemsize bytes each) or list column."""
+    if isinstance(values, bytes):
+        return len(values) // itemsize
+    return len(values) if isinstance(values, list) else 0
+
+
+def parse_binary_request(payload: Dict) -> Optional[ParsedExportRequest]:
+    """
+    Build a parsed export request from an unpacked binary payload.
+
+    Mirrors parse_export_request: None for an empty payload, KeyError for
+    missing required fields.
+
+    Raises:
+        BodyDecodingError: Malformed scenarios, assets, ids or columns (wrong
+            shapes, lengths or types) or a project export
+    """
+    if not payload:
+        return None
+    keys = _list(payload.get('keys') or [], 'keys')
+    if not all(isinstance(key, str) for key in keys):
+        raise BodyDecodingError('Invalid keys: expected a list of strings')
+
+    if 'scenarios' in payload:
+        scenarios = [_scenario(_map(scenario, 'scenarios item'), keys, MULTI_SCENARIO_NAME)
+                     for scenario in _list(payload['scenarios'], 'scenarios')]
+        return ParsedExportRequest(is_multi_scenario=True, scenarios=scenarios)
+
+    if 'project' in payload and 'projection' not in payload:
+        raise BodyDecodingError('Project exports must be sent as JSON')
+
+    parsed = ParsedExportRequest(is_multi_scenario=False)
+    if 'projection' in payload:
+        parsed.scenarios.append(_scenario(payload, keys, SINGLE_SCENARIO_NAME))
+    return parsed
+
+
+def _scenario(data: Dict, keys: Sequence[str], default_name: str) -> Dict:
+    """Generator-ready scenario dict from one scenario of the payload."""
+    return {
+        'projection': projection_from_columns(_map(data['projection'], 'projection'), keys),
+        'scenario_name': data.get('scenarioName', default_name),
+        'assets': [_asset(_map(asset, 'asset'), keys) for asset in _list(data.get('assets', []), 'assets')],
+    }
+
+
+def _asset(data: Dict, keys: Sequence[str]) -> Asset:
+    """Asset of a scenario, with its id resolved."""
+    return Asset.from_dict({**data, 'id': _resolve_id(data['id'], keys)})
+
+
+def _map(value, name: str) -> Dict:
+    """value, checked to be a map."""
+    if not isinstance(value, dict):
+        raise BodyDecodingError(f'Invalid {name}: expected a map')
+    return value
+
+
+def _list(value, name: str) -> List:
+    """value, checked to be an array."""
+    if not isinstance(value, list):
+        raise BodyDecodingError(f'Invalid {name}: expected an array')
+    return value
+
+
+def projection_from_columns(data: Dict, keys: Sequence[str] = ()) -> ColumnarProjection:
+    """
+    Load a binary projection (header and columns) into a ColumnarProjection.
+
+    Args:
+        data: Projection map of the payload
+        keys: Key dictionary that integer ids refer to
+    """
+    columns = _map(data['columns'], 'columns')
+    year = _column(columns, 'year', _INT64, None, required=True)
+    num_years = len(year)
+
+    account_ids = _ids(columns, 'accountIds', keys)
+    category_ids = _ids(columns, 'categoryIds', keys)
+    individual_ids = _ids(columns, 'individualIds', keys)
+
+    return ColumnarProjection(
+        scenario_id=data['scenarioId'],
+        project_id=data['projectId'],
+        start_year=data['startYear'],
+        end_year=data['endYear'],
+        use_constant_dollars=data['useConstantDollars'],
+        inflation_rate=data['inflationRate'],
+        calculated_at=parse_calculated_at(data['calculatedAt']),
+        year=year,
+        years_from_start=_column(columns, 'yearsFromStart', _INT64, (num_years,), required=True),
+        primary_age=_ages(columns, 'primaryAge', num_years),
+        spouse_age=_ages(columns, 'spouseAge', num_years),
+        has_shortfall=_flags(columns, 'hasShortfall', num_years),
+        metrics={
+            name: _column(columns, key, _FLOAT64, (num_years,), required)
+            for name, (key, required) in SCALAR_METRICS.items()
+        },
+        individual_ids=individual_ids,
+        income=_column(columns, 'incomeByIndividual', _FLOAT64,
+                       (num_years, len(individual_ids), len(INCOME_SOURCES)), required=False),
+        category_ids=category_ids,
+        expenses_by_category=_column(columns, 'expensesByCategory', _FLOAT64,
+                                     (num_years, len(category_ids)), required=False),
+        account_ids=account_ids,
+        accounts={
+            name: _column(columns, key, _FLOAT64, (num_years, len(account_ids)), required)
+            for name, (key, required) in ACCOUNT_MAPS.items()
+        },
+        events_occurred=_events(columns, num_years),
+    )
+
+
+def _column(columns: Dict, key: str, dtype: np.dtype, shape: Optional[tuple], required: bool) -> np.ndarray:
+    """
+    Read one numeric column as a native, writable array of the given shape.
+
+    shape None accepts any length (the year column, which sets it).
+    """
+    values = columns[key] if required else columns.get(key)
+    if values is None:
+        return np.zeros(shape, dtype=dtype.newbyteorder('='))
+    try:
+        if isinstance(values, bytes):
+            array = np.frombuffer(values, dtype=dtype)
+        else:
+            array = np.array(values, dtype=dtype)
+    except (ValueError, TypeError) as e:
+        raise BodyDecodingError(f'Invalid column {key}: {str(e)}') from e
+    # astype copies, so the array owns writable memory in native byte order
+    array = array.astype(dtype.newbyteorder('='))
+    if shape is None:
+        return array.reshape(-1)
+    if array.size != int(np.prod(shape)):
+        raise BodyDecodingError(f'Invalid column {key}: {array.size} values, expected '
+                                f'{" x ".join(str(size) for size in shape)}')
+    return array.reshape(shape)
+
+
+def _ages(columns: Dict, key: str, num_years: int) -> np.ndarray:
+    """Age column, NaN where absent (nil in list form)."""
+    if columns.get(key) is None:
+        return np.full(num_years, np.nan)
+    return _column(columns, key, _FLOAT64, (num_years,), required=True)
+
+
+def _flags(columns: Dict, key: str, num_years: int) -> np.ndarray:
+    """Boolean column, packed as one byte per year or a list of booleans."""
+    values = columns.get(key)
+    if isinstance(values, bytes):
+        values = np.frombuffer(values, dtype=np.uint8)
+    return _column({key: values}, key, np.dtype(bool), (num_years,), required=False)
+
+
+def _events(columns: Dict, num_years: int) -> List[List[str]]:
+    """Per-year event lists (empty when the column is left out)."""
+    events = columns.get('eventsOccurred')
+    if events is None:
+        return [[] for _ in range(num_years)]
+    if (not isinstance(events, list) or len(events) != num_years
+            or not all(isinstance(year_events, list) for year_events in events)):
+        raise BodyDecodingError(f'Invalid column eventsOccurred: expected {num_years} lists')
+    return [list(year_events) for year_events in events]
+
+
+def _ids(columns: Dict, key: str, keys: Sequence[str]) -> List[str]:
+    """Resolve an id list column (strings or key dictionary indexes), empty when left out."""
+    return [_resolve_id(value, keys) for value in _list(columns.get(key, []), f'column {key}')]
+
+
+def _resolve_id(value, keys: Sequence[str]) -> str:
+    """An id sent as a string or as an index into the key dictionary."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        if not 0 <= value < len(keys):
+            raise BodyDecodingError(f'Invalid key index: {value}')
+        return keys[value]
+    if not isinstance(value, str):
+        raise BodyDecodingError(f'Invalid id: {value!r}')
+    return value
+
+
+def encode_export_request(body: Dict) -> bytes:
+    """
+    Encode a JSON projection export request in the binary format.
+
+    Reference encoder for clients and benchmarks: ids that appear more than
+    once go to the key dictionary and every column is packed.
+
+    Args:
+        body: Single- or multi-scenario JSON request (project exports are not supported)
+    """
+    key_index: Dict[str, int] = {}
+    counts: Dict[str, int] = {}
+    scenarios = body['scenarios'] if 'scenarios' in body else [body]
+    projections = [ColumnarProjection.from_dict(scenario['projection']) for scenario in scenarios]
+
+    # Only ids used more than once are worth a dictionary entry
+    for scenario, projection in zip(scenarios, projections):
+        for value in ([asset['id'] for asset in scenario.get('assets', [])] + projection.account_ids
+                      + projection.category_ids + projection.individual_ids):
+            counts[value] = counts.get(value, 0) + 1
+
+    def encode_id(value: str):
+        if counts.get(value, 0) < 2:
+            return value
+        if value not in key_index:
+            key_index[value] = len(key_index)
+        return key_index[value]
+
+    encoded = []
+    for scenario, projection in zip(scenarios, projections):
+        item = {'projection': _projection_map(projection, encode_id)}
+        if 'scenarioName' in scenario:
+            item['scenarioName'] = scenario['scenarioName']
+        item['assets'] = [{**asset, 'id': encode_id(asset['id'])} for asset in scenario.get('assets', [])]
+        encoded.append(item)
+
+    payload = {'scenarios': encoded} if 'scenarios' in body else encoded[0]
+    if key_index:
+        payload['keys'] = list(key_index)
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def _projection_map(projection: ColumnarProjection, encode_id) -> Dict:
+    """Header and packed columns of one projection."""
+    data = {key: getattr(projection, name) for name, key in HEADER_FIELDS.items()}
+    data['calculatedAt'] = projection.calculated_at.isoformat()
+
+    columns = {
+        'year': projection.year.astype(_INT64).tobytes(),
+        'yearsFromStart': projection.years_from_start.astype(_INT64).tobytes(),
+        'hasShortfall': projection.has_shortfall.astype(np.uint8).tobytes(),
+        'accountIds': [encode_id(value) for value in projection.account_ids],
+        'categoryIds': [encode_id(value) for value in projection.category_ids],
+        'individualIds': [encode_id(value) for value in projection.individual_ids],
+        'incomeByIndividual': projection.income.astype(_FLOAT64).tobytes(),
+        'expensesByCategory': projection.expenses_by_category.astype(_FLOAT64).tobytes(),
+        'eventsOccurred': projection.events_occurred,
+    }
+    for name in ('primary_age', 'spouse_age'):
+        ages = getattr(projection, name)
+        if not np.isnan(ages).all():
+            columns['primaryAge' if name == 'primary_age' else 'spouseAge'] = ages.astype(_FLOAT64).tobytes()
+    for name, (key, _) in SCALAR_METRICS.items():
+        columns[key] = projection.metrics[name].astype(_FLOAT64).tobytes()
+    for name, (key, _) in ACCOUNT_MAPS.items():
+        columns[key] = projection.accounts[name].astype(_FLOAT64).tobytes()
+    data['columns'] = columns
+    return data
@@ -0,0 +1,237 @@
+"""
+Bulk exports.
+Builds the workbooks of many export payloads from one request on the worker
+pool and streams them back as entries of a ZIP archive in the order they
+finish. Payloads are parsed only when a build slot frees up and each finished
+workbook is handed to the response as soon as it is written, so memory is
+bounded by the number of builds in flight rather than the size of the request.
+Each payload is admitted on its own estimated cost (BulkAdmission), so a bulk
+request shares the instance's capacity with single exports.
+"""
+
+import json
+import math
+import os
+import time
+import traceback
+import zipfile
+from concurrent.futures import Executor, FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional
+
+from admission import AdmissionController, RequestCost
+from excel_generator import generator_for_request
+from request_parser import ParsedExportRequest
+from worker_pool import export_worker_count
+
+
+# Largest number of payloads accepted in one bulk request
+MAX_BULK_EXPORTS = 200
+
+# Name of the archive entry listing every payload's outcome
+MANIFEST_NAME = 'manifest.json'
+
+
+@dataclass
+class BulkItem:
+    """One payload of a bulk request, ready to build (or already failed)."""
+    index: int
+    filename: str = ''
+    export_request: Optional[ParsedExportRequest] = None
+    error: Optional[str] = None
+    units: float = 0.0  # Admission units held until the workbook is built
+
+    @property
+    def entry_name(self) -> str:
+        """Archive entry name (prefixed with the payload position, so names never clash)."""
+        return f'{self.index + 1:03d}_{self.filename}'
+
+
+class BulkRejected(Exception):
+    """No room for the first payload of a bulk request (answered with 429)."""
+
+    def __init__(self, retry_after: int):
+        super().__init__('Too many exports in progress, retry later')
+        self.retry_after = retry_after
+
+
+class BulkAdmission:
+    """
+    Admission of a bulk request's payloads, one at a time.
+
+    A payload is admitted on its estimated cost before it is projected
+    (project payloads) or built, and holds the units until its workbook is
+    written. The first payload waits as long as a single export would and
+    turns the whole request away (BulkRejected) when there is no room. Once
+    the archive is streaming, later payloads wait for room as earlier builds
+    finish.
+    """
+
+    def __init__(self, controller: AdmissionController):
+        self._controller = controller
+        self._units: Optional[float] = None  # Held by the payload being parsed
+        self.streaming = False
+
+    def admit(self, cost: RequestCost):
+        """Wait for room for the payload being parsed (once per payload)."""
+        if self._units is not None:
+            return
+        units = self._controller.acquire(cost, math.inf if self.streaming else None)
+        if units is None:
+            raise BulkRejected(self._controller.retry_after())
+        self._units = units
+
+    def take(self) -> float:
+        """Units held by the payload just parsed (0.0 when it was not admitted)."""
+        units, self._units = self._units or 0.0, None
+        return units
+
+    def release(self, units: float):
+        """Return the units of a built (or failed) payload."""
+        if units:
+            self._controller.release(units)
+
+
+def build_workbook(export_request: ParsedExportRequest) -> bytes:
+    """
+    Build one workbook.
+
+    Module-level so it can be shipped to a worker process; comparison
+    scenarios are prepared inline there, the pool is already busy with
+    other payloads.
+    """
+    return generator_for_request(export_request).generate()
+
+
+class _ArchiveBuffer:
+    """Write-only sink for zipfile that hands out what was written so far."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        """Bytes written since the last drain."""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_bulk_zip(items: Iterator[BulkItem], executor: Optional[Executor] = None,
+                    max_in_flight: int = 4, release: Optional[Callable[[float], None]] = None) -> Iterator[bytes]:
+    """
+    Build bulk payloads and yield a ZIP archive of the workbooks, chunk by chunk.
+
+    Workbooks are stored (xlsx files are already deflated) under
+    BulkItem.entry_name as each build finishes, followed by a manifest.json
+    listing every payload's index, filename, status and error.
+
+    Args:
+        items: Payloads in request order; pulled lazily, one per free build slot
+        executor: Pool the builds run on (None builds inline, one at a time)
+        max_in_flight: Most builds queued or running at once
+        release: Called with BulkItem.units once each build has finished
+
+    Yields:
+        Archive bytes, one chunk per finished workbook
+    """
+    start_time = time.time()
+    buffer = _ArchiveBuffer()
+    manifest: List[Dict] = []
+    pending: Dict[Future, BulkItem] = {}
+
+    def record(item: BulkItem, size: Optional[int] = None):
+        manifest.append({
+            'index': item.index,
+            'filename': item.entry_name if item.error is None else None,
+            'status': 'done' if item.error is None else 'failed',
+            'size': size,
+            'error': item.error,
+        })
+
+    def add_entry(item: BulkItem, build) -> bytes:
+        """Write one finished build (or record its failure) and return the new archive bytes."""
+        try:
+            body = build()
+        except Exception as e:
+            print(f'Bulk export {item.index} failed: {str(e)}')
+            traceback.print_exc()
+            item.error = f'Internal server error: {str(e)}'
+            record(item)
+            return b''
+        info = zipfile.ZipInfo(item.entry_name, time.localtime(time.time())[:6])
+        archive.writestr(info, body, compress_type=zipfile.ZIP_STORED)
+        record(item, len(body))
+        return buffer.drain()
+
+    def finish_some() -> Iterator[bytes]:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            chunk = add_entry(pending.pop(future), future.result)
+            if chunk:
+                yield chunk
+
+    def release_units(units: float):
+        if release is not None and units:
+            release(units)
+
+    archive = zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED)
+    try:
+        try:
+            for item in items:
+                if item.error is not None:
+                    release_units(item.units)
+                    record(item)
+                    continue
+                if executor is None:
+                    try:
+                        chunk = add_entry(item, lambda request=item.export_request: build_workbook(request))
+                    finally:
+                        release_units(item.units)
+                    if chunk:
+                        yield chunk
+                    continue
+                future = executor.submit(build_workbook, item.export_request)
+                # Released when the build ends (or is cancelled), however slowly the archive is read
+                future.add_done_callback(lambda _, units=item.units: release_units(units))
+                pending[future] = item
+                item.export_request = None  # The pool holds its own copy
+                while len(pending) >= max_in_flight:
+                    yield from finish_some()
+        except Exception as e:
+            # The response is already streaming; report the failure in the manifest
+            print(f'Bulk export aborted: {str(e)}')
+            traceback.print_exc()
+            manifest.append({'index': None, 'filename': None, 'status': 'failed', 'size': None,
+                             'error': f'Request aborted: {str(e)}'})
+        while pending:
+            yield from finish_some()
+
+        manifest.sort(key=lambda entry: (entry['index'] is None, entry['index']))
+        archive.writestr(MANIFEST_NAME, json.dumps({'exports': manifest}, indent=2))
+        archive.close()
+        yield buffer.drain()
+    finally:
+        # Client went away (or a build raised): drop builds that have not started
+        for future in pending:
+            future.cancel()
+
+    done_count = sum(1 for entry in manifest if entry['status'] == 'done')
+    print(f'Bulk export: {done_count} of {len(manifest)} workbooks in '
+          f'{(time.time() - start_time)*1000:.1f}ms')
+
+
+def bulk_in_flight_from_env() -> int:
+    """
+    Most bulk builds in flight per request.
+
+    EXPORT_BULK_IN_FLIGHT  Defaults to twice the worker count, so every worker
+                           has its next payload queued
+    """
+    return max(1, int(os.environ.get('EXPORT_BULK_IN_FLIGHT') or 0) or 2 * export_worker_count())
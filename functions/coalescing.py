@@ -0,0 +1,98 @@
+"""
+Request coalescing (single flight).
+When identical export requests reach the same instance at the same time
+(client retries, double clicks), only the first one parses the body and builds
+the workbook; the others wait for it and share its result. Keys are a hash of
+the raw request body, so duplicates are recognized before any parsing.
+"""
+
+import hashlib
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+
+T = TypeVar('T')
+
+
+def request_body_key(body: bytes) -> str:
+    """Coalescing key of a raw request body."""
+    return hashlib.sha256(body).hexdigest()
+
+
+class _Flight:
+    """One in-progress build and the outcome its waiters receive."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class RequestCoalescer:
+    """Runs at most one build per key at a time and hands its result to concurrent duplicates."""
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+        # Counters reported in the timing logs
+        self.leaders = 0
+        self.coalesced = 0
+
+    def run(self, key: str, build: Callable[[], T]) -> Tuple[T, bool]:
+        """
+        Build the result for key, or wait for the identical build already running.
+
+        Args:
+            key: Request key (e.g. request_body_key())
+            build: Produces the result; only called by the first request of a flight
+
+        Returns:
+            (result, coalesced): coalesced is True when the result came from
+            another request's build. A build's exception is raised in every
+            request that waited on it.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = build()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            # Later arrivals start a new flight (and typically hit the export cache)
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    def stats(self) -> Dict[str, int]:
+        """Flight counters since start-up."""
+        with self._lock:
+            return {'leaders': self.leaders, 'coalesced': self.coalesced, 'in_flight': len(self._flights)}
+
+
+def create_request_coalescer_from_env() -> Optional[RequestCoalescer]:
+    """
+    Build the process-wide coalescer from environment variables.
+
+    EXPORT_COALESCE  '0' disables coalescing (enabled by default)
+    """
+    if os.environ.get('EXPORT_COALESCE', '1').lower() in ('0', 'false', 'off'):
+        return None
+    return RequestCoalescer()
@@ -0,0 +1,309 @@
+"""
+Column-oriented projection data.
+Stores one contiguous NumPy array per metric instead of one dataclass per year,
+so whole-projection reductions are vectorized and large requests stay compact.
+Years are read from JSON by a function generated at import from the metric
+specs below (see _compile_add_year).
+"""
+
+from array import array
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+from models import Projection, YearlyProjection, generate_function, parse_calculated_at
+
+
+# Scalar float metrics: attribute name -> (JSON key, required)
+SCALAR_METRICS = {
+    'total_income': ('totalIncome', True),
+    'taxable_income': ('taxableIncome', False),
+    'federal_tax': ('federalTax', False),
+    'quebec_tax': ('quebecTax', False),
+    'total_tax': ('totalTax', False),
+    'after_tax_income': ('afterTaxIncome', False),
+    'total_expenses': ('totalExpenses', True),
+    'total_withdrawals': ('totalWithdrawals', False),
+    'total_contributions': ('totalContributions', False),
+    'celi_contribution_room': ('celiContributionRoom', False),
+    'net_cash_flow': ('netCashFlow', True),
+    'net_worth_start_of_year': ('netWorthStartOfYear', True),
+    'net_worth_end_of_year': ('netWorthEndOfYear', True),
+    'shortfall_amount': ('shortfallAmount', False),
+}
+
+# Per-account maps sharing the account index: attribute name -> (JSON key, required)
+ACCOUNT_MAPS = {
+    'withdrawals_by_account': ('withdrawalsByAccount', False),
+    'contributions_by_account': ('contributionsByAccount', False),
+    'assets_start_of_year': ('assetsStartOfYear', True),
+    'assets_end_of_year': ('assetsEndOfYear', True),
+    'asset_returns': ('assetReturns', False),
+}
+
+# AnnualIncome fields, in display order (last axis of ColumnarProjection.income)
+INCOME_SOURCES = ['employment', 'rrq', 'psv', 'rrif', 'rrpe', 'other']
+
+
+@dataclass
+class ColumnarProjection:
+    """Complete projection stored as one array per metric."""
+    scenario_id: str
+    project_id: str
+    start_year: int
+    end_year: int
+    use_constant_dollars: bool
+    inflation_rate: float
+    calculated_at: datetime
+    year: np.ndarray                 # int64 [years]
+    years_from_start: np.ndarray     # int64 [years]
+    primary_age: np.ndarray          # float64 [years], NaN when absent
+    spouse_age: np.ndarray           # float64 [years], NaN when absent
+    has_shortfall: np.ndarray        # bool [years]
+    metrics: Dict[str, np.ndarray]   # float64 [years], keyed by SCALAR_METRICS
+    individual_ids: List[str]
+    income: np.ndarray               # float64 [years, individuals, INCOME_SOURCES]
+    category_ids: List[str]
+    expenses_by_category: np.ndarray  # float64 [years, categories]
+    account_ids: List[str]
+    accounts: Dict[str, np.ndarray]  # float64 [years, accounts], keyed by ACCOUNT_MAPS
+    events_occurred: List[List[str]]
+
+    @property
+    def num_years(self) -> int:
+        """Number of projected years."""
+        return len(self.year)
+
+    @property
+    def has_couples(self) -> bool:
+        """Whether any year has a spouse age."""
+        return bool(self.num_years) and not bool(np.isnan(self.spouse_age).all())
+
+    def column(self, name: str) -> List:
+        """
+        Return a per-year column as plain Python values for cell writing.
+
+        Ages are returned as int or None, everything else as int/float/bool.
+        """
+        if name in self.metrics:
+            return self.metrics[name].tolist()
+        if name in ('primary_age', 'spouse_age'):
+            return [None if age != age else int(age) for age in getattr(self, name).tolist()]
+        return getattr(self, name).tolist()
+
+    @classmethod
+    def from_dict(cls, data: Dict, complete: bool = False) -> 'ColumnarProjection':
+        """
+        Create ColumnarProjection directly from the projection JSON.
+
+        With complete=True every year must carry every key (KeyError otherwise).
+        """
+        builder = ColumnarProjectionBuilder()
+        add_year = builder.add_complete_year if complete else builder.add_year
+        for year_data in data['years']:
+            add_year(year_data)
+        return builder.build(data)
+
+    @classmethod
+    def from_projection(cls, projection: Projection) -> 'ColumnarProjection':
+        """Create ColumnarProjection from the per-year dataclass model."""
+        builder = ColumnarProjectionBuilder()
+        for year in projection.years:
+            builder.add_yearly_projection(year)
+        return builder.finish(
+            scenario_id=projection.scenario_id,
+            project_id=projection.project_id,
+            start_year=projection.start_year,
+            end_year=projection.end_year,
+            use_constant_dollars=projection.use_constant_dollars,
+            inflation_rate=projection.inflation_rate,
+            calculated_at=projection.calculated_at,
+        )
+
+
+def _compile_add_year(complete: bool) -> Callable:
+    """
+    Generate ColumnarProjectionBuilder.add_year (or add_complete_year).
+
+    Every metric, map and income source becomes a direct key lookup and
+    append, unrolled from SCALAR_METRICS, ACCOUNT_MAPS and INCOME_SOURCES.
+    In complete mode optional keys are indexed like required ones.
+    """
+    def value(key: str, required: bool, default: str, source: str = 'data') -> str:
+        return f'{source}[{key!r}]' if complete or required else f'{source}.get({key!r}, {default})'
+
+    lines = [
+        'row = len(self._year)',
+        "self._year.append(data['year'])",
+        "self._years_from_start.append(data['yearsFromStart'])",
+        f"self._append_age(self._primary_age, {value('primaryAge', False, 'None')})",
+        f"self._append_age(self._spouse_age, {value('spouseAge', False, 'None')})",
+        f"self._has_shortfall.append(1 if {value('hasShortfall', False, 'False')} else 0)",
+        'metrics = self._metrics',
+    ]
+    for name, (key, required) in SCALAR_METRICS.items():
+        lines.append(f"metrics[{name!r}].append({value(key, required, '0.0')})")
+    lines.append('account_triplets = self._account_triplets')
+    for name, (key, required) in ACCOUNT_MAPS.items():
+        lines.append(f"self._add_map(row, {value(key, required, '{}')}, self._account_index, "
+                     f"self._account_layouts, account_triplets[{name!r}])")
+    lines.append(f"self._add_map(row, {value('expensesByCategory', False, '{}')}, self._category_index, "
+                 f"self._category_layouts, self._category_triplets)")
+    sources = ', '.join(value(source, False, '0.0', source='income') for source in INCOME_SOURCES)
+    lines.append(f"for individual_id, income in {value('incomeByIndividual', False, '{}')}.items():")
+    lines.append(f'    self._add_income(row, individual_id, ({sources}))')
+    lines.append(f"self._events.append({value('eventsOccurred', False, '[]')})")
+
+    name = 'add_complete_year' if complete else 'add_year'
+    source = f'def {name}(self, data):\n' + ''.join(f'    {line}\n' for line in lines)
+    function = generate_function(name, source, {})
+    function.__doc__ = ('Append one year from its JSON representation (every key present).' if complete
+                        else 'Append one year from its JSON representation.')
+    return function
+
+
+class ColumnarProjectionBuilder:
+    """
+    Accumulates years one at a time into compact buffers.
+
+    Map-valued fields are kept as sparse (year, key, value) triplets until
+    build time, so the account and category indexes can grow as new keys
+    appear without a second pass over the input. Key layouts are interned:
+    each distinct sequence of map keys is resolved to column indexes once,
+    and years repeating it (the usual case) append their values in bulk.
+    """
+
+    def __init__(self):
+        self._year = array('q')
+        self._years_from_start = array('q')
+        self._primary_age = array('d')
+        self._spouse_age = array('d')
+        self._has_shortfall = bytearray()
+        self._metrics = {name: array('d') for name in SCALAR_METRICS}
+        self._events: List[List[str]] = []
+
+        self._account_index: Dict[str, int] = {}
+        self._account_layouts: Dict[Tuple[str, ...], array] = {}
+        self._account_triplets = {name: (array('q'), array('q'), array('d')) for name in ACCOUNT_MAPS}
+        self._category_index: Dict[str, int] = {}
+        self._category_layouts: Dict[Tuple[str, ...], array] = {}
+        self._category_triplets = (array('q'), array('q'), array('d'))
+        self._individual_index: Dict[str, int] = {}
+        self._income_rows = array('q')
+        self._income_individuals = array('q')
+        self._income_values = array('d')
+
+    @property
+    def num_years(self) -> int:
+        """Number of years added so far."""
+        return len(self._year)
+
+    add_year = _compile_add_year(complete=False)
+    add_complete_year = _compile_add_year(complete=True)
+
+    def add_yearly_projection(self, year: YearlyProjection):
+        """Append one year from the per-year dataclass model."""
+        row = self.num_years
+        self._year.append(year.year)
+        self._years_from_start.append(year.years_from_start)
+        self._append_age(self._primary_age, year.primary_age)
+        self._append_age(self._spouse_age, year.spouse_age)
+        self._has_shortfall.append(1 if year.has_shortfall else 0)
+
+        for name in SCALAR_METRICS:
+            self._metrics[name].append(getattr(year, name))
+
+        for name in ACCOUNT_MAPS:
+            self._add_map(row, getattr(year, name), self._account_index, self._account_layouts,
+                          self._account_triplets[name])
+
+        self._add_map(row, year.expenses_by_category, self._category_index, self._category_layouts,
+                      self._category_triplets)
+
+        for individual_id, income in year.income_by_individual.items():
+            self._add_income(row, individual_id, [getattr(income, source) for source in INCOME_SOURCES])
+
+        self._events.append(year.events_occurred)
+
+    @staticmethod
+    def _append_age(column: array, age: Optional[int]):
+        """Append an age, storing NaN when it is absent."""
+        column.append(float('nan') if age is None else age)
+
+    @staticmethod
+    def _add_map(row: int, amounts: Dict[str, float], index: Dict[str, int],
+                 layouts: Dict[Tuple[str, ...], array], triplets):
+        """Record one year of a keyed map as sparse triplets."""
+        if not amounts:
+            return
+        keys = tuple(amounts)
+        layout = layouts.get(keys)
+        if layout is None:
+            layout = layouts[keys] = array('q', [index.setdefault(key, len(index)) for key in keys])
+        rows, cols, values = triplets
+        rows.extend(array('q', (row,)) * len(layout))
+        cols.extend(layout)
+        values.extend(amounts.values())
+
+    def _add_income(self, row: int, individual_id: str, values: Sequence[float]):
+        """Record one individual's income sources for one year."""
+        col = self._individual_index.get(individual_id)
+        if col is None:
+            col = self._individual_index[individual_id] = len(self._individual_index)
+        self._income_rows.append(row)
+        self._income_individuals.append(col)
+        self._income_values.extend(values)
+
+    @staticmethod
+    def _dense(num_rows: int, num_cols: int, triplets) -> np.ndarray:
+        """Scatter sparse triplets into a dense [rows, cols] array."""
+        rows, cols, values = triplets
+        matrix = np.zeros((num_rows, num_cols))
+        matrix[np.frombuffer(rows, dtype=np.int64), np.frombuffer(cols, dtype=np.int64)] = \
+            np.frombuffer(values, dtype=np.float64)
+        return matrix
+
+    def build(self, data: Dict) -> ColumnarProjection:
+        """Finish using the projection header fields from JSON (years are ignored)."""
+        return self.finish(
+            scenario_id=data['scenarioId'],
+            project_id=data['projectId'],
+            start_year=data['startYear'],
+            end_year=data['endYear'],
+            use_constant_dollars=data['useConstantDollars'],
+            inflation_rate=data['inflationRate'],
+            calculated_at=parse_calculated_at(data['calculatedAt']),
+        )
+
+    def finish(self, **header) -> ColumnarProjection:
+        """Convert the accumulated buffers into a ColumnarProjection."""
+        num_years = self.num_years
+
+        income = np.zeros((num_years, len(self._individual_index), len(INCOME_SOURCES)))
+        income[np.frombuffer(self._income_rows, dtype=np.int64),
+               np.frombuffer(self._income_individuals, dtype=np.int64)] = \
+            np.frombuffer(self._income_values, dtype=np.float64).reshape(-1, len(INCOME_SOURCES))
+
+        return ColumnarProjection(
+            year=np.frombuffer(self._year, dtype=np.int64).copy(),
+            years_from_start=np.frombuffer(self._years_from_start, dtype=np.int64).copy(),
+            primary_age=np.frombuffer(self._primary_age, dtype=np.float64).copy(),
+            spouse_age=np.frombuffer(self._spouse_age, dtype=np.float64).copy(),
+            has_shortfall=np.frombuffer(bytes(self._has_shortfall), dtype=np.uint8).astype(bool),
+            metrics={
+                name: np.frombuffer(values, dtype=np.float64).copy()
+                for name, values in self._metrics.items()
+            },
+            individual_ids=list(self._individual_index),
+            income=income,
+            category_ids=list(self._category_index),
+            expenses_by_category=self._dense(num_years, len(self._category_index), self._category_triplets),
+            account_ids=list(self._account_index),
+            accounts={
+                name: self._dense(num_years, len(self._account_index), triplets)
+                for name, triplets in self._account_triplets.items()
+            },
+            events_occurred=self._events,
+            **header,
+        )
@@ -4,151 +4,596 @@ Uses XlsxWriter to create formatted Excel files.
 """
 
 import io
-from typing import Dict, List
+import os
+import re
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 import xlsxwriter
 from models import Projection, Asset
+from columnar import ColumnarProjection
+from aggregates import ProjectionAggregates
+from monte_carlo import MonteCarloResult
+from sheet_schema import (
+    ColumnSpec, base_projection_columns, detailed_projection_columns, monte_carlo_columns, column_index,
+    group_spans, col_letter,
+)
+from tracing import span
+from xlsx_direct import DIRECT_ENGINE_SUPPORTED, DirectWorkbook, RowTemplate, SheetSkeleton, StaticRows, xf_index
+
+
+# Workbook engines: 'xlsxwriter' (reference) writes every cell through XlsxWriter,
+# 'direct' renders the projection sheets' data rows from precompiled XML templates
+ENGINES = {
+    'xlsxwriter': xlsxwriter.Workbook,
+    'direct': DirectWorkbook,
+}
+
+# Engine used when generate()/write() are not given one
+DEFAULT_ENGINE = os.environ.get('EXPORT_XLSX_ENGINE', 'xlsxwriter')
+
+# The direct engine relies on XlsxWriter internals; with a release outside
+# xlsx_direct.SUPPORTED_XLSXWRITER, 'direct' workbooks use the reference engine
+DIRECT_ENGINE_ENABLED = DIRECT_ENGINE_SUPPORTED
+if DEFAULT_ENGINE == 'direct' and not DIRECT_ENGINE_ENABLED:
+    print(f'XlsxWriter {xlsxwriter.__version__} is not supported by the direct engine; '
+          f'using the xlsxwriter engine')
+
+# Comparison scenarios are prepared on a process pool only from this many
+# prepare cells (years x accounts, summed over scenarios). Preparing a scenario
+# costs less than pickling it to a worker and its rows back, so the default
+# (0) always prepares inline; see the multi_generate_pool benchmark case.
+PARALLEL_PREPARE_MIN_CELLS = int(os.environ.get('EXPORT_PARALLEL_PREPARE_CELLS', 0))
+
+
+def workbook_options(constant_memory: bool) -> Dict:
+    """
+    XlsxWriter options for the default (in-memory) or constant-memory mode.
+
+    In constant-memory mode XlsxWriter keeps only the current row of each sheet
+    in memory, so every sheet builder must write its rows strictly in order.
+    """
+    if constant_memory:
+        return {'constant_memory': True}
+    return {'in_memory': True}
+
+
+def create_workbook(output: Union[str, BinaryIO], constant_memory: bool,
+                    engine: Optional[str] = None) -> xlsxwriter.Workbook:
+    """
+    Open a workbook with the given engine (DEFAULT_ENGINE when None).
+
+    'direct' opens an XlsxWriter workbook when the installed XlsxWriter is
+    outside the direct engine's supported releases.
+
+    Raises:
+        ValueError: Unknown engine
+    """
+    engine = engine or DEFAULT_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown workbook engine '{engine}' (expected one of: {', '.join(ENGINES)})")
+    if engine == 'direct' and not DIRECT_ENGINE_ENABLED:
+        engine = 'xlsxwriter'
+    return ENGINES[engine](output, workbook_options(constant_memory))
+
+
+def _record_sheet(sheet_span, workbook: xlsxwriter.Workbook):
+    """Attach the used range of the most recently added worksheet to a span."""
+    if not sheet_span.recording:
+        return
+    worksheet = workbook.worksheets()[-1]
+    rows = cols = 0
+    if worksheet.dim_rowmax is not None and worksheet.dim_colmax is not None:
+        rows = worksheet.dim_rowmax - worksheet.dim_rowmin + 1
+        cols = worksheet.dim_colmax - worksheet.dim_colmin + 1
+    sheet_span.set(rows=rows, cols=cols, cells=rows * cols, charts=len(worksheet.charts))
+
+
+def _close_workbook(workbook: xlsxwriter.Workbook, output: Union[str, BinaryIO]):
+    """Close (assemble and zip) the workbook inside a span recording the output size."""
+    with span('workbook.close') as close_span:
+        workbook.close()
+        if close_span.recording:
+            close_span.set(bytes=os.path.getsize(output) if isinstance(output, str) else output.tell())
+            if isinstance(workbook, DirectWorkbook):
+                close_span.set(skeleton_hits=workbook.skeleton_hits, skeleton_misses=workbook.skeleton_misses)
+
+
+# Named cell styles shared by every sheet builder (XlsxWriter format properties)
+FORMAT_STYLES: Dict[str, Dict] = {
+    'header': {
+        'bold': True,
+        'bg_color': '#4472C4',
+        'font_color': 'white',
+        'align': 'center',
+        'valign': 'vcenter',
+        'border': 1,
+    },
+    'header_group': {
+        'bold': True,
+        'bg_color': '#2E5C8A',  # Darker blue for group headers
+        'font_color': 'white',
+        'align': 'center',
+        'valign': 'vcenter',
+        'border': 1,
+    },
+    'currency': {
+        'num_format': '#,##0',
+        'align': 'right',
+    },
+    'currency_alt': {
+        'num_format': '#,##0',
+        'align': 'right',
+        'bg_color': '#F2F2F2',  # Light gray for alternating rows
+    },
+    'currency_negative': {
+        'num_format': '#,##0',
+        'align': 'right',
+        'font_color': 'red',
+    },
+    'currency_negative_alt': {
+        'num_format': '#,##0',
+        'align': 'right',
+        'font_color': 'red',
+        'bg_color': '#F2F2F2',
+    },
+    'currency_positive': {
+        'num_format': '#,##0',
+        'align': 'right',
+        'font_color': '#008000',  # Green
+    },
+    'currency_total': {
+        'num_format': '#,##0',
+        'align': 'right',
+        'bg_color': '#E7E6E6',  # Slightly darker gray for total columns
+        'bold': True,
+    },
+    'currency_total_alt': {
+        'num_format': '#,##0',
+        'align': 'right',
+        'bg_color': '#D9D9D9',  # Darker gray for alternating rows in total columns
+        'bold': True,
+    },
+    'currency_total_negative': {
+        'num_format': '#,##0',
+        'align': 'right',
+        'font_color': 'red',
+        'bg_color': '#E7E6E6',
+        'bold': True,
+    },
+    'currency_total_negative_alt': {
+        'num_format': '#,##0',
+        'align': 'right',
+        'font_color': 'red',
+        'bg_color': '#D9D9D9',
+        'bold': True,
+    },
+    'integer': {
+        'num_format': '0',
+        'align': 'center',
+    },
+    'integer_alt': {
+        'num_format': '0',
+        'align': 'center',
+        'bg_color': '#F2F2F2',
+    },
+    'percent': {
+        'num_format': '0.0%',
+        'align': 'right',
+    },
+    'percent_alt': {
+        'num_format': '0.0%',
+        'align': 'right',
+        'bg_color': '#F2F2F2',
+    },
+    'label': {
+        'bold': True,
+        'align': 'left',
+    },
+    'value': {
+        'align': 'left',
+    },
+    'section_header': {
+        'bold': True,
+        'font_size': 12,
+        'bg_color': '#D9E1F2',
+        'border': 1,
+    },
+    'group_header': {
+        'bold': True,
+        'bg_color': '#8FAADC',  # Lighter blue for group headers
+        'font_color': 'white',
+        'align': 'center',
+        'valign': 'vcenter',
+        'border': 1,
+    },
+}
+
+
+class FormatRegistry:
+    """
+    Cell formats of one workbook, created on first use and interned.
+
+    Every sheet builder gets its formats from the same registry, by style
+    name (registry['currency']) or by property set (registry.add({...})).
+    Identical property sets share one format handle, so the styles table
+    and format set-up stay the same size however many scenarios and sheets
+    the workbook holds.
+    """
+
+    def __init__(self, workbook: xlsxwriter.Workbook, styles: Dict[str, Dict] = FORMAT_STYLES):
+        self._workbook = workbook
+        self._styles = styles
+        self._by_name: Dict[str, object] = {}
+        self._by_properties: Dict[tuple, object] = {}
+
+    def __getitem__(self, name: str):
+        """Format of a named style."""
+        handle = self._by_name.get(name)
+        if handle is None:
+            handle = self._by_name[name] = self.add(self._styles[name])
+        return handle
+
+    def add(self, properties: Dict):
+        """Format for a property set, shared with any identical set added before."""
+        key = tuple(sorted(properties.items()))
+        handle = self._by_properties.get(key)
+        if handle is None:
+            handle = self._by_properties[key] = self._workbook.add_format(dict(properties))
+        return handle
+
+    def __len__(self) -> int:
+        """Number of distinct formats created."""
+        return len(self._by_properties)
+
+
+@dataclass
+class RowFormats:
+    """Formats for every column of one row style, resolved ahead of the data loop."""
+    positive: List  # value >= 0
+    negative: List  # value < 0
+    blank: List     # empty cell
+
+
+class FormatTable:
+    """
+    Cell formats resolved once per workbook.
+
+    Indexed by (column kind, is_total, is_alt_row, is_negative), so row writers
+    look formats up by position instead of building format-key strings per cell.
+    """
+
+    def __init__(self, formats: FormatRegistry):
+        self._table = {}
+        for is_alt_row in (False, True):
+            alt = '_alt' if is_alt_row else ''
+            for is_negative in (False, True):
+                negative = '_negative' if is_negative else ''
+                self._table[('integer', False, is_alt_row, is_negative)] = formats[f'integer{alt}']
+                self._table[('currency', False, is_alt_row, is_negative)] = formats[f'currency{negative}{alt}']
+                self._table[('currency', True, is_alt_row, is_negative)] = formats[f'currency_total{negative}{alt}']
+                self._table[('percent', False, is_alt_row, is_negative)] = formats[f'percent{alt}']
+
+    def get(self, kind: str, is_total: bool, is_alt_row: bool, is_negative: bool):
+        """Look up a single cell format."""
+        return self._table[(kind, is_total, is_alt_row, is_negative)]
+
+    def row_formats(self, columns: List, is_alt_row: bool) -> RowFormats:
+        """
+        Resolve the format vectors for a row of (kind, is_total) columns.
+
+        Empty cells always use the plain (non-total) format of their kind.
+        """
+        return RowFormats(
+            positive=[self.get(kind, is_total, is_alt_row, False) for kind, is_total in columns],
+            negative=[self.get(kind, is_total, is_alt_row, True) for kind, is_total in columns],
+            blank=[self.get(kind, False, is_alt_row, False) for kind, _ in columns],
+        )
+
+
+@dataclass
+class SheetTemplate:
+    """Scenario-independent layout of one projection sheet, derived from its column schema."""
+    columns: List[ColumnSpec]
+    column_runs: List[Tuple[int, int, float, int]]    # (first, last, width, outline level)
+    merged_groups: Dict[int, Tuple[int, str]]         # first column -> (last column, group label)
+    frozen_columns: int
+    index: Dict[str, int]                              # column id -> column number
+    header_cells: List[Tuple[int, int, int, str, str]]  # (row, first column, last column, text, style)
+    header_rows: int                                   # data rows start below them
+    row_formats: RowFormats
+    alt_row_formats: RowFormats
+    skeleton: Optional[SheetSkeleton] = None           # direct engine only
+
+    @classmethod
+    def build(cls, columns: List[ColumnSpec], format_table: FormatTable,
+              group_row: bool = False) -> 'SheetTemplate':
+        """
+        Resolve widths, outline runs, header cells and row formats for a schema.
+
+        With group_row, the column headers go below a row of group headers,
+        merged across each group's detail columns; the total column that
+        follows each group stays outside the merge.
+        """
+        # Consecutive columns with identical settings share one set_column call
+        runs = []
+        for col_idx, spec in enumerate(columns):
+            settings = (spec.width, spec.outline_level)
+            if runs and runs[-1][2] == settings and runs[-1][1] == col_idx - 1:
+                runs[-1][1] = col_idx
+            else:
+                runs.append([col_idx, col_idx, settings])
+
+        merged_groups = {first: (last, label) for first, last, label in group_spans(columns) if last > first}
+
+        # Header cells in sheet order, so the sheet is written strictly row by
+        # row (required by constant-memory mode)
+        header_cells = []
+        if group_row:
+            # Year and Ages repeat their header; every other ungrouped cell is a blank header
+            col_idx = 0
+            while col_idx < len(columns):
+                if col_idx in merged_groups:
+                    end_col, label = merged_groups[col_idx]
+                    header_cells.append((0, col_idx, end_col, label, 'group_header'))
+                    col_idx = end_col + 1
+                else:
+                    spec = columns[col_idx]
+                    header_cells.append((0, col_idx, col_idx, spec.header if spec.is_key else '', 'header_group'))
+                    col_idx += 1
+        header_row = 1 if group_row else 0
+        for col_idx, spec in enumerate(columns):
+            header_cells.append((header_row, col_idx, col_idx, spec.header, spec.header_format))
+
+        # Column kinds in sheet order, resolved to format vectors once per row style
+        kinds = [spec.kind for spec in columns]
+        return cls(
+            columns=columns,
+            column_runs=[(first, last, width, level) for first, last, (width, level) in runs],
+            merged_groups=merged_groups,
+            frozen_columns=sum(spec.is_key for spec in columns),
+            index=column_index(columns),
+            header_cells=header_cells,
+            header_rows=header_row + 1,
+            row_formats=format_table.row_formats(kinds, is_alt_row=False),
+            alt_row_formats=format_table.row_formats(kinds, is_alt_row=True),
+        )
+
+
+class WorkbookLayout:
+    """
+    Everything one workbook's sheets share: the format registry, the format
+    lookup table and one SheetTemplate per column schema.
+
+    Built once per workbook, so a comparison export resolves formats, header
+    layout and column runs once rather than once per scenario. For the
+    direct engine every named style is created and indexed up front (a fixed
+    styles table), so header rows, row templates and charts can be rendered
+    once per layout variant and reused by later workbooks (SkeletonCache).
+    """
+
+    def __init__(self, workbook: xlsxwriter.Workbook):
+        self.workbook = workbook
+        self.formats = FormatRegistry(workbook)
+        self.direct = isinstance(workbook, DirectWorkbook)
+        if self.direct:
+            for name in FORMAT_STYLES:
+                xf_index(self.formats[name])
+        self.format_table = FormatTable(self.formats)
+        self._templates: Dict[tuple, SheetTemplate] = {}
+
+    def template(self, sheet: str, variant: tuple) -> SheetTemplate:
+        """
+        Template of a projection sheet.
+
+        Args:
+            sheet: 'base', 'detailed' or 'monte_carlo'
+            variant: (has_couples,) for the projection sheets, the percentiles for 'monte_carlo'
+        """
+        key = (sheet, variant)
+        template = self._templates.get(key)
+        if template is None:
+            template = SheetTemplate.build(sheet_columns(sheet, variant), self.format_table,
+                                           group_row=sheet == 'detailed')
+            if self.direct:
+                template.skeleton = self.workbook.skeleton(('sheet',) + key,
+                                                           lambda: self._sheet_skeleton(template))
+            self._templates[key] = template
+        return template
+
+    def _sheet_skeleton(self, template: SheetTemplate) -> SheetSkeleton:
+        """Header rows and data row templates of a sheet as XML (direct engine)."""
+        formats = self.formats
+        row_formats = template.row_formats
+        alt_row_formats = template.alt_row_formats
+        return SheetSkeleton(
+            header=StaticRows(len(template.columns), [(row, first, last, text, formats[style])
+                                                      for row, first, last, text, style in template.header_cells]),
+            row_xml=RowTemplate(row_formats.positive, row_formats.negative, row_formats.blank),
+            alt_row_xml=RowTemplate(alt_row_formats.positive, alt_row_formats.negative, alt_row_formats.blank),
+        )
+
+    def add_chart(self, options: Dict, skeleton_key: tuple):
+        """
+        Add a chart to the workbook. skeleton_key holds everything the chart's
+        definition depends on; the direct engine renders one chart part per key.
+        """
+        if self.direct:
+            return self.workbook.add_chart(options, skeleton_key)
+        return self.workbook.add_chart(options)
+
+
+def sheet_columns(sheet: str, variant: tuple) -> List[ColumnSpec]:
+    """Column schema of a projection sheet (see WorkbookLayout.template)."""
+    if sheet == 'base':
+        return base_projection_columns(*variant)
+    if sheet == 'detailed':
+        return detailed_projection_columns(*variant)
+    return monte_carlo_columns(list(variant))
+
+
+# Characters Excel does not allow in sheet names
+_INVALID_SHEET_CHARS = re.compile(r'[\[\]:*?/\\]')
+
+# Longest sheet name Excel accepts
+MAX_SHEET_NAME = 31
+
+
+def quote_sheet_name(name: str) -> str:
+    """Sheet name as written in a formula reference ('Name', quotes doubled)."""
+    return "'" + name.replace("'", "''") + "'"
+
+
+@dataclass(frozen=True)
+class SheetNames:
+    """Worksheet names of one scenario's sheets."""
+    summary: str = 'Summary'
+    base: str = 'Base Projection'
+    detailed: str = 'Detailed Projection'
+    monte_carlo: str = 'Monte Carlo'
+    charts: str = 'Charts'
+
+    @classmethod
+    def for_scenario(cls, idx: int, scenario_name: str) -> 'SheetNames':
+        """
+        Names of a comparison scenario's sheets: '1. Name - Detailed', ...
+
+        The scenario name is cleaned of characters Excel rejects and shortened
+        so the longest sheet name stays within Excel's 31 characters.
+        """
+        suffixes = {'summary': 'Summary', 'base': 'Projection', 'detailed': 'Detailed',
+                    'monte_carlo': 'Monte Carlo', 'charts': 'Charts'}
+        prefix_length = MAX_SHEET_NAME - len(' - ') - max(len(suffix) for suffix in suffixes.values())
+        name = _INVALID_SHEET_CHARS.sub('_', scenario_name).strip("' ")
+        prefix = f'{idx + 1}. {name}'[:prefix_length].rstrip("' ")
+        return cls(**{field: f'{prefix} - {suffix}' for field, suffix in suffixes.items()})
 
 
 class ExcelGenerator:
     """Generates Excel files from projection data."""
 
-    def __init__(self, projection: Projection, scenario_name: str, assets: List[Asset]):
+    def __init__(self, projection: Union[ColumnarProjection, Projection], scenario_name: str,
+                 assets: List[Asset], monte_carlo: Optional[MonteCarloResult] = None, fan_chart: bool = True):
+        """
+        Args:
+            projection: Projection to export
+            scenario_name: Name shown on the Summary sheet
+            assets: Asset id/type list
+            monte_carlo: Optional stochastic results, added as a 'Monte Carlo' sheet
+            fan_chart: Add a net worth fan chart to the Charts sheet (with monte_carlo)
+        """
+        # Sheet builders read whole columns, so normalize to the columnar model
+        if isinstance(projection, Projection):
+            projection = ColumnarProjection.from_projection(projection)
         self.projection = projection
         self.scenario_name = scenario_name
         self.assets = assets
+        self.monte_carlo = monte_carlo
+        self.fan_chart = fan_chart
 
         # Build asset type map for quick lookup
         self.asset_type_map: Dict[str, str] = {
             asset.id: asset.type for asset in assets
         }
 
-    def generate(self) -> bytes:
+        # Per-year totals by asset type, income source and expense category, shared by all sheets
+        self.aggregates = ProjectionAggregates(projection, self.asset_type_map)
+
+        # Data rows per projection sheet, when extracted ahead of the writes (prepare_rows)
+        self._rows: Dict[str, List[tuple]] = {}
+
+    def generate(self, constant_memory: bool = False, engine: Optional[str] = None) -> bytes:
         """
         Generate Excel file and return as bytes.
 
+        Args:
+            constant_memory: Flush each row to disk as soon as the next one starts
+            engine: Workbook engine, see ENGINES (DEFAULT_ENGINE when None)
+
         Returns:
             bytes: Excel file content
         """
-        # Create workbook in memory
         output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+        self.write(output, constant_memory, engine)
+
+        # getvalue() hands back the buffer without the extra seek/read copy
+        return output.getvalue()
+
+    def write(self, output: Union[str, BinaryIO], constant_memory: bool = False, engine: Optional[str] = None):
+        """
+        Write the Excel file to a path or binary file object.
+
+        Writing to a file path in constant-memory mode keeps peak memory flat
+        regardless of projection length.
+        """
+        workbook = create_workbook(output, constant_memory, engine)
 
-        # Define formats
-        formats = self._create_formats(workbook)
+        # Workbook format registry, per-cell lookup table and sheet templates, resolved once
+        with span('formats') as formats_span:
+            layout = WorkbookLayout(workbook)
+            formats_span.set(formats=len(layout.formats))
 
-        # Create tabs in order
-        self._create_summary_sheet(workbook, formats)
-        self._create_base_projection_sheet(workbook, formats)
-        self._create_detailed_projection_sheet(workbook, formats)
-        self._create_charts_sheet(workbook, formats)
+        self.write_sheets(workbook, layout)
 
         # Close workbook to finalize
-        workbook.close()
+        _close_workbook(workbook, output)
 
-        # Get the bytes
-        output.seek(0)
-        return output.read()
-
-    def _create_formats(self, workbook: xlsxwriter.Workbook) -> Dict:
-        """Create reusable cell formats."""
-        return {
-            'header': workbook.add_format({
-                'bold': True,
-                'bg_color': '#4472C4',
-                'font_color': 'white',
-                'align': 'center',
-                'valign': 'vcenter',
-                'border': 1,
-            }),
-            'header_group': workbook.add_format({
-                'bold': True,
-                'bg_color': '#2E5C8A',  # Darker blue for group headers
-                'font_color': 'white',
-                'align': 'center',
-                'valign': 'vcenter',
-                'border': 1,
-            }),
-            'currency': workbook.add_format({
-                'num_format': '#,##0',
-                'align': 'right',
-            }),
-            'currency_alt': workbook.add_format({
-                'num_format': '#,##0',
-                'align': 'right',
-                'bg_color': '#F2F2F2',  # Light gray for alternating rows
-            }),
-            'currency_negative': workbook.add_format({
-                'num_format': '#,##0',
-                'align': 'right',
-                'font_color': 'red',
-            }),
-            'currency_negative_alt': workbook.add_format({
-                'num_format': '#,##0',
-                'align': 'right',
-                'font_color': 'red',
-                'bg_color': '#F2F2F2',
-            }),
-            'currency_total': workbook.add_format({
-                'num_format': '#,##0',
-                'align': 'right',
-                'bg_color': '#E7E6E6',  # Slightly darker gray for total columns
-                'bold': True,
-            }),
-            'currency_total_alt': workbook.add_format({
-                'num_format': '#,##0',
-                'align': 'right',
-                'bg_color': '#D9D9D9',  # Darker gray for alternating rows in total columns
-                'bold': True,
-            }),
-            'currency_total_negative': workbook.add_format({
-                'num_format': '#,##0',
-                'align': 'right',
-                'font_color': 'red',
-                'bg_color': '#E7E6E6',
-                'bold': True,
-            }),
-            'currency_total_negative_alt': workbook.add_format({
-                'num_format': '#,##0',
-                'align': 'right',
-                'font_color': 'red',
-                'bg_color': '#D9D9D9',
-                'bold': True,
-            }),
-            'integer': workbook.add_format({
-                'num_format': '0',
-                'align': 'center',
-            }),
-            'integer_alt': workbook.add_format({
-                'num_format': '0',
-                'align': 'center',
-                'bg_color': '#F2F2F2',
-            }),
-            'label': workbook.add_format({
-                'bold': True,
-                'align': 'left',
-            }),
-            'value': workbook.add_format({
-                'align': 'left',
-            }),
-            'section_header': workbook.add_format({
-                'bold': True,
-                'font_size': 12,
-                'bg_color': '#D9E1F2',
-                'border': 1,
-            }),
-            'group_header': workbook.add_format({
-                'bold': True,
-                'bg_color': '#8FAADC',  # Lighter blue for group headers
-                'font_color': 'white',
-                'align': 'center',
-                'valign': 'vcenter',
-                'border': 1,
-            }),
-        }
+    def write_sheets(self, workbook: xlsxwriter.Workbook, layout: WorkbookLayout,
+                     names: SheetNames = SheetNames()):
+        """
+        Add this projection's tabs (Summary, Base Projection, Detailed
+        Projection, optional Monte Carlo, Charts) to a workbook.
 
-    def _create_summary_sheet(self, workbook: xlsxwriter.Workbook, formats: Dict):
+        Args:
+            workbook: Workbook to add the sheets to
+            layout: The workbook's shared formats and sheet templates
+            names: Sheet names (comparison exports prefix them per scenario)
+        """
+        formats = layout.formats
+        with span('sheet', sheet=names.summary) as sheet_span:
+            self._create_summary_sheet(workbook, formats, names)
+            _record_sheet(sheet_span, workbook)
+        with span('sheet', sheet=names.base) as sheet_span:
+            self._create_base_projection_sheet(workbook, layout, names)
+            _record_sheet(sheet_span, workbook)
+        with span('sheet', sheet=names.detailed) as sheet_span:
+            self._create_detailed_projection_sheet(workbook, layout, names)
+            _record_sheet(sheet_span, workbook)
+        if self.monte_carlo is not None:
+            with span('sheet', sheet=names.monte_carlo) as sheet_span:
+                self._create_monte_carlo_sheet(workbook, layout, names)
+                _record_sheet(sheet_span, workbook)
+        with span('sheet', sheet=names.charts) as sheet_span:
+            self._create_charts_sheet(workbook, layout, names)
+            _record_sheet(sheet_span, workbook)
+
+    def _sheet_variant(self, sheet: str) -> tuple:
+        """Schema variant of a projection sheet (see WorkbookLayout.template)."""
+        if sheet == 'monte_carlo':
+            return tuple(self.monte_carlo.percentiles)
+        return (self.aggregates.has_couples,)
+
+    def prepare_rows(self):
+        """
+        Extract the data rows of every projection sheet now rather than while
+        writing, so they can be computed on a worker ahead of the workbook.
+        """
+        sheets = ['base', 'detailed'] + (['monte_carlo'] if self.monte_carlo is not None else [])
+        for sheet in sheets:
+            self._rows[sheet] = list(self._sheet_rows(sheet_columns(sheet, self._sheet_variant(sheet)), sheet))
+
+    def _sheet_rows(self, columns: List[ColumnSpec], sheet: str) -> Iterable[tuple]:
+        """Data rows of a projection sheet: prepared ones, or extracted in one pass per column."""
+        rows = self._rows.get(sheet)
+        if rows is not None:
+            return rows
+        source = self.monte_carlo if sheet == 'monte_carlo' else self.projection
+        return zip(*[spec.extract(source, self.aggregates) for spec in columns])
+
+    def _create_summary_sheet(self, workbook: xlsxwriter.Workbook, formats: FormatRegistry,
+                              names: SheetNames):
         """Create summary sheet with projection parameters and key metrics."""
-        worksheet = workbook.add_worksheet('Summary')
+        worksheet = workbook.add_worksheet(names.summary)
 
         # Set column widths
         worksheet.set_column(0, 0, 25)  # Label column
@@ -174,7 +619,7 @@ class ExcelGenerator:
         row += 1
 
         worksheet.write(row, 0, 'Planning Period:', formats['label'])
-        worksheet.write(row, 1, f"{len(self.projection.years)} years", formats['value'])
+        worksheet.write(row, 1, f"{self.projection.num_years} years", formats['value'])
         row += 1
 
         worksheet.write(row, 0, 'Inflation Rate:', formats['label'])
@@ -190,47 +635,39 @@ class ExcelGenerator:
         worksheet.merge_range(row, 0, row, 1, 'Key Metrics', formats['section_header'])
         row += 2
 
-        # Calculate summary metrics
-        first_year = self.projection.years[0] if self.projection.years else None
-        last_year = self.projection.years[-1] if self.projection.years else None
+        # Key metrics come from the precomputed aggregates
+        aggregates = self.aggregates
 
-        if first_year:
+        if aggregates.initial_net_worth is not None:
             worksheet.write(row, 0, 'Initial Net Worth:', formats['label'])
-            worksheet.write_number(row, 1, first_year.net_worth_start_of_year, formats['currency'])
+            worksheet.write_number(row, 1, aggregates.initial_net_worth, formats['currency'])
             row += 1
 
-        if last_year:
+        if aggregates.final_net_worth is not None:
             worksheet.write(row, 0, 'Final Net Worth:', formats['label'])
-            worksheet.write_number(row, 1, last_year.net_worth_end_of_year, formats['currency'])
+            worksheet.write_number(row, 1, aggregates.final_net_worth, formats['currency'])
             row += 1
 
-        # Calculate total income and expenses over planning period
-        total_income = sum(year.total_income for year in self.projection.years)
-        total_expenses = sum(year.total_expenses for year in self.projection.years)
-        total_tax = sum(year.total_tax for year in self.projection.years)
-
         worksheet.write(row, 0, 'Total Income (All Years):', formats['label'])
-        worksheet.write_number(row, 1, total_income, formats['currency'])
+        worksheet.write_number(row, 1, aggregates.total_income, formats['currency'])
         row += 1
 
         worksheet.write(row, 0, 'Total Expenses (All Years):', formats['label'])
-        worksheet.write_number(row, 1, total_expenses, formats['currency'])
+        worksheet.write_number(row, 1, aggregates.total_expenses, formats['currency'])
         row += 1
 
         worksheet.write(row, 0, 'Total Taxes (All Years):', formats['label'])
-        worksheet.write_number(row, 1, total_tax, formats['currency'])
+        worksheet.write_number(row, 1, aggregates.total_tax, formats['currency'])
         row += 1
 
         # Check for shortfalls
-        years_with_shortfall = [year for year in self.projection.years if year.has_shortfall]
         worksheet.write(row, 0, 'Years with Shortfall:', formats['label'])
-        worksheet.write(row, 1, len(years_with_shortfall), formats['value'])
+        worksheet.write(row, 1, aggregates.years_with_shortfall, formats['value'])
         row += 1
 
-        if years_with_shortfall:
-            total_shortfall = sum(year.shortfall_amount for year in years_with_shortfall)
+        if aggregates.years_with_shortfall:
             worksheet.write(row, 0, 'Total Shortfall Amount:', formats['label'])
-            worksheet.write_number(row, 1, total_shortfall, formats['currency_negative'])
+            worksheet.write_number(row, 1, aggregates.total_shortfall, formats['currency_negative'])
             row += 1
 
         row += 1
@@ -261,578 +698,165 @@ class ExcelGenerator:
 
         worksheet.write(row, 0, 'Total Assets:', formats['label'])
         worksheet.write(row, 1, len(self.assets), formats['value'])
+        row += 2
 
-    def _create_base_projection_sheet(self, workbook: xlsxwriter.Workbook, formats: Dict):
-        """Create simplified base projection sheet with key metrics only."""
-        worksheet = workbook.add_worksheet('Base Projection')
+        # Monte Carlo section
+        monte_carlo = self.monte_carlo
+        if monte_carlo is not None:
+            worksheet.merge_range(row, 0, row, 1, 'Monte Carlo Simulation', formats['section_header'])
+            row += 2
 
-        # Check if we have couples
-        has_couples = any(year.spouse_age is not None for year in self.projection.years)
+            worksheet.write(row, 0, 'Simulated Paths:', formats['label'])
+            worksheet.write(row, 1, monte_carlo.paths, formats['value'])
+            row += 1
 
-        # Define simplified headers
-        headers = ['Year', 'Age 1']
-        if has_couples:
-            headers.append('Age 2')
+            worksheet.write(row, 0, 'Random Seed:', formats['label'])
+            worksheet.write(row, 1, monte_carlo.seed, formats['value'])
+            row += 1
 
-        headers.extend([
-            'Total Income',
-            'Total Expenses',
-            'Total Tax',
-            'After-Tax Income',
-            'Net Cash Flow',
-            'Total Withdrawals',
-            'Total Contributions',
-            'Net Worth (Start)',
-            'Net Worth (End)',
-            'Shortfall Amount',
-        ])
-
-        # Write headers
-        for col_idx, header in enumerate(headers):
-            worksheet.write(0, col_idx, header, formats['header_group'])
-
-        # Set column widths - consistent width for all currency columns (114 pixels = ~16.5 chars)
-        worksheet.set_column(0, 0, 7)  # Year
-        worksheet.set_column(1, 2 if has_couples else 1, 8)  # Ages
-        # All currency columns get same width (114 pixels)
-        first_currency_col = 3 if has_couples else 2
-        worksheet.set_column(first_currency_col, len(headers) - 1, 16.5)
+            worksheet.write(row, 0, 'Probability of Shortfall:', formats['label'])
+            worksheet.write_number(row, 1, monte_carlo.any_shortfall_probability, formats['percent'])
+            row += 1
+
+            if monte_carlo.num_years:
+                for idx, percentile in enumerate(monte_carlo.percentiles):
+                    label = 'Median' if percentile == 50 else f'P{percentile}'
+                    worksheet.write(row, 0, f'{label} Final Net Worth:', formats['label'])
+                    worksheet.write_number(row, 1, monte_carlo.net_worth_bands[idx, -1], formats['currency'])
+                    row += 1
+
+    def _create_base_projection_sheet(self, workbook: xlsxwriter.Workbook, layout: WorkbookLayout,
+                                      names: SheetNames):
+        """Create simplified base projection sheet with key metrics only."""
+        worksheet = workbook.add_worksheet(names.base)
+        template = layout.template('base', self._sheet_variant('base'))
+
+        self._write_headers(worksheet, template, layout.formats)
+        self._set_column_layout(worksheet, template)
 
         # Freeze header row and first columns
-        freeze_col = 3 if has_couples else 2
-        worksheet.freeze_panes(1, freeze_col)
+        worksheet.freeze_panes(template.header_rows, template.frozen_columns)
 
         # Write data rows
-        for row_idx, year in enumerate(self.projection.years, start=1):
-            is_alt_row = row_idx % 2 == 0
-            col = 0
-
-            # Year
-            self._write_value(worksheet, row_idx, col, year.year, 'integer', is_alt_row, formats)
-            col += 1
-
-            # Ages
-            self._write_value(worksheet, row_idx, col, year.primary_age or '', 'integer', is_alt_row, formats)
-            col += 1
-            if has_couples:
-                self._write_value(worksheet, row_idx, col, year.spouse_age or '', 'integer', is_alt_row, formats)
-                col += 1
-
-            # Key financial metrics
-            self._write_currency(worksheet, row_idx, col, year.total_income, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.total_expenses, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.total_tax, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.after_tax_income, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.net_cash_flow, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.total_withdrawals, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.total_contributions, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.net_worth_start_of_year, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.net_worth_end_of_year, is_alt_row, formats)
-            col += 1
-
-            # Shortfall
-            if year.has_shortfall:
-                self._write_currency(worksheet, row_idx, col, year.shortfall_amount, is_alt_row, formats)
-            else:
-                format_key = 'currency_alt' if is_alt_row else 'currency'
-                worksheet.write(row_idx, col, '', formats[format_key])
+        self._write_columns(worksheet, template, template.header_rows, 'base')
 
-    def _create_detailed_projection_sheet(self, workbook: xlsxwriter.Workbook, formats: Dict):
+    def _create_detailed_projection_sheet(self, workbook: xlsxwriter.Workbook, layout: WorkbookLayout,
+                                          names: SheetNames):
         """Create the detailed projection worksheet with advanced formatting and grouping."""
-        worksheet = workbook.add_worksheet('Detailed Projection')
-
-        # Check if we have couples
-        has_couples = any(year.spouse_age is not None for year in self.projection.years)
-
-        # Track column positions for grouping
-        col = 0
-        age_start_col = col
-
-        # Define headers with groups
-        headers = ['Year', 'Age 1']
-        col += 2
-        if has_couples:
-            headers.append('Age 2')
-            col += 1
-
-        # Income sources (will be grouped)
-        income_start_col = col
-        headers.extend([
-            'Employment Income',
-            'RRQ Income',
-            'PSV Income',
-            'RRPE Income',
-            'Other Income',
-            'Total Income',
-        ])
-        income_end_col = col + 4  # Last detail column (Other Income), before Total Income
-        col += 6
-
-        # Expenses by category (will be grouped)
-        expense_start_col = col
-        headers.extend([
-            'Housing Expenses',
-            'Transport Expenses',
-            'Daily Living Expenses',
-            'Recreation Expenses',
-            'Health Expenses',
-            'Family Expenses',
-            'Total Expenses',
-        ])
-        expense_end_col = col + 5  # Last detail column (Family Expenses), before Total Expenses
-        col += 7
-
-        # Taxes (will be grouped)
-        tax_start_col = col
-        headers.extend([
-            'Federal Tax',
-            'Quebec Tax',
-            'Total Tax',
-        ])
-        tax_end_col = col + 1  # Last detail column (Quebec Tax), before Total Tax
-        col += 3
-
-        # Cash flow
-        headers.extend([
-            'After-Tax Income',
-            'Net Cash Flow',
-        ])
-        col += 2
-
-        # Withdrawals (will be grouped)
-        withdrawal_start_col = col
-        headers.extend([
-            'CELI Withdrawals',
-            'Cash Withdrawals',
-            'CRI Withdrawals',
-            'REER Withdrawals',
-            'Total Withdrawals',
-        ])
-        withdrawal_end_col = col + 3  # Last detail column (REER Withdrawals), before Total Withdrawals
-        col += 5
-
-        # Contributions (will be grouped)
-        contribution_start_col = col
-        headers.extend([
-            'CELI Contributions',
-            'Cash Contributions',
-            'Total Contributions',
-        ])
-        contribution_end_col = col + 1  # Last detail column (Cash Contributions), before Total Contributions
-        col += 3
-
-        # Asset balances (will be grouped)
-        balance_start_col = col
-        headers.extend([
-            'Real Estate Balance',
-            'REER Balance',
-            'CELI Balance',
-            'CRI Balance',
-            'Cash Balance',
-            'Total Asset Returns',
-        ])
-        balance_end_col = col + 4  # Last detail column (Cash Balance), before Total Asset Returns
-        col += 6
-
-        # Net worth
-        headers.extend([
-            'Net Worth (Start)',
-            'Net Worth (End)',
-        ])
-        col += 2
-
-        # Warnings
-        headers.append('Shortfall Amount')
-
-        # Write group headers in row 0 (merged cells for each group)
-        # Year and Ages span both rows
-        worksheet.write(0, 0, 'Year', formats['header_group'])
-        worksheet.write(0, 1, 'Age 1', formats['header_group'])
-        if has_couples:
-            worksheet.write(0, 2, 'Age 2', formats['header_group'])
-
-        # Income group header
-        if income_end_col > income_start_col:  # Only if there are detail columns
-            worksheet.merge_range(0, income_start_col, 0, income_end_col, 'Income Sources', formats['group_header'])
-        worksheet.write(0, income_end_col + 1, '', formats['header_group'])  # Total Income column
-
-        # Expenses group header
-        if expense_end_col > expense_start_col:
-            worksheet.merge_range(0, expense_start_col, 0, expense_end_col, 'Expenses', formats['group_header'])
-        worksheet.write(0, expense_end_col + 1, '', formats['header_group'])  # Total Expenses column
-
-        # Taxes group header
-        if tax_end_col > tax_start_col:
-            worksheet.merge_range(0, tax_start_col, 0, tax_end_col, 'Taxes', formats['group_header'])
-        worksheet.write(0, tax_end_col + 1, '', formats['header_group'])  # Total Tax column
-
-        # Cash flow - no group header
-        after_tax_col = tax_end_col + 2
-        worksheet.write(0, after_tax_col, '', formats['header_group'])
-        worksheet.write(0, after_tax_col + 1, '', formats['header_group'])
-
-        # Withdrawals group header
-        if withdrawal_end_col > withdrawal_start_col:
-            worksheet.merge_range(0, withdrawal_start_col, 0, withdrawal_end_col, 'Withdrawals', formats['group_header'])
-        worksheet.write(0, withdrawal_end_col + 1, '', formats['header_group'])  # Total Withdrawals column
-
-        # Contributions group header
-        if contribution_end_col > contribution_start_col:
-            worksheet.merge_range(0, contribution_start_col, 0, contribution_end_col, 'Contributions', formats['group_header'])
-        worksheet.write(0, contribution_end_col + 1, '', formats['header_group'])  # Total Contributions column
-
-        # Balances group header
-        if balance_end_col > balance_start_col:
-            worksheet.merge_range(0, balance_start_col, 0, balance_end_col, 'Asset Balances', formats['group_header'])
-        worksheet.write(0, balance_end_col + 1, '', formats['header_group'])  # Total Asset Returns column
-
-        # Net worth - no group header
-        net_worth_start_col = balance_end_col + 2
-        worksheet.write(0, net_worth_start_col, '', formats['header_group'])
-        worksheet.write(0, net_worth_start_col + 1, '', formats['header_group'])
-
-        # Shortfall - no group header
-        worksheet.write(0, len(headers) - 1, '', formats['header_group'])
-
-        # Write column headers in row 1
-        for col_idx, header in enumerate(headers):
-            # Use darker blue for total columns
-            if 'Total' in header or 'Net Worth' in header or 'After-Tax' in header:
-                worksheet.write(1, col_idx, header, formats['header_group'])
-            else:
-                worksheet.write(1, col_idx, header, formats['header'])
-
-        # Set column widths - consistent width for all currency columns (114 pixels = ~16.5 chars)
-        worksheet.set_column(0, 0, 7)  # Year
-        worksheet.set_column(1, 2 if has_couples else 1, 8)  # Ages
-
-        # All currency columns get same width (114 pixels)
-        first_currency_col = 3 if has_couples else 2
-        worksheet.set_column(first_currency_col, len(headers) - 1, 16.5)
-
-        # Freeze header rows (2 rows) and first 3 columns (Year + Ages)
-        freeze_col = 3 if has_couples else 2
-        worksheet.freeze_panes(2, freeze_col)
-
-        # Set up column groups (collapsible and collapsed by default)
-        # Width must be specified in grouping calls to maintain 114 pixels (16.5 chars)
-        # Important: Total columns between groups must have level: 0 to break the grouping
-
-        # Income sources group (collapsible and hidden by default)
-        worksheet.set_column(income_start_col, income_end_col, 16.5, None, {'level': 1, 'hidden': True})
-        # Total Income column - level 0 to break grouping
-        worksheet.set_column(income_end_col + 1, income_end_col + 1, 16.5, None, {'level': 0})
-
-        # Expenses group (collapsible and hidden by default)
-        worksheet.set_column(expense_start_col, expense_end_col, 16.5, None, {'level': 1, 'hidden': True})
-        # Total Expenses column - level 0 to break grouping
-        worksheet.set_column(expense_end_col + 1, expense_end_col + 1, 16.5, None, {'level': 0})
-
-        # Taxes group
-        worksheet.set_column(tax_start_col, tax_end_col, 16.5, None, {'level': 1, 'hidden': True})
-        # Total Tax column - level 0 to break grouping
-        worksheet.set_column(tax_end_col + 1, tax_end_col + 1, 16.5, None, {'level': 0})
-
-        # After-Tax Income and Net Cash Flow - level 0 (not grouped)
-        after_tax_col = tax_end_col + 2
-        worksheet.set_column(after_tax_col, after_tax_col + 1, 16.5, None, {'level': 0})
-
-        # Withdrawals group
-        worksheet.set_column(withdrawal_start_col, withdrawal_end_col, 16.5, None, {'level': 1, 'hidden': True})
-        # Total Withdrawals column - level 0 to break grouping
-        worksheet.set_column(withdrawal_end_col + 1, withdrawal_end_col + 1, 16.5, None, {'level': 0})
-
-        # Contributions group
-        worksheet.set_column(contribution_start_col, contribution_end_col, 16.5, None, {'level': 1, 'hidden': True})
-        # Total Contributions column - level 0 to break grouping
-        worksheet.set_column(contribution_end_col + 1, contribution_end_col + 1, 16.5, None, {'level': 0})
-
-        # Balances group
-        worksheet.set_column(balance_start_col, balance_end_col, 16.5, None, {'level': 1, 'hidden': True})
-        # Total Asset Returns column - level 0 to break grouping
-        worksheet.set_column(balance_end_col + 1, balance_end_col + 1, 16.5, None, {'level': 0})
-
-        # Net worth and shortfall columns - level 0 (not grouped)
-        net_worth_start_col = balance_end_col + 2
-        worksheet.set_column(net_worth_start_col, len(headers) - 1, 16.5, None, {'level': 0})
+        worksheet = workbook.add_worksheet(names.detailed)
+        template = layout.template('detailed', self._sheet_variant('detailed'))
+
+        # Group headers in row 0 (merged over each group), column headers in row 1
+        # (darker blue for total columns)
+        self._write_headers(worksheet, template, layout.formats)
+
+        # Widths and collapsible groups (hidden by default)
+        self._set_column_layout(worksheet, template)
+
+        # Freeze header rows (2 rows) and the key columns (Year + Ages)
+        worksheet.freeze_panes(template.header_rows, template.frozen_columns)
 
         # Write data rows with alternating colors (starting at row 2 after 2 header rows)
-        for row_idx, year in enumerate(self.projection.years, start=2):
-            # Determine if this is an alternating row (even row number)
-            is_alt_row = row_idx % 2 == 0
-
-            col = 0
-
-            # Year
-            self._write_value(worksheet, row_idx, col, year.year, 'integer', is_alt_row, formats)
-            col += 1
-
-            # Ages
-            self._write_value(worksheet, row_idx, col, year.primary_age or '', 'integer', is_alt_row, formats)
-            col += 1
-            if has_couples:
-                self._write_value(worksheet, row_idx, col, year.spouse_age or '', 'integer', is_alt_row, formats)
-                col += 1
-
-            # Calculate income totals from all individuals
-            total_employment = sum(income.employment for income in year.income_by_individual.values())
-            total_rrq = sum(income.rrq for income in year.income_by_individual.values())
-            total_psv = sum(income.psv for income in year.income_by_individual.values())
-            total_rrpe = sum(income.rrpe for income in year.income_by_individual.values())
-            total_other = sum(income.other for income in year.income_by_individual.values())
-
-            # Income sources
-            self._write_currency(worksheet, row_idx, col, total_employment, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, total_rrq, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, total_psv, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, total_rrpe, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, total_other, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.total_income, is_alt_row, formats, is_total=True)
-            col += 1
-
-            # Expenses by category
-            self._write_currency(worksheet, row_idx, col, year.expenses_by_category.get('housing', 0.0), is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.expenses_by_category.get('transport', 0.0), is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.expenses_by_category.get('dailyLiving', 0.0), is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.expenses_by_category.get('recreation', 0.0), is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.expenses_by_category.get('health', 0.0), is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.expenses_by_category.get('family', 0.0), is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.total_expenses, is_alt_row, formats, is_total=True)
-            col += 1
-
-            # Taxes
-            self._write_currency(worksheet, row_idx, col, year.federal_tax, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.quebec_tax, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.total_tax, is_alt_row, formats, is_total=True)
-            col += 1
-
-            # Cash flow
-            self._write_currency(worksheet, row_idx, col, year.after_tax_income, is_alt_row, formats, is_total=True)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.net_cash_flow, is_alt_row, formats, is_total=True)
-            col += 1
-
-            # Calculate withdrawals by account type
-            celi_withdrawals = sum(
-                amount for asset_id, amount in year.withdrawals_by_account.items()
-                if self.asset_type_map.get(asset_id) == 'celi'
-            )
-            cash_withdrawals = sum(
-                amount for asset_id, amount in year.withdrawals_by_account.items()
-                if self.asset_type_map.get(asset_id) == 'cash'
-            )
-            cri_withdrawals = sum(
-                amount for asset_id, amount in year.withdrawals_by_account.items()
-                if self.asset_type_map.get(asset_id) == 'cri'
-            )
-            reer_withdrawals = sum(
-                amount for asset_id, amount in year.withdrawals_by_account.items()
-                if self.asset_type_map.get(asset_id) == 'rrsp'
-            )
-
-            # Withdrawals
-            self._write_currency(worksheet, row_idx, col, celi_withdrawals, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, cash_withdrawals, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, cri_withdrawals, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, reer_withdrawals, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.total_withdrawals, is_alt_row, formats, is_total=True)
-            col += 1
-
-            # Calculate contributions by account type
-            celi_contributions = sum(
-                amount for asset_id, amount in year.contributions_by_account.items()
-                if self.asset_type_map.get(asset_id) == 'celi'
-            )
-            cash_contributions = sum(
-                amount for asset_id, amount in year.contributions_by_account.items()
-                if self.asset_type_map.get(asset_id) == 'cash'
-            )
-
-            # Contributions
-            self._write_currency(worksheet, row_idx, col, celi_contributions, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, cash_contributions, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.total_contributions, is_alt_row, formats, is_total=True)
-            col += 1
-
-            # Calculate asset balances by type
-            real_estate_balance = sum(
-                amount for asset_id, amount in year.assets_end_of_year.items()
-                if self.asset_type_map.get(asset_id) == 'realEstate'
-            )
-            reer_balance = sum(
-                amount for asset_id, amount in year.assets_end_of_year.items()
-                if self.asset_type_map.get(asset_id) == 'rrsp'
-            )
-            celi_balance = sum(
-                amount for asset_id, amount in year.assets_end_of_year.items()
-                if self.asset_type_map.get(asset_id) == 'celi'
-            )
-            cri_balance = sum(
-                amount for asset_id, amount in year.assets_end_of_year.items()
-                if self.asset_type_map.get(asset_id) == 'cri'
-            )
-            cash_balance = sum(
-                amount for asset_id, amount in year.assets_end_of_year.items()
-                if self.asset_type_map.get(asset_id) == 'cash'
-            )
-            total_returns = sum(year.asset_returns.values())
-
-            # Asset balances
-            self._write_currency(worksheet, row_idx, col, real_estate_balance, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, reer_balance, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, celi_balance, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, cri_balance, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, cash_balance, is_alt_row, formats)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, total_returns, is_alt_row, formats, is_total=True)
-            col += 1
-
-            # Net worth
-            self._write_currency(worksheet, row_idx, col, year.net_worth_start_of_year, is_alt_row, formats, is_total=True)
-            col += 1
-            self._write_currency(worksheet, row_idx, col, year.net_worth_end_of_year, is_alt_row, formats, is_total=True)
-            col += 1
-
-            # Shortfall
-            if year.has_shortfall:
-                self._write_currency(worksheet, row_idx, col, year.shortfall_amount, is_alt_row, formats, is_total=True)
+        self._write_columns(worksheet, template, template.header_rows, 'detailed')
+
+    @staticmethod
+    def _write_headers(worksheet, template: SheetTemplate, formats: FormatRegistry):
+        """Write the header rows of a projection sheet: pre-rendered (direct engine) or cell by cell."""
+        if template.skeleton is not None:
+            worksheet.write_static_rows(template.skeleton.header)
+            return
+        for row, first_col, last_col, text, style in template.header_cells:
+            if last_col > first_col:
+                worksheet.merge_range(row, first_col, row, last_col, text, formats[style])
             else:
-                format_key = 'currency_alt' if is_alt_row else 'currency'
-                worksheet.write(row_idx, col, '', formats[format_key])
-            col += 1
-
-    def _write_value(self, worksheet, row: int, col: int, value, value_type: str, is_alt_row: bool, formats: Dict):
-        """Write a value with appropriate formatting based on type and row."""
-        format_key = f'{value_type}_alt' if is_alt_row else value_type
-        if value == '':
-            worksheet.write(row, col, '', formats[format_key])
-        else:
-            worksheet.write(row, col, value, formats[format_key])
-
-    def _write_currency(self, worksheet, row: int, col: int, value: float, is_alt_row: bool, formats: Dict, is_total: bool = False):
-        """Write a currency value with appropriate formatting based on sign, row, and whether it's a total column."""
-        if is_total:
-            if value < 0:
-                format_key = 'currency_total_negative_alt' if is_alt_row else 'currency_total_negative'
-            else:
-                format_key = 'currency_total_alt' if is_alt_row else 'currency_total'
-        else:
-            if value < 0:
-                format_key = 'currency_negative_alt' if is_alt_row else 'currency_negative'
+                worksheet.write(row, first_col, text, formats[style])
+
+    @staticmethod
+    def _set_column_layout(worksheet, template: SheetTemplate):
+        """
+        Apply widths and outline levels from a sheet template.
+
+        Detail columns (outline level 1) start collapsed; level 0 columns
+        between them break the grouping.
+        """
+        for first, last, width, level in template.column_runs:
+            options = {'level': level, 'hidden': True} if level else {'level': 0}
+            worksheet.set_column(first, last, width, None, options)
+
+    def _write_columns(self, worksheet, template: SheetTemplate, first_row: int, sheet: str):
+        """
+        Write the data rows of a projection sheet with the template's
+        pre-resolved formats. Even sheet rows get the alternating background.
+        """
+        rows = self._sheet_rows(template.columns, sheet)
+        if template.skeleton is not None:
+            # Direct engine: rows go straight to sheet XML
+            worksheet.write_rows(first_row, rows, template.skeleton.row_xml, template.skeleton.alt_row_xml)
+            return
+
+        row_formats = template.row_formats
+        alt_row_formats = template.alt_row_formats
+
+        write_row = self._write_row
+        for row_idx, values in enumerate(rows, start=first_row):
+            write_row(worksheet, row_idx, values, alt_row_formats if row_idx % 2 == 0 else row_formats)
+
+    @staticmethod
+    def _write_row(worksheet, row: int, values: Sequence, row_formats: RowFormats):
+        """Write a whole data row using pre-resolved formats (None writes a formatted blank)."""
+        write_number = worksheet.write_number
+        write_blank = worksheet.write_blank
+        positive = row_formats.positive
+        negative = row_formats.negative
+        for col, value in enumerate(values):
+            if value is None:
+                write_blank(row, col, None, row_formats.blank[col])
+            elif value < 0:
+                write_number(row, col, value, negative[col])
             else:
-                format_key = 'currency_alt' if is_alt_row else 'currency'
-        worksheet.write_number(row, col, value, formats[format_key])
+                write_number(row, col, value, positive[col])
+
+    def _create_monte_carlo_sheet(self, workbook: xlsxwriter.Workbook, layout: WorkbookLayout,
+                                  names: SheetNames):
+        """Create the Monte Carlo sheet: net worth percentiles and shortfall odds per year."""
+        worksheet = workbook.add_worksheet(names.monte_carlo)
+        template = layout.template('monte_carlo', self._sheet_variant('monte_carlo'))
+
+        self._write_headers(worksheet, template, layout.formats)
+
+        # The fan chart band columns start collapsed
+        self._set_column_layout(worksheet, template)
+        worksheet.freeze_panes(template.header_rows, template.frozen_columns)
 
-    def _create_charts_sheet(self, workbook: xlsxwriter.Workbook, formats: Dict):
+        self._write_columns(worksheet, template, template.header_rows, 'monte_carlo')
+
+    def _create_charts_sheet(self, workbook: xlsxwriter.Workbook, layout: WorkbookLayout,
+                             names: SheetNames):
         """Create charts worksheet with visual representations of projection data."""
-        worksheet = workbook.add_worksheet('Charts')
+        worksheet = workbook.add_worksheet(names.charts)
 
         # Reference sheets and calculate positions
-        has_couples = any(year.spouse_age is not None for year in self.projection.years)
-        num_years = len(self.projection.years)
-
-        # For Detailed Projection sheet, we need to know column positions
-        # Year is always column A (0), ages start at column B (1)
-        # If couples: Age1=B(1), Age2=C(2), first data column = D(3)
-        # If single: Age1=B(1), first data column = C(2)
-        first_data_col_num = 3 if has_couples else 2
-
-        # Calculate all column positions exactly as in _create_detailed_projection_sheet
-        col = 0
-        col += 2  # Year, Age 1
-        if has_couples:
-            col += 1  # Age 2
-
-        # Income sources: Employment, RRQ, PSV, RRPE, Other, Total Income (6 columns)
-        employment_col = col
-        rrq_col = col + 1
-        psv_col = col + 2
-        rrpe_col = col + 3
-        other_col = col + 4
-        total_income_col = col + 5
-        col += 6
-
-        # Expenses: Housing, Transport, Daily Living, Recreation, Health, Family, Total Expenses (7 columns)
-        housing_col = col
-        transport_col = col + 1
-        daily_col = col + 2
-        recreation_col = col + 3
-        health_col = col + 4
-        family_col = col + 5
-        total_expenses_col = col + 6
-        col += 7
-
-        # Taxes: Federal Tax, Quebec Tax, Total Tax (3 columns)
-        col += 3
-
-        # Cash flow: After-Tax Income, Net Cash Flow (2 columns)
-        after_tax_income_col = col
-        net_cashflow_col = col + 1
-        col += 2
-
-        # Withdrawals: CELI, Cash, CRI, REER, Total (5 columns)
-        col += 5
-
-        # Contributions: CELI, Cash, Total (3 columns)
-        col += 3
-
-        # Balances: Real Estate, REER, CELI, CRI, Cash, Total Asset Returns (6 columns)
-        col += 6
-
-        # Net worth: Start, End (2 columns)
-        net_worth_start_col = col
-        net_worth_end_col = col + 1
-        col += 2
-
-        # Shortfall (1 column)
-        col += 1
-
-        # Convert column numbers to Excel letters
-        def col_letter(col_num):
-            """Convert 0-based column number to Excel letter (A, B, C...)."""
-            result = ''
-            while col_num >= 0:
-                result = chr(65 + (col_num % 26)) + result
-                col_num = col_num // 26 - 1
-            return result
+        num_years = self.aggregates.num_years
+        detailed_sheet = quote_sheet_name(names.detailed)
+
+        # Column positions come from the same template that lays out the detailed sheet
+        variant = self._sheet_variant('detailed')
+        index = layout.template('detailed', variant).index
+
+        # Everything the chart definitions below depend on (the ranges follow from them)
+        chart_key = ('charts', names.detailed, num_years, variant)
+
+        def column_range(column_id: str) -> str:
+            """Data rows of one detailed-sheet column (data starts at row 3)."""
+            letter = col_letter(index[column_id])
+            return f"={detailed_sheet}!${letter}$3:${letter}${num_years + 2}"
 
         # Chart 1: Net Worth Over Time (Line Chart)
-        chart_net_worth = workbook.add_chart({'type': 'line'})
+        chart_net_worth = layout.add_chart({'type': 'line'}, chart_key + ('net_worth',))
         chart_net_worth.add_series({
             'name': 'Net Worth',
-            'categories': f"='Detailed Projection'!$A$3:$A${num_years + 2}",  # Years (starts row 3)
-            'values': f"='Detailed Projection'!${col_letter(net_worth_end_col)}$3:${col_letter(net_worth_end_col)}${num_years + 2}",  # Net Worth End
+            'categories': column_range('year'),
+            'values': column_range('net_worth_end_of_year'),
             'line': {'color': '#4472C4', 'width': 2.5},
         })
         chart_net_worth.set_title({'name': 'Net Worth Over Time'})
@@ -844,23 +868,23 @@ class ExcelGenerator:
         worksheet.insert_chart('B2', chart_net_worth)
 
         # Chart 2: Income Breakdown by Source (Stacked Area Chart)
-        chart_income = workbook.add_chart({'type': 'area', 'subtype': 'stacked'})
+        chart_income = layout.add_chart({'type': 'area', 'subtype': 'stacked'}, chart_key + ('income',))
 
         # Add each income source as a series
         income_sources = [
-            ('Employment', employment_col, '#70AD47'),
-            ('RRQ', rrq_col, '#5B9BD5'),
-            ('PSV', psv_col, '#FFC000'),
-            ('RRPE', rrpe_col, '#C55A11'),
-            ('Other', other_col, '#A5A5A5'),
+            ('Employment', 'income_by_source.employment', '#70AD47'),
+            ('RRQ', 'income_by_source.rrq', '#5B9BD5'),
+            ('PSV', 'income_by_source.psv', '#FFC000'),
+            ('RRPE', 'income_by_source.rrpe', '#C55A11'),
+            ('Other', 'income_by_source.other', '#A5A5A5'),
         ]
 
         # Use same formula approach as working charts
-        for name, col_num, color in income_sources:
+        for name, column_id, color in income_sources:
             chart_income.add_series({
                 'name': name,
-                'categories': f"='Detailed Projection'!$A$3:$A${num_years + 2}",
-                'values': f"='Detailed Projection'!${col_letter(col_num)}$3:${col_letter(col_num)}${num_years + 2}",
+                'categories': column_range('year'),
+                'values': column_range(column_id),
                 'fill': {'color': color},
                 'line': {'none': True},
             })
@@ -874,27 +898,29 @@ class ExcelGenerator:
         worksheet.insert_chart('B23', chart_income)
 
         # Chart 3: Expense Breakdown (Pie Chart - final year)
-        chart_expenses = workbook.add_chart({'type': 'pie'})
+        chart_expenses = layout.add_chart({'type': 'pie'}, chart_key + ('expenses',))
 
         expense_categories = [
-            ('Housing', housing_col, '#4472C4'),
-            ('Transport', transport_col, '#ED7D31'),
-            ('Daily Living', daily_col, '#A5A5A5'),
-            ('Recreation', recreation_col, '#FFC000'),
-            ('Health', health_col, '#5B9BD5'),
-            ('Family', family_col, '#70AD47'),
+            ('Housing', 'expenses_by_category.housing', '#4472C4'),
+            ('Transport', 'expenses_by_category.transport', '#ED7D31'),
+            ('Daily Living', 'expenses_by_category.dailyLiving', '#A5A5A5'),
+            ('Recreation', 'expenses_by_category.recreation', '#FFC000'),
+            ('Health', 'expenses_by_category.health', '#5B9BD5'),
+            ('Family', 'expenses_by_category.family', '#70AD47'),
         ]
 
         # Use last year's expenses for pie chart
         if num_years > 0:
             last_row = num_years + 2  # Excel row number (1-indexed)
             colors = [cat[2] for cat in expense_categories]
+            first_col = col_letter(index[expense_categories[0][1]])
+            last_col = col_letter(index[expense_categories[-1][1]])
 
             # Use same formula approach as working charts
             chart_expenses.add_series({
                 'name': 'Expenses',
-                'categories': f"='Detailed Projection'!${col_letter(housing_col)}$2:${col_letter(family_col)}$2",  # Headers row 2
-                'values': f"='Detailed Projection'!${col_letter(housing_col)}${last_row}:${col_letter(family_col)}${last_row}",  # Last year data
+                'categories': f"={detailed_sheet}!${first_col}$2:${last_col}$2",  # Headers row 2
+                'values': f"={detailed_sheet}!${first_col}${last_row}:${last_col}${last_row}",  # Last year data
                 'points': [{'fill': {'color': color}} for color in colors],
             })
 
@@ -905,12 +931,12 @@ class ExcelGenerator:
         worksheet.insert_chart('N2', chart_expenses)
 
         # Chart 4: Cash Flow Over Time (Column Chart)
-        chart_cashflow = workbook.add_chart({'type': 'column'})
+        chart_cashflow = layout.add_chart({'type': 'column'}, chart_key + ('cash_flow',))
 
         chart_cashflow.add_series({
             'name': 'Net Cash Flow',
-            'categories': f"='Detailed Projection'!$A$3:$A${num_years + 2}",
-            'values': f"='Detailed Projection'!${col_letter(net_cashflow_col)}$3:${col_letter(net_cashflow_col)}${num_years + 2}",
+            'categories': column_range('year'),
+            'values': column_range('net_cash_flow'),
             'fill': {'color': '#70AD47'},
         })
 
@@ -922,98 +948,154 @@ class ExcelGenerator:
         chart_cashflow.show_hidden_data()  # Show data in hidden/collapsed columns
         worksheet.insert_chart('N23', chart_cashflow)
 
+        # Chart 5: Net Worth Fan Chart (Monte Carlo percentile bands)
+        if self.monte_carlo is not None and self.fan_chart:
+            worksheet.insert_chart('B44', self._fan_chart(workbook, layout, names))
+
+    def _fan_chart(self, workbook: xlsxwriter.Workbook, layout: WorkbookLayout, names: SheetNames):
+        """
+        Stacked area of the percentile bands (an invisible P5 base, then the
+        band widths) with the median drawn as a line on top.
+        """
+        percentiles = self.monte_carlo.percentiles
+        index = layout.template('monte_carlo', self._sheet_variant('monte_carlo')).index
+        num_years = self.monte_carlo.num_years
+        monte_carlo_sheet = quote_sheet_name(names.monte_carlo)
+
+        def column_range(column_id: str) -> str:
+            """Data rows of one Monte Carlo sheet column (data starts at row 2)."""
+            letter = col_letter(index[column_id])
+            return f"={monte_carlo_sheet}!${letter}$2:${letter}${num_years + 1}"
+
+        chart_key = ('fan', names.monte_carlo, num_years, tuple(percentiles), self.monte_carlo.paths)
+        chart_fan = layout.add_chart({'type': 'area', 'subtype': 'stacked'}, chart_key)
+        for idx, percentile in enumerate(percentiles):
+            if idx == 0:
+                fill = {'none': True}
+                name = f'P{percentile}'
+            else:
+                # Outer bands lighter than the inner ones
+                fill = {'color': '#BDD7EE' if idx in (1, len(percentiles) - 1) else '#9DC3E6'}
+                name = f'P{percentiles[idx - 1]}-P{percentile}'
+            chart_fan.add_series({
+                'name': name,
+                'categories': column_range('year'),
+                'values': column_range(f'band_p{percentile}'),
+                'fill': fill,
+                'line': {'none': True},
+            })
+
+        chart_median = workbook.add_chart({'type': 'line'})
+        chart_median.add_series({
+            'name': 'Median',
+            'categories': column_range('year'),
+            'values': column_range('net_worth_p50'),
+            'line': {'color': '#1F4E79', 'width': 2.5},
+        })
+        chart_fan.combine(chart_median)
+
+        chart_fan.set_title({'name': f'Net Worth Range ({self.monte_carlo.paths:,} Simulated Paths)'})
+        chart_fan.set_x_axis({'name': 'Year'})
+        chart_fan.set_y_axis({'name': 'Net Worth ($)', 'num_format': '#,##0'})
+        chart_fan.set_size({'width': 720, 'height': 400})
+        chart_fan.set_legend({'position': 'bottom', 'delete_series': [0]})
+        chart_fan.show_hidden_data()  # Band widths live in collapsed columns
+        return chart_fan
+
+
+@dataclass
+class PreparedScenario:
+    """Per-scenario results computed ahead of the (serial) worksheet writes."""
+    generator: ExcelGenerator  # aggregated, with its sheet rows already extracted
+    kpis: Dict[str, float]
+
+    @property
+    def scenario_name(self) -> str:
+        return self.generator.scenario_name
+
+
+def prepare_scenario(scenario: Dict) -> PreparedScenario:
+    """
+    Aggregate one scenario and extract the data rows of its sheets.
+
+    Module-level so it can be shipped to a worker process.
+    """
+    generator = ExcelGenerator(scenario['projection'], scenario['scenario_name'], scenario['assets'],
+                               monte_carlo=scenario.get('monte_carlo'), fan_chart=scenario.get('fan_chart', True))
+    generator.prepare_rows()
+    return PreparedScenario(generator=generator, kpis=generator.aggregates.kpis())
+
 
 class MultiScenarioExcelGenerator:
     """Generates Excel files comparing multiple scenarios."""
 
-    def __init__(self, scenarios: List[Dict]):
+    def __init__(self, scenarios: List[Dict], executor: Optional[Executor] = None):
         """
         Initialize with list of scenarios.
         
         Each scenario dict contains:
-        - 'projection': Projection object
+        - 'projection': ColumnarProjection (or Projection) object
         - 'scenario_name': str
         - 'assets': List[Asset]
+        - 'monte_carlo', 'fan_chart': optional, as for ExcelGenerator
+
+        Every scenario gets the full single-scenario tabs after the comparison
+        summary. Formats, sheet templates and column runs are resolved once
+        for the workbook; when an executor (e.g. a process pool) is given,
+        per-scenario aggregation, KPIs and row extraction run concurrently on
+        it, so only the order-dependent worksheet writes stay on the calling
+        thread.
         """
         self.scenarios = scenarios
+        self.executor = executor
 
-    def generate(self) -> bytes:
+    def generate(self, constant_memory: bool = False, engine: Optional[str] = None) -> bytes:
         """
         Generate multi-scenario comparison Excel file.
-        
+
+        Args:
+            constant_memory: Flush each row to disk as soon as the next one starts
+            engine: Workbook engine, see ENGINES (DEFAULT_ENGINE when None)
+
         Returns:
             bytes: Excel file content
         """
-        # Create workbook in memory
         output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-
-        # Create formats
-        formats = self._create_formats(workbook)
+        self.write(output, constant_memory, engine)
+        return output.getvalue()
+
+    def write(self, output: Union[str, BinaryIO], constant_memory: bool = False, engine: Optional[str] = None):
+        """Write the comparison Excel file to a path or binary file object."""
+        workbook = create_workbook(output, constant_memory, engine)
+
+        # Formats and sheet templates are resolved once and shared by every tab
+        with span('formats') as formats_span:
+            layout = WorkbookLayout(workbook)
+            formats_span.set(formats=len(layout.formats))
+
+        # Prepare every scenario up front (concurrently when an executor is set);
+        # results are shared by the comparison summary and the scenario tabs
+        with span('prepare_scenarios', scenarios=len(self.scenarios), parallel=self.executor is not None):
+            if self.executor is not None:
+                prepared = list(self.executor.map(prepare_scenario, self.scenarios))
+            else:
+                prepared = [prepare_scenario(scenario) for scenario in self.scenarios]
 
         # Create comparison summary tab (first tab)
-        self._create_comparison_summary(workbook, formats)
+        with span('sheet', sheet='Comparison Summary') as sheet_span:
+            self._create_comparison_summary(workbook, layout.formats, prepared)
+            _record_sheet(sheet_span, workbook)
 
-        # Create individual scenario tabs
-        for idx, scenario in enumerate(self.scenarios):
-            prefix = f"{idx + 1}. {scenario['scenario_name']}"
-            generator = ExcelGenerator(
-                scenario['projection'],
-                scenario['scenario_name'],
-                scenario['assets']
-            )
-            
-            # Create tabs with scenario prefix
-            self._create_scenario_tabs(workbook, generator, prefix, formats)
+        # Full tabs for each scenario, named with its position and name
+        for idx, scenario in enumerate(prepared):
+            with span('scenario', scenario=idx + 1):
+                scenario.generator.write_sheets(workbook, layout, SheetNames.for_scenario(idx, scenario.scenario_name))
 
         # Close workbook
-        workbook.close()
-
-        # Return bytes
-        output.seek(0)
-        return output.read()
-
-    def _create_formats(self, workbook: xlsxwriter.Workbook) -> Dict:
-        """Create reusable cell formats."""
-        return {
-            'header': workbook.add_format({
-                'bold': True,
-                'bg_color': '#4472C4',
-                'font_color': 'white',
-                'align': 'center',
-                'valign': 'vcenter',
-                'border': 1,
-            }),
-            'currency': workbook.add_format({
-                'num_format': '#,##0',
-                'align': 'right',
-            }),
-            'currency_positive': workbook.add_format({
-                'num_format': '#,##0',
-                'align': 'right',
-                'font_color': '#008000',  # Green
-            }),
-            'currency_negative': workbook.add_format({
-                'num_format': '#,##0',
-                'align': 'right',
-                'font_color': 'red',
-            }),
-            'label': workbook.add_format({
-                'bold': True,
-                'align': 'left',
-            }),
-            'value': workbook.add_format({
-                'align': 'left',
-            }),
-            'section_header': workbook.add_format({
-                'bold': True,
-                'font_size': 12,
-                'bg_color': '#D9E1F2',
-                'border': 1,
-            }),
-        }
+        _close_workbook(workbook, output)
 
-    def _create_comparison_summary(self, workbook: xlsxwriter.Workbook, formats: Dict):
+    def _create_comparison_summary(self, workbook: xlsxwriter.Workbook, formats: FormatRegistry,
+                                   prepared: List[PreparedScenario]):
         """Create comparison summary tab with side-by-side KPIs."""
         worksheet = workbook.add_worksheet('Comparison Summary')
 
@@ -1035,23 +1117,8 @@ class MultiScenarioExcelGenerator:
             worksheet.write(row, idx + 1, scenario['scenario_name'], formats['header'])
         row += 1
 
-        # Calculate KPIs for each scenario
-        kpis_list = []
-        for scenario in self.scenarios:
-            projection = scenario['projection']
-            first_year = projection.years[0] if projection.years else None
-            last_year = projection.years[-1] if projection.years else None
-            
-            kpis = {
-                'Initial Net Worth': first_year.net_worth_start_of_year if first_year else 0,
-                'Final Net Worth': last_year.net_worth_end_of_year if last_year else 0,
-                'Total Income': sum(y.total_income for y in projection.years),
-                'Total Expenses': sum(y.total_expenses for y in projection.years),
-                'Total Tax': sum(y.total_tax for y in projection.years),
-                'Years with Shortfall': len([y for y in projection.years if y.has_shortfall]),
-                'Total Shortfall': sum(y.shortfall_amount for y in projection.years if y.has_shortfall),
-            }
-            kpis_list.append(kpis)
+        # KPIs for each scenario come from the prepared aggregates
+        kpis_list = [scenario.kpis for scenario in prepared]
 
         # Write KPI rows
         metric_names = [
@@ -1114,44 +1181,33 @@ class MultiScenarioExcelGenerator:
                 else:
                     worksheet.write_number(row, idx + 1, diff, formats['currency'])
 
-    def _create_scenario_tabs(self, workbook: xlsxwriter.Workbook,
-                             generator: ExcelGenerator, prefix: str, formats: Dict):
-        """Create tabs for a single scenario - simplified for Phase 9."""
-        # For Phase 9, we'll just create the base projection tab for each scenario
-        # Users can export individual scenarios for full details (Summary, Detailed, Charts)
-
-        # Reuse the ExcelGenerator's base projection logic
-        # This creates a simple tab with key metrics for comparison
-        worksheet = workbook.add_worksheet(f"{prefix}")
-
-        # Use the generator's methods directly
-        # We'll create a simplified version - just the projection data
-        formats_full = generator._create_formats(workbook)
-
-        # Set column widths
-        worksheet.set_column(0, 0, 7)  # Year
-        worksheet.set_column(1, 1, 8)  # Age
-        worksheet.set_column(2, 10, 16.5)  # Data columns
-
-        # Write headers
-        headers = ['Year', 'Age', 'Total Income', 'Total Expenses', 'Total Tax',
-                  'Net Cash Flow', 'Net Worth', 'Shortfall']
-        for col_idx, header in enumerate(headers):
-            worksheet.write(0, col_idx, header, formats['header'])
-
-        # Write data rows (simplified)
-        for row_idx, year in enumerate(generator.projection.years, start=1):
-            worksheet.write(row_idx, 0, year.year, formats['value'])
-            worksheet.write(row_idx, 1, year.primary_age or '', formats['value'])
-            worksheet.write_number(row_idx, 2, year.total_income, formats['currency'])
-            worksheet.write_number(row_idx, 3, year.total_expenses, formats['currency'])
-            worksheet.write_number(row_idx, 4, year.total_tax, formats['currency'])
-            worksheet.write_number(row_idx, 5, year.net_cash_flow, formats['currency'])
-            worksheet.write_number(row_idx, 6, year.net_worth_end_of_year, formats['currency'])
-            if year.has_shortfall:
-                worksheet.write_number(row_idx, 7, year.shortfall_amount, formats['currency_negative'])
-            else:
-                worksheet.write(row_idx, 7, '', formats['value'])
 
-        # Freeze panes
-        worksheet.freeze_panes(1, 2)
+def prepare_cells(scenarios: List[Dict]) -> int:
+    """Size of the per-scenario preparation of a comparison: years x accounts, summed over scenarios."""
+    total = 0
+    for scenario in scenarios:
+        projection = scenario['projection']
+        if isinstance(projection, ColumnarProjection):
+            total += projection.num_years * max(1, len(projection.account_ids))
+        elif projection.years:
+            total += len(projection.years) * max(1, len(projection.years[0].assets_end_of_year))
+    return total
+
+
+def generator_for_request(export_request, executor: Optional[Executor] = None):
+    """
+    Workbook generator for a parsed single or multi-scenario request.
+
+    Args:
+        export_request: ParsedExportRequest from request_parser
+        executor: Pool comparison scenarios are prepared on, used only when
+                  they reach PARALLEL_PREPARE_MIN_CELLS (inline otherwise)
+    """
+    if export_request.is_multi_scenario:
+        scenarios = export_request.scenarios
+        if not PARALLEL_PREPARE_MIN_CELLS or prepare_cells(scenarios) < PARALLEL_PREPARE_MIN_CELLS:
+            executor = None
+        return MultiScenarioExcelGenerator(scenarios, executor=executor)
+    scenario = export_request.scenarios[0]
+    return ExcelGenerator(scenario['projection'], scenario['scenario_name'], scenario['assets'],
+                          monte_carlo=scenario.get('monte_carlo'), fan_chart=scenario.get('fan_chart', True))
@@ -0,0 +1,267 @@
+"""
+Content-addressed cache for generated workbooks.
+Keys are a stable hash of the normalized (parsed) payload, so retries and
+repeated exports of the same projection skip workbook generation.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from columnar import ColumnarProjection
+
+
+# Bump when the key scheme changes; layout changes are picked up by layout_version
+CACHE_VERSION = '2'
+
+# Modules whose code decides what the workbooks contain: the layout, and the
+# cell values from ColumnarProjection.column() and MonteCarloResult.column().
+# Their source is part of every key, so a deploy that changes them never
+# serves stale disk entries.
+LAYOUT_MODULES = ('excel_generator.py', 'sheet_schema.py', 'aggregates.py', 'xlsx_direct.py',
+                  'columnar.py', 'monte_carlo.py')
+
+
+@functools.lru_cache(maxsize=None)
+def layout_version() -> str:
+    """Fingerprint of the workbook layout: the LAYOUT_MODULES sources and the XlsxWriter release."""
+    from importlib import metadata  # Deferred: slow to import, and only needed for the first key
+
+    hasher = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in LAYOUT_MODULES:
+        with open(os.path.join(directory, name), 'rb') as f:
+            hasher.update(name.encode() + b'\x00' + f.read() + b'\x00')
+    try:
+        hasher.update(metadata.version('XlsxWriter').encode())
+    except metadata.PackageNotFoundError:
+        pass
+    return hasher.hexdigest()[:16]
+
+
+def export_cache_key(scenarios: List[Dict], is_multi_scenario: bool) -> str:
+    """
+    Hash the normalized payload: projection data, scenario name, assets and
+    Monte Carlo results when present, under the current layout_version.
+
+    Hashing the parsed columnar arrays (rather than the raw body) makes the key
+    independent of whitespace, key order, number formatting and omitted
+    defaults.
+    """
+    import numpy as np  # Deferred so the cache can be created without the export stack
+
+    hasher = hashlib.sha256()
+    hasher.update(f'v{CACHE_VERSION}|layout={layout_version()}|multi={is_multi_scenario}|n={len(scenarios)}'.encode())
+    for scenario in scenarios:
+        hasher.update(b'\x00scenario\x00')
+        hasher.update(str(scenario['scenario_name']).encode())
+        hasher.update(b'\x00assets\x00')
+        hasher.update('\x00'.join(f'{asset.id}={asset.type}' for asset in scenario['assets']).encode())
+        _update_projection(hasher, scenario['projection'])
+        monte_carlo = scenario.get('monte_carlo')
+        if monte_carlo is not None:
+            hasher.update(f'\x00monte_carlo\x00{monte_carlo.paths}:{monte_carlo.seed}:'
+                          f'{monte_carlo.percentiles}:{scenario.get("fan_chart", True)}\x00'.encode())
+            for values in (monte_carlo.net_worth_bands, monte_carlo.shortfall_probability,
+                           monte_carlo.expected_shortfall):
+                hasher.update(np.ascontiguousarray(values).tobytes())
+    return hasher.hexdigest()
+
+
+def _update_projection(hasher, projection: 'ColumnarProjection'):
+    """Feed every field of a columnar projection into the hasher."""
+    import numpy as np
+
+    header = [
+        projection.scenario_id, projection.project_id, projection.start_year, projection.end_year,
+        projection.use_constant_dollars, projection.inflation_rate, projection.calculated_at.isoformat(),
+    ]
+    hasher.update(json.dumps(header, default=str).encode())
+
+    arrays = {
+        'year': projection.year,
+        'years_from_start': projection.years_from_start,
+        'primary_age': projection.primary_age,
+        'spouse_age': projection.spouse_age,
+        'has_shortfall': projection.has_shortfall,
+        'income': projection.income,
+        'expenses_by_category': projection.expenses_by_category,
+    }
+    arrays.update({f'metric.{name}': values for name, values in projection.metrics.items()})
+    arrays.update({f'account.{name}': values for name, values in projection.accounts.items()})
+    for name in sorted(arrays):
+        values = np.ascontiguousarray(arrays[name])
+        hasher.update(f'\x00{name}:{values.dtype.str}:{values.shape}\x00'.encode())
+        hasher.update(values.tobytes())
+
+    for label, ids in (('individuals', projection.individual_ids),
+                       ('categories', projection.category_ids),
+                       ('accounts', projection.account_ids)):
+        hasher.update(f'\x00{label}\x00'.encode())
+        hasher.update('\x00'.join(ids).encode())
+    hasher.update(json.dumps(projection.events_occurred).encode())
+
+
+class CacheStore(ABC):
+    """Second-tier cache interface (e.g. local disk or a mounted filesystem)."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """Stored workbook for key (None on a miss)."""
+
+    @abstractmethod
+    def put(self, key: str, value: bytes):
+        """Store a workbook under key."""
+
+
+class DiskCacheStore(CacheStore):
+    """Stores workbooks as one file per key in a directory."""
+
+    def __init__(self, directory: str, max_bytes: Optional[int] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.xlsx')
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                value = f.read()
+        except FileNotFoundError:
+            return None
+        # Touch so eviction keeps recently used entries
+        try:
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            pass
+        return value
+
+    def put(self, key: str, value: bytes):
+        # Write to a temp file first so readers never see a partial workbook
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(value)
+        os.replace(tmp_path, self._path(key))
+        if self.max_bytes is not None:
+            self._evict()
+
+    def _evict(self):
+        """Delete least recently used files until the directory fits max_bytes."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.xlsx'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class ExportCache:
+    """Size-bounded in-process LRU in front of an optional CacheStore."""
+
+    def __init__(self, max_bytes: int, store: Optional[CacheStore] = None):
+        self.max_bytes = max_bytes
+        self.store = store
+        self._entries: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        # Counters reported in the timing logs
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached workbook bytes, checking memory first, then the store."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return value
+
+        if self.store is not None:
+            value = self.store.get(key)
+            if value is not None:
+                with self._lock:
+                    self.store_hits += 1
+                    self._insert(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: bytes):
+        """Cache workbook bytes in memory and in the store."""
+        with self._lock:
+            self._insert(key, value)
+        if self.store is not None:
+            self.store.put(key, value)
+
+    def _insert(self, key: str, value: bytes):
+        """Insert into the LRU and evict until under max_bytes (lock held)."""
+        if len(value) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+        self._entries[key] = value
+        self._size += len(value)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current in-memory size."""
+        with self._lock:
+            return {
+                'memory_hits': self.memory_hits,
+                'store_hits': self.store_hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self._size,
+            }
+
+
+def create_export_cache_from_env() -> Optional[ExportCache]:
+    """
+    Build the process-wide cache from environment variables.
+
+    EXPORT_CACHE_MAX_BYTES  In-memory LRU budget (default 32 MB, 0 disables caching)
+    EXPORT_CACHE_DIR        Optional directory for the on-disk second tier
+    EXPORT_CACHE_DIR_MAX_BYTES  Optional size budget for the on-disk tier
+    """
+    max_bytes = int(os.environ.get('EXPORT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    if max_bytes <= 0:
+        return None
+
+    store = None
+    directory = os.environ.get('EXPORT_CACHE_DIR')
+    if directory:
+        dir_max_bytes = os.environ.get('EXPORT_CACHE_DIR_MAX_BYTES')
+        store = DiskCacheStore(directory, int(dir_max_bytes) if dir_max_bytes else None)
+
+    return ExportCache(max_bytes, store)
@@ -0,0 +1,319 @@
+"""
+Asynchronous export jobs.
+An async export request is parsed up front, then its workbook is built on a
+job worker pool while the client gets a job id straight away and polls for
+the result. At most max_queued jobs wait for a worker; beyond that submit()
+refuses new jobs, since every queued job holds its parsed request in memory.
+Job records and finished workbooks live in a pluggable ResultStore;
+LocalResultStore keeps them on the local filesystem (dev, tests and
+single-instance deployments).
+"""
+
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict, replace
+from typing import BinaryIO, Callable, Dict, Optional
+
+from tracing import start_trace
+
+
+# Job states
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+# Job ids are uuid4 hex strings; anything else is rejected before touching storage
+_JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def is_job_id(value: Optional[str]) -> bool:
+    """Whether value is a well-formed job id."""
+    return bool(value) and _JOB_ID_PATTERN.match(value) is not None
+
+
+class JobQueueFull(Exception):
+    """No room for another job, with the seconds a client should wait before retrying."""
+
+    def __init__(self, retry_after: int):
+        super().__init__('Too many export jobs queued, retry later')
+        self.retry_after = retry_after
+
+
+@dataclass
+class ExportJob:
+    """State of one asynchronous export."""
+    id: str
+    status: str
+    filename: str
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    size: Optional[int] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        """Status payload returned to clients."""
+        return {
+            'jobId': self.id,
+            'status': self.status,
+            'filename': self.filename,
+            'createdAt': self.created_at,
+            'startedAt': self.started_at,
+            'finishedAt': self.finished_at,
+            'size': self.size,
+            'error': self.error,
+        }
+
+
+class ResultStore(ABC):
+    """Job record and workbook storage interface (e.g. local disk or object storage)."""
+
+    @abstractmethod
+    def save_job(self, job: ExportJob):
+        """Create or update a job record."""
+
+    @abstractmethod
+    def load_job(self, job_id: str) -> Optional[ExportJob]:
+        """Job record by id (None when there is none)."""
+
+    @abstractmethod
+    def put_result(self, job_id: str, path: str) -> int:
+        """Take ownership of a finished workbook file; returns its size in bytes."""
+
+    @abstractmethod
+    def open_result(self, job_id: str) -> Optional[BinaryIO]:
+        """Open a stored workbook for reading (None when there is none)."""
+
+    @abstractmethod
+    def purge(self, max_age: float):
+        """Delete jobs (and results) older than max_age seconds."""
+
+
+class LocalResultStore(ResultStore):
+    """Stores each job as <id>.json plus <id>.xlsx in a directory."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, f'{job_id}{suffix}')
+
+    def save_job(self, job: ExportJob):
+        # Write to a temp file first so pollers never see a partial record
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(asdict(job), f)
+        os.replace(tmp_path, self._path(job.id, '.json'))
+
+    def load_job(self, job_id: str) -> Optional[ExportJob]:
+        if not is_job_id(job_id):
+            return None
+        try:
+            with open(self._path(job_id, '.json')) as f:
+                return ExportJob(**json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def put_result(self, job_id: str, path: str) -> int:
+        size = os.path.getsize(path)
+        shutil.move(path, self._path(job_id, '.xlsx'))
+        return size
+
+    def open_result(self, job_id: str) -> Optional[BinaryIO]:
+        if not is_job_id(job_id):
+            return None
+        try:
+            return open(self._path(job_id, '.xlsx'), 'rb')
+        except FileNotFoundError:
+            return None
+
+    def purge(self, max_age: float):
+        cutoff = time.time() - max_age
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class ExportJobQueue:
+    """Runs workbook builds on a thread pool and records their progress in a ResultStore."""
+
+    def __init__(self, store: ResultStore, workers: int = 2, ttl_seconds: float = 3600.0, max_queued: int = 16):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.workers = workers
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='export-job')
+        self._lock = threading.Lock()
+        self._pending = 0           # queued or running
+        self._build_seconds = 0.0   # total over finished jobs, for Retry-After
+
+        # Counters reported in the timing logs
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, build: Callable[[str], None], filename: str) -> ExportJob:
+        """
+        Queue a workbook build.
+
+        Args:
+            build: Writes the workbook to the file path it is given
+            filename: Download filename recorded on the job
+
+        Returns:
+            The queued job
+
+        Raises:
+            JobQueueFull: max_queued jobs are already waiting for a worker
+        """
+        with self._lock:
+            self._ensure_room()
+            self._pending += 1
+            self.submitted += 1
+        try:
+            self.store.purge(self.ttl_seconds)
+            job = ExportJob(id=uuid.uuid4().hex, status=JOB_QUEUED, filename=filename, created_at=time.time())
+            self.store.save_job(job)
+            # The worker updates its own copy, so the returned job stays a snapshot
+            self._executor.submit(self._run, replace(job), build)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return job
+
+    def ensure_room(self):
+        """
+        Check there is room for a job before its request is parsed.
+
+        Raises:
+            JobQueueFull: submit() would refuse a job right now
+        """
+        with self._lock:
+            self._ensure_room()
+
+    def _ensure_room(self):
+        if self._waiting() >= self.max_queued:
+            self.rejected += 1
+            raise JobQueueFull(self._retry_after())
+
+    def _waiting(self) -> int:
+        return max(0, self._pending - self.workers)
+
+    def _retry_after(self) -> int:
+        # Roughly the time for the workers to get through the waiting jobs
+        finished = self.completed + self.failed
+        average = self._build_seconds / finished if finished else 1.0
+        return max(1, math.ceil((self._waiting() + 1) * average / self.workers))
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        """Current state of a job (None when unknown or expired)."""
+        return self.store.load_job(job_id)
+
+    def open_result(self, job_id: str) -> Optional[BinaryIO]:
+        """Open a finished job's workbook."""
+        return self.store.open_result(job_id)
+
+    def _run(self, job: ExportJob, build: Callable[[str], None]):
+        """Build one workbook into a temp file and hand it to the store."""
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        try:
+            self.store.save_job(job)
+            self._build(job, build)
+            job.finished_at = time.time()
+            self.store.save_job(job)
+        except Exception as e:
+            # The store could not record the job (e.g. a full disk): report it failed if it still can
+            print(f'Export job {job.id} could not be stored: {str(e)}')
+            traceback.print_exc()
+            job.status = JOB_FAILED
+            job.error = f'Could not store the export job: {str(e)}'
+            job.finished_at = time.time()
+            try:
+                self.store.save_job(job)
+            except Exception:
+                pass
+        finally:
+            # Always release the queue slot, so store failures cannot fill the queue
+            with self._lock:
+                self._pending -= 1
+                self._build_seconds += (job.finished_at or time.time()) - job.started_at
+                if job.status == JOB_DONE:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def _build(self, job: ExportJob, build: Callable[[str], None]):
+        """Run the build and store its workbook, recording a build failure on the job."""
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        # Each job is its own trace (context variables do not follow the task into the pool)
+        with start_trace('export_job', job_id=job.id) as job_span:
+            try:
+                build(path)
+                job.size = self.store.put_result(job.id, path)
+                job.status = JOB_DONE
+            except Exception as e:
+                print(f'Export job {job.id} failed: {str(e)}')
+                traceback.print_exc()
+                job.status = JOB_FAILED
+                job.error = str(e)
+            finally:
+                if os.path.exists(path):
+                    os.remove(path)
+            job_span.set(status=job.status, bytes=job.size)
+
+    def shutdown(self, wait: bool = True):
+        """Stop taking jobs; with wait=True, return once the queued and running builds are done."""
+        self._executor.shutdown(wait=wait)
+
+    def stats(self) -> Dict[str, int]:
+        """Job counters since start-up."""
+        with self._lock:
+            return {'submitted': self.submitted, 'completed': self.completed, 'failed': self.failed,
+                    'rejected': self.rejected, 'pending': self._pending}
+
+
+def create_export_jobs_from_env() -> Optional[ExportJobQueue]:
+    """
+    Build the process-wide job queue from environment variables.
+
+    Async exports are off (None) unless a store is configured: builds run after
+    the 202 is sent, which needs CPU that stays allocated between requests and
+    polls that reach the instance holding the job. On Cloud Functions neither
+    holds, so only the self-hosted server (server.py) enables the local store.
+
+    EXPORT_JOB_STORE        'local' for LocalResultStore (default: unset, async exports disabled)
+    EXPORT_JOB_DIR          Directory of the local result store (default: <tmp>/export_jobs)
+    EXPORT_JOB_WORKERS      Concurrent workbook builds (default 2)
+    EXPORT_JOB_TTL_SECONDS  How long job records and results are kept (default 1 hour)
+    EXPORT_JOB_MAX_QUEUED   Jobs that may wait for a worker before new ones get a 429 (default 16)
+    """
+    store = os.environ.get('EXPORT_JOB_STORE', '').lower()
+    if not store:
+        return None
+    if store != 'local':
+        raise ValueError(f'Unknown EXPORT_JOB_STORE: {store!r} (expected local)')
+    directory = os.environ.get('EXPORT_JOB_DIR') or os.path.join(tempfile.gettempdir(), 'export_jobs')
+    workers = max(1, int(os.environ.get('EXPORT_JOB_WORKERS', 2)))
+    ttl_seconds = float(os.environ.get('EXPORT_JOB_TTL_SECONDS', 3600))
+    max_queued = max(0, int(os.environ.get('EXPORT_JOB_MAX_QUEUED', 16)))
+    return ExportJobQueue(LocalResultStore(directory), workers, ttl_seconds, max_queued)
@@ -2,19 +2,161 @@
 # This file contains HTTP Cloud Functions for generating Excel files from projection data
 
 from firebase_functions import https_fn
-from firebase_admin import initialize_app
+from firebase_functions.core import init
+import io
+import itertools
 import json
+import os
+import sys
+import tempfile
+import traceback
 from datetime import datetime
 import time
+from typing import TYPE_CHECKING, Dict, Iterator, Optional
 
-from models import Projection, Asset
-from excel_generator import ExcelGenerator
+# Only light modules load with the function; the export stack (numpy, ijson,
+# XlsxWriter, parser and generators) is imported where first used and
+# pre-warmed in the background from the first request on (see prewarm.py)
+from export_cache import create_export_cache_from_env
+from worker_pool import get_process_pool
+from export_jobs import create_export_jobs_from_env, JobQueueFull, JOB_DONE, JOB_FAILED
+from coalescing import create_request_coalescer_from_env, request_body_key
+from admission import create_admission_controller_from_env, estimate_request_cost, parse_cost
+from request_encoding import BodyDecodingError, body_encoding, decode_body, decoding_stream, is_binary_payload
+from prewarm import prewarm_on_first_request
+from tracing import start_trace, span, current_span
 
-# Initialize Firebase Admin SDK
-initialize_app()
+if TYPE_CHECKING:
+    from bulk_export import BulkAdmission, BulkItem
+
+
+@init
+def _initialize():
+    """Initialize Firebase Admin SDK on the first invocation rather than at module load."""
+    from firebase_admin import initialize_app
+    initialize_app()
+
+
+# Per-instance workbook cache (in-memory LRU, optional on-disk second tier)
+export_cache = create_export_cache_from_env()
+
+# Asynchronous export jobs (worker threads, pluggable result store); None unless EXPORT_JOB_STORE is set
+export_jobs = create_export_jobs_from_env()
+
+# Concurrent identical requests share one parse and build
+request_coalescer = create_request_coalescer_from_env()
+
+# Caps the estimated cost of the exports in flight on this instance
+admission = create_admission_controller_from_env()
+
+# Bodies up to this size are read up front (cost estimate, coalescing); larger
+# or chunked bodies are parsed straight from the request stream. Compressed
+# bodies are measured before decoding, binary payloads must fit.
+MAX_BUFFERED_BODY_BYTES = int(os.environ.get('EXPORT_BUFFER_MAX_BYTES', 16 * 1024 * 1024))
+
+# Chunk size used when streaming a workbook written to disk
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Error for ?async=1 and job polls when no job store is configured
+_ASYNC_DISABLED = 'Asynchronous exports are not enabled on this deployment (EXPORT_JOB_STORE)'
+
+# Cross-check client-sent federal/Quebec taxes against the server tax tables (logged only)
+TAX_CHECK_ENABLED = os.environ.get('EXPORT_TAX_CHECK', '').lower() in ('1', 'true')
+
+
+def _render_workbook(generator, constant_memory: bool):
+    """
+    Render a workbook for the response.
+
+    In the default mode the workbook is built in memory and returned as bytes.
+    In constant-memory mode it is written to a temporary file and streamed back
+    in chunks, so peak memory stays flat as year and scenario counts grow.
+
+    Returns:
+        (body, size): response body (bytes or chunk iterator) and its size in bytes
+    """
+    if not constant_memory:
+        excel_bytes = generator.generate()
+        return excel_bytes, len(excel_bytes)
+
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        generator.write(path, constant_memory=True)
+        size = os.path.getsize(path)
+    except Exception:
+        os.remove(path)
+        raise
+    return _stream_file(path), size
+
+
+def _stream_file(path: str):
+    """Yield a file in chunks and delete it once fully sent."""
+    try:
+        with open(path, 'rb') as f:
+            yield from _stream_chunks(f)
+    finally:
+        os.remove(path)
+
+
+def _stream_chunks(f):
+    """Yield an open binary file in chunks, closing it at the end."""
+    with f:
+        while True:
+            chunk = f.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _create_generator(export_request):
+    """Workbook generator for a parsed request (large comparisons are prepared on the worker pool)."""
+    from excel_generator import PARALLEL_PREPARE_MIN_CELLS, generator_for_request
+    return generator_for_request(export_request, executor=get_process_pool() if PARALLEL_PREPARE_MIN_CELLS else None)
+
+
+def _validation_error(export_request) -> Optional[str]:
+    """Why a parsed request cannot be exported (None when it can)."""
+    if export_request.is_multi_scenario:
+        if len(export_request.scenarios) < 2:
+            return 'Multi-scenario export requires at least 2 scenarios'
+        if len(export_request.scenarios) > 5:
+            return 'Maximum 5 scenarios allowed for comparison'
+    elif not export_request.scenarios:
+        return 'Missing required field: projection'
+    return None
+
+
+def _export_filename(export_request) -> str:
+    """Download filename of a parsed request's workbook."""
+    today = datetime.now().strftime('%Y-%m-%d')
+    if export_request.is_multi_scenario:
+        return f'projection_comparison_{len(export_request.scenarios)}_scenarios_{today}.xlsx'
+    scenario_name = export_request.scenarios[0]['scenario_name']
+    return f'projection_{scenario_name.replace(" ", "-")}_{today}.xlsx'
+
+
+def _print_log(lines):
+    """Write a multi-line log entry in one call, so concurrent requests do not interleave."""
+    sys.stdout.write('\n'.join(lines) + '\n')
+
+
+def _query_flag(req: https_fn.Request, name: str) -> bool:
+    """Whether a boolean query parameter (e.g. ?streaming=1) is set."""
+    return req.args.get(name, '').lower() in ('1', 'true')
+
+
+def _json_response(payload: Dict, status: int, headers: Dict) -> https_fn.Response:
+    """JSON response with the CORS headers."""
+    return https_fn.Response(
+        json.dumps(payload),
+        status=status,
+        headers={**headers, 'Content-Type': 'application/json'}
+    )
 
 
 @https_fn.on_request()
+@prewarm_on_first_request
 def generate_projection_excel(req: https_fn.Request) -> https_fn.Response:
     """
     HTTP Cloud Function to generate Excel file from projection data.
@@ -38,14 +180,46 @@ def generate_projection_excel(req: https_fn.Request) -> https_fn.Response:
         ]
     }
 
-    Returns: Excel file as binary response
+    OR (Project - projected server-side):
+    {
+        "project": {...},          # project export file (project, assets, events, expenses, scenarios)
+        "scenarioId": "string",    # optional, defaults to the base scenario
+        "scenarioIds": [...],      # optional, 2+ ids for a comparison export
+        "startYear": 2025,         # optional
+        "projectionYears": 40,     # optional, 1-120
+        "inflationRate": 0.02,     # optional
+        "monteCarlo": {            # optional, adds a Monte Carlo sheet and fan chart
+            "paths": 1000,
+            "seed": 0,
+            "volatility": {"rrsp": 0.10, ...},
+            "fanChart": true
+        }
+    }
+
+    Query parameters:
+        streaming=1  Build the workbook in constant-memory mode and stream it back
+        async=1      Queue the build and answer 202 with a job id (poll export_job_status);
+                     501 when async exports are not enabled (EXPORT_JOB_STORE)
+
+    Headers:
+        Prefer: respond-async  Very large requests may be queued as async jobs (202)
+        Content-Encoding       gzip (or zstd when zstandard is installed) for compressed bodies
+        Content-Type           application/vnd.retire1.projection+msgpack for the compact
+                               columnar format (see binary_format.py) instead of JSON
+
+    Requests are admitted by estimated cost; when the instance is saturated
+    the answer is 429 with Retry-After. Async requests are admitted for their
+    parse (projection and Monte Carlo included) and also get a 429 when the
+    job queue is full.
+
+    Returns: Excel file as binary response (or the job status JSON with async=1)
     """
 
     # CORS headers for Flutter web client
     headers = {
         'Access-Control-Allow-Origin': '*',
         'Access-Control-Allow-Methods': 'POST, OPTIONS',
-        'Access-Control-Allow-Headers': 'Content-Type',
+        'Access-Control-Allow-Headers': 'Content-Type, Content-Encoding',
     }
 
     # Handle preflight CORS request
@@ -60,122 +234,261 @@ def generate_projection_excel(req: https_fn.Request) -> https_fn.Response:
             headers={**headers, 'Content-Type': 'application/json'}
         )
 
+    # Root span of the structured timing logs (no-op unless EXPORT_TRACING is set)
+    trace_id = req.headers.get('X-Cloud-Trace-Context', '').split('/')[0] or None
+    with start_trace('export', trace_id=trace_id) as trace_span:
+        response = _routed_export_response(req, headers)
+        trace_span.set(status=response.status_code)
+        return response
+
+
+def _routed_export_response(req: https_fn.Request, headers: Dict) -> https_fn.Response:
+    """
+    Estimate the request's cost, pick its build mode, wait for admission and
+    serve concurrent duplicates from a single parse and build.
+
+    Requests over EXPORT_STREAMING_UNITS are built in constant-memory mode;
+    over EXPORT_ASYNC_UNITS, clients sending 'Prefer: respond-async' get an
+    async job instead. Buffered bodies are hashed: the first request with a
+    given hash runs _export_response and duplicates arriving while it runs
+    get a copy of its response (streamed and async responses are not shared).
+
+    Compressed bodies are decoded first, so the cost estimate and the
+    coalescing key see the same bytes whatever the encoding. Binary payloads
+    are unpacked up front and estimated from their columns.
+    """
+    constant_memory = _query_flag(req, 'streaming')
+    run_async = _query_flag(req, 'async')
+    if run_async and export_jobs is None:
+        return _json_response({'error': _ASYNC_DISABLED}, 501, headers)
+
+    body = None
+    payload = None
+    stream = req.stream
     try:
-        # Parse request body
-        request_json = req.get_json(silent=True)
+        encoding = body_encoding(req.headers.get('Content-Encoding'))
+        binary = is_binary_payload(req.content_type)
+        if req.content_length is not None and 0 < req.content_length <= MAX_BUFFERED_BODY_BYTES:
+            body = decode_body(req.get_data(cache=False), encoding)
+            if binary:
+                from binary_format import unpack_payload
+                payload = unpack_payload(body)
+        elif binary:
+            return _json_response({'error': f'Binary request bodies need a Content-Length of at most '
+                                            f'{MAX_BUFFERED_BODY_BYTES:,} bytes'}, 413, headers)
+        else:
+            stream = decoding_stream(req.stream, encoding)
+    except BodyDecodingError as e:
+        return _json_response({'error': str(e)}, e.status, headers)
+
+    if payload is not None:
+        from binary_format import estimate_payload_cost
+        cost = estimate_payload_cost(payload, len(body))
+    else:
+        cost = estimate_request_cost(body, req.content_length, encoded=bool(encoding))
+    current_span().set(cost_units=round(cost.units, 1), content_encoding=encoding or None, binary=binary)
+
+    response_headers = headers
+    if admission is not None and not run_async:
+        if (export_jobs is not None and cost.units >= admission.async_units
+                and 'respond-async' in req.headers.get('Prefer', '')):
+            run_async = True
+            response_headers = {**headers, 'Preference-Applied': 'respond-async'}
+        elif cost.units >= admission.streaming_units:
+            constant_memory = True
+
+    def respond(stream) -> https_fn.Response:
+        if run_async:
+            try:
+                export_jobs.ensure_room()
+            except JobQueueFull as e:
+                return _json_response({'error': str(e)}, 429, {**headers, 'Retry-After': str(e.retry_after)})
+        if admission is None:
+            return _export_response(req, response_headers, stream, constant_memory, run_async, payload)
+        # Async requests hold admission only while they are parsed; their builds are bounded by the job queue
+        units = admission.acquire(parse_cost(cost) if run_async else cost)
+        if units is None:
+            retry_after = admission.retry_after()
+            print(f'Export rejected: estimated cost {cost.units:.0f} units, retry after {retry_after}s '
+                  f'(admission: {admission.stats()})')
+            return _json_response({'error': 'Too many exports in progress, retry later'}, 429,
+                                  {**headers, 'Retry-After': str(retry_after)})
+        try:
+            return _export_response(req, response_headers, stream, constant_memory, run_async, payload)
+        finally:
+            admission.release(units)
+
+    if body is None:
+        return respond(stream)
+    if request_coalescer is None or constant_memory or run_async:
+        return respond(io.BytesIO(body))
+
+    response, coalesced = request_coalescer.run(request_body_key(body), lambda: respond(io.BytesIO(body)))
+    current_span().set(coalesced=coalesced)
+    if not coalesced:
+        return response
 
-        if not request_json:
+    print(f'Excel generation coalesced with an identical in-flight request '
+          f'(coalescing: {request_coalescer.stats()})')
+    return https_fn.Response(response.get_data(), status=response.status_code, headers=dict(response.headers))
+
+
+def _export_response(req: https_fn.Request, headers: Dict, stream, constant_memory: bool,
+                     run_async: bool, payload: Optional[Dict] = None) -> https_fn.Response:
+    """
+    Parse the export request, build (or fetch) the workbook and wrap it in a response.
+
+    Args:
+        req: The HTTP request (headers and size; the body is read from stream)
+        headers: CORS headers added to every response
+        stream: Request body (decoded JSON)
+        constant_memory: Build row by row on disk and stream the workbook back
+        run_async: Queue the build as an async job and answer 202
+        payload: Unpacked binary payload, parsed instead of stream
+    """
+    try:
+        # Start performance monitoring
+        start_time = time.time()
+
+        import ijson
+        from request_parser import parse_export_request
+
+        # Parse request body incrementally, straight into the columnar model
+        parse_start = time.time()
+        with span('parse', bytes=req.content_length) as parse_span:
+            try:
+                if payload is not None:
+                    from binary_format import parse_binary_request
+                    export_request = parse_binary_request(payload)
+                else:
+                    export_request = parse_export_request(stream)
+            except ijson.JSONError:
+                export_request = None
+            if export_request is not None:
+                parse_span.set(scenarios=len(export_request.scenarios),
+                               years=sum(scenario['projection'].num_years
+                                         for scenario in export_request.scenarios))
+        parse_time = time.time() - parse_start
+
+        if export_request is None:
             return https_fn.Response(
                 json.dumps({'error': 'Invalid JSON in request body'}),
                 status=400,
                 headers={**headers, 'Content-Type': 'application/json'}
             )
 
-        # Start performance monitoring
-        start_time = time.time()
-
-        # Check if multi-scenario request
-        if 'scenarios' in request_json:
-            # Multi-scenario comparison
-            scenarios_data = request_json['scenarios']
-
-            if not scenarios_data or len(scenarios_data) < 2:
-                return https_fn.Response(
-                    json.dumps({'error': 'Multi-scenario export requires at least 2 scenarios'}),
-                    status=400,
-                    headers={**headers, 'Content-Type': 'application/json'}
-                )
-
-            if len(scenarios_data) > 5:
-                return https_fn.Response(
-                    json.dumps({'error': 'Maximum 5 scenarios allowed for comparison'}),
-                    status=400,
-                    headers={**headers, 'Content-Type': 'application/json'}
-                )
-
-            # Parse all scenarios
-            parse_start = time.time()
-            scenarios = []
-            for scenario_data in scenarios_data:
-                projection = Projection.from_dict(scenario_data['projection'])
-                scenario_name = scenario_data.get('scenarioName', 'Scenario')
-                assets = [Asset.from_dict(a) for a in scenario_data.get('assets', [])]
-                scenarios.append({
-                    'projection': projection,
-                    'scenario_name': scenario_name,
-                    'assets': assets
-                })
-            parse_time = time.time() - parse_start
-
-            # Generate multi-scenario Excel
-            gen_start = time.time()
-            from excel_generator import MultiScenarioExcelGenerator
-            generator = MultiScenarioExcelGenerator(scenarios)
-            excel_bytes = generator.generate()
-            gen_time = time.time() - gen_start
-
-            # Log performance
-            total_time = time.time() - start_time
-            print(f'Multi-scenario Excel generation:')
-            print(f'  - Scenarios count: {len(scenarios)}')
-            print(f'  - Parse time: {parse_time*1000:.1f}ms')
-            print(f'  - Generation time: {gen_time*1000:.1f}ms')
-            print(f'  - Total time: {total_time*1000:.1f}ms')
-            print(f'  - File size: {len(excel_bytes):,} bytes')
-
-            # Generate filename
-            today = datetime.now().strftime('%Y-%m-%d')
-            filename = f'projection_comparison_{len(scenarios)}_scenarios_{today}.xlsx'
+        error = _validation_error(export_request)
+        if error is not None:
+            return _json_response({'error': error}, 400, headers)
+        filename = _export_filename(export_request)
 
+        if export_request.is_multi_scenario:
+            log_lines = [
+                'Multi-scenario Excel generation:',
+                f'  - Scenarios count: {len(export_request.scenarios)}',
+            ]
         else:
-            # Single scenario (backward compatible)
-            if 'projection' not in request_json:
-                return https_fn.Response(
-                    json.dumps({'error': 'Missing required field: projection'}),
-                    status=400,
-                    headers={**headers, 'Content-Type': 'application/json'}
-                )
-
-            # Parse data models
-            parse_start = time.time()
-            projection = Projection.from_dict(request_json['projection'])
-            scenario_name = request_json.get('scenarioName', 'Projection')
-            assets = [Asset.from_dict(asset_data) for asset_data in request_json.get('assets', [])]
-            parse_time = time.time() - parse_start
+            projection = export_request.scenarios[0]['projection']
+            log_lines = [
+                'Excel generation performance:',
+                f'  - Projection years: {projection.num_years}',
+                f'  - Assets count: {len(export_request.scenarios[0]["assets"])}',
+            ]
+
+        # Recompute taxes from each scenario's income and ages and log any drift
+        if TAX_CHECK_ENABLED:
+            from tax import check_projection_taxes
+            with span('tax_check') as check_span:
+                tax_checks = [check_projection_taxes(scenario['projection'], birth_years=scenario.get('birth_years'))
+                              for scenario in export_request.scenarios]
+                check_span.set(mismatched_years=sum(len(check.mismatched_years) for check in tax_checks))
+            for scenario, check in zip(export_request.scenarios, tax_checks):
+                status = 'ok' if check.ok else f'{len(check.mismatched_years)} of {check.years_checked} years differ'
+                if check.unchecked_years:
+                    status += f', {len(check.unchecked_years)} years unchecked (individual with no known age)'
+                log_lines.append(f'  - Tax check ({scenario["scenario_name"]}): {status} '
+                                 f'(max difference: ${check.max_difference:,.2f})')
+
+        # Async mode: build on the job pool and let the client poll for the result
+        if run_async:
+            generator = _create_generator(export_request)
+            with span('job.submit') as submit_span:
+                try:
+                    job = export_jobs.submit(
+                        lambda path: generator.write(path, constant_memory=constant_memory), filename)
+                except JobQueueFull as e:
+                    _print_log(log_lines + [f'  - Job queue full (jobs: {export_jobs.stats()})'])
+                    return _json_response({'error': str(e)}, 429, {**headers, 'Retry-After': str(e.retry_after)})
+                submit_span.set(job_id=job.id)
+            log_lines.append(f'  - Parse time: {parse_time*1000:.1f}ms')
+            log_lines.append(f'  - Queued as job {job.id} (jobs: {export_jobs.stats()})')
+            _print_log(log_lines)
+            return _json_response(job.to_dict(), 202, headers)
 
+        # Serve repeated exports of the same payload from the cache
+        gen_start = time.time()
+        cache_key = None
+        body = None
+        if export_cache is not None:
+            from export_cache import export_cache_key
+            with span('cache.lookup'):
+                cache_key = export_cache_key(export_request.scenarios, export_request.is_multi_scenario)
+                body = export_cache.get(cache_key)
+
+        cache_hit = body is not None
+        if cache_hit:
+            file_size = len(body)
+        else:
             # Generate Excel file
-            gen_start = time.time()
-            generator = ExcelGenerator(projection, scenario_name, assets)
-            excel_bytes = generator.generate()
-            gen_time = time.time() - gen_start
-
-            # Total time
-            total_time = time.time() - start_time
-
-            # Log performance metrics
-            print(f'Excel generation performance:')
-            print(f'  - Projection years: {len(projection.years)}')
-            print(f'  - Assets count: {len(assets)}')
-            print(f'  - Parse time: {parse_time*1000:.1f}ms')
-            print(f'  - Generation time: {gen_time*1000:.1f}ms')
-            print(f'  - Total time: {total_time*1000:.1f}ms')
-            print(f'  - File size: {len(excel_bytes):,} bytes')
-
-            # Generate filename
-            today = datetime.now().strftime('%Y-%m-%d')
-            filename = f'projection_{scenario_name.replace(" ", "-")}_{today}.xlsx'
+            generator = _create_generator(export_request)
+            with span('generate', constant_memory=constant_memory):
+                body, file_size = _render_workbook(generator, constant_memory)
+
+            # Streamed workbooks are never held in memory, so only bytes are cached
+            if cache_key is not None and isinstance(body, bytes):
+                export_cache.put(cache_key, body)
+        gen_time = time.time() - gen_start
+        current_span().set(multi_scenario=export_request.is_multi_scenario,
+                           scenarios=len(export_request.scenarios), cache_hit=cache_hit, bytes=file_size)
+
+        # Log performance metrics
+        total_time = time.time() - start_time
+        log_lines.append(f'  - Parse time: {parse_time*1000:.1f}ms')
+        log_lines.append(f'  - Generation time: {gen_time*1000:.1f}ms')
+        log_lines.append(f'  - Total time: {total_time*1000:.1f}ms')
+        log_lines.append(f'  - Constant memory: {constant_memory}')
+        if export_cache is not None:
+            stats = export_cache.stats()
+            log_lines.append(f'  - Cache: {"hit" if cache_hit else "miss"} '
+                             f'(memory hits: {stats["memory_hits"]}, store hits: {stats["store_hits"]}, '
+                             f'misses: {stats["misses"]}, entries: {stats["entries"]})')
+        if admission is not None:
+            stats = admission.stats()
+            log_lines.append(f'  - Admission: {stats["in_flight_units"]:.0f} of {admission.capacity_units:.0f} units '
+                             f'in flight (admitted: {stats["admitted"]}, queued: {stats["queued"]}, '
+                             f'rejected: {stats["rejected"]})')
+        if request_coalescer is not None:
+            stats = request_coalescer.stats()
+            log_lines.append(f'  - Coalescing: {stats["coalesced"]} duplicate requests served from '
+                             f'{stats["leaders"]} builds ({stats["in_flight"]} in flight)')
+        log_lines.append(f'  - File size: {file_size:,} bytes')
+        _print_log(log_lines)
 
         # Return Excel file
         return https_fn.Response(
-            excel_bytes,
+            body,
             status=200,
             headers={
                 **headers,
                 'Content-Type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
                 'Content-Disposition': f'attachment; filename="{filename}"',
+                'Content-Length': str(file_size),
             }
         )
 
+    except BodyDecodingError as e:
+        # Corrupt or oversized compressed stream, malformed binary columns, invalid option values
+        return _json_response({'error': str(e)}, e.status, headers)
     except KeyError as e:
         return https_fn.Response(
             json.dumps({'error': f'Missing required field: {str(e)}'}),
@@ -185,7 +498,6 @@ def generate_projection_excel(req: https_fn.Request) -> https_fn.Response:
     except Exception as e:
         # Log the full error for debugging
         print(f'Error generating Excel: {str(e)}')
-        import traceback
         traceback.print_exc()
 
         return https_fn.Response(
@@ -193,3 +505,164 @@ def generate_projection_excel(req: https_fn.Request) -> https_fn.Response:
             status=500,
             headers={**headers, 'Content-Type': 'application/json'}
         )
+
+
+@https_fn.on_request()
+@prewarm_on_first_request
+def export_job_status(req: https_fn.Request) -> https_fn.Response:
+    """
+    HTTP Cloud Function to poll an asynchronous export job.
+
+    Query parameters:
+        jobId=<id>   Job returned by generate_projection_excel?async=1
+        download=1   Return the workbook once the job is done
+
+    Returns:
+        200 with the job status JSON (or the workbook with download=1),
+        202 with the status while a download is not ready yet,
+        404 for unknown or expired jobs, 500 when the job failed (download=1)
+    """
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type',
+    }
+
+    if req.method == 'OPTIONS':
+        return https_fn.Response('', status=204, headers=headers)
+
+    if req.method != 'GET':
+        return _json_response({'error': 'Method not allowed. Use GET.'}, 405, headers)
+
+    if export_jobs is None:
+        return _json_response({'error': _ASYNC_DISABLED}, 404, headers)
+
+    job = export_jobs.get(req.args.get('jobId', ''))
+    if job is None:
+        return _json_response({'error': 'Unknown or expired job'}, 404, headers)
+
+    if req.args.get('download', '').lower() not in ('1', 'true'):
+        return _json_response(job.to_dict(), 200, headers)
+
+    if job.status == JOB_FAILED:
+        return _json_response(job.to_dict(), 500, headers)
+    if job.status != JOB_DONE:
+        return _json_response(job.to_dict(), 202, {**headers, 'Retry-After': '1'})
+
+    result = export_jobs.open_result(job.id)
+    if result is None:
+        return _json_response({'error': 'Unknown or expired job'}, 404, headers)
+    return https_fn.Response(
+        _stream_chunks(result),
+        status=200,
+        headers={
+            **headers,
+            'Content-Type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            'Content-Disposition': f'attachment; filename="{job.filename}"',
+            'Content-Length': str(job.size),
+        }
+    )
+
+
+def _bulk_items(stream, bulk_admission: Optional['BulkAdmission'] = None) -> Iterator['BulkItem']:
+    """
+    Parse, validate, admit and name the payloads of a bulk request as they are pulled.
+
+    Raises BulkRejected when the first payload finds no room.
+    """
+    from request_parser import iter_bulk_requests, export_request_cost
+    from bulk_export import BulkItem, MAX_BULK_EXPORTS
+    admit = bulk_admission.admit if bulk_admission is not None else None
+    try:
+        for index, (export_request, error) in enumerate(iter_bulk_requests(stream, admit)):
+            if index >= MAX_BULK_EXPORTS:
+                error = f'Maximum {MAX_BULK_EXPORTS} exports per bulk request'
+            elif error is None:
+                error = _validation_error(export_request)
+            if error is not None:
+                if bulk_admission is not None:
+                    bulk_admission.release(bulk_admission.take())
+                yield BulkItem(index, error=error)
+            else:
+                units = 0.0
+                if bulk_admission is not None:
+                    bulk_admission.admit(export_request_cost(export_request))  # Unless admitted before projection
+                    units = bulk_admission.take()
+                yield BulkItem(index, filename=_export_filename(export_request), export_request=export_request,
+                               units=units)
+            if bulk_admission is not None:
+                bulk_admission.streaming = True
+    finally:
+        # A payload admitted before its projection failed
+        if bulk_admission is not None:
+            bulk_admission.release(bulk_admission.take())
+
+
+@https_fn.on_request()
+@prewarm_on_first_request
+def generate_projection_excel_bulk(req: https_fn.Request) -> https_fn.Response:
+    """
+    HTTP Cloud Function to generate many Excel files in one request.
+
+    Expected request body (JSON):
+    {
+        "exports": [
+            {...},  # any generate_projection_excel body (single, comparison or project)
+            ...
+        ]
+    }
+
+    Workbooks are built on the worker pool and streamed back as entries of a
+    ZIP archive in the order they finish ("001_projection_....xlsx", numbered
+    by position in the request), followed by manifest.json with the outcome of
+    every payload. Payloads that fail validation or generation are listed in
+    the manifest with their error instead of failing the whole request. The
+    body may be compressed (Content-Encoding: gzip, or zstd). Each payload is
+    admitted on its own estimated cost; when the first one finds no room the
+    request gets 429 with Retry-After.
+
+    Returns: ZIP archive as a streamed binary response
+    """
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'POST, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type, Content-Encoding',
+    }
+
+    if req.method == 'OPTIONS':
+        return https_fn.Response('', status=204, headers=headers)
+
+    if req.method != 'POST':
+        return _json_response({'error': 'Method not allowed. Use POST.'}, 405, headers)
+
+    import ijson
+    from bulk_export import BulkAdmission, BulkRejected, bulk_in_flight_from_env, stream_bulk_zip
+
+    # Parse up to the first payload so malformed or empty bodies still get a 400,
+    # and a bulk request that finds no room a 429
+    bulk_admission = BulkAdmission(admission) if admission is not None else None
+    try:
+        items = _bulk_items(decoding_stream(req.stream, req.headers.get('Content-Encoding')), bulk_admission)
+        first = next(items, None)
+    except BulkRejected as e:
+        print(f'Bulk export rejected, retry after {e.retry_after}s (admission: {admission.stats()})')
+        return _json_response({'error': str(e)}, 429, {**headers, 'Retry-After': str(e.retry_after)})
+    except BodyDecodingError as e:
+        return _json_response({'error': str(e)}, e.status, headers)
+    except ijson.JSONError:
+        return _json_response({'error': 'Invalid JSON in request body'}, 400, headers)
+    if first is None:
+        return _json_response({'error': 'Missing required field: exports'}, 400, headers)
+
+    today = datetime.now().strftime('%Y-%m-%d')
+    return https_fn.Response(
+        stream_bulk_zip(itertools.chain([first], items), executor=get_process_pool(),
+                        max_in_flight=bulk_in_flight_from_env(),
+                        release=bulk_admission.release if bulk_admission is not None else None),
+        status=200,
+        headers={
+            **headers,
+            'Content-Type': 'application/zip',
+            'Content-Disposition': f'attachment; filename="projection_exports_{today}.zip"',
+        }
+    )
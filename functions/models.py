@@ -1,14 +1,82 @@
 """
 Data models for projection data.
 These mirror the Dart/Flutter models to deserialize JSON from the client.
+Each model's from_dict is generated at import from its field specs: one
+straight-line function per model and mode that reads every key directly,
+with no per-field loop, and passes the values to the constructor by position.
 """
 
-from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+from dataclasses import dataclass, field, fields
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from datetime import datetime
 
 
-@dataclass
+def parse_calculated_at(value) -> datetime:
+    """Parse the ISO-8601 calculatedAt timestamp sent by the client."""
+    if isinstance(value, str):
+        try:
+            # Python 3.11+ reads a trailing 'Z' itself
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return datetime.now()
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """How one model attribute is read from its JSON object."""
+    key: str                       # JSON key
+    required: bool = False         # Missing key raises KeyError (otherwise default is used)
+    default: Any = None            # Literal default; {} and [] are created fresh per object
+    convert: Optional[str] = None  # Expression applied to the value, with %s standing for it
+
+
+def generate_function(name: str, source: str, namespace: Dict) -> Callable:
+    """Compile generated source and return the function it defines."""
+    exec(compile(source, f'<generated {name}>', 'exec'), namespace)
+    return namespace[name]
+
+
+def compile_readers(cls, specs: Dict[str, FieldSpec],
+                    dependencies: Optional[Dict[str, Tuple[Callable, Callable]]] = None) -> Tuple[Callable, Callable]:
+    """
+    Generate the dict -> cls deserializers of a model from its field specs.
+
+    The tolerant reader fills in defaults for missing optional keys. The
+    complete reader indexes every key directly and raises KeyError for any
+    missing one, for payloads known to carry every field.
+
+    Args:
+        cls: Dataclass to build (specs must list its fields in order)
+        specs: Attribute name -> FieldSpec
+        dependencies: Names used in convert expressions -> (tolerant, complete)
+                      readers, so each mode calls the same mode of nested models
+
+    Returns:
+        (tolerant reader, complete reader)
+    """
+    if list(specs) != [model_field.name for model_field in fields(cls)]:
+        raise ValueError(f'{cls.__name__} field specs do not match its fields')
+
+    readers = []
+    for complete in (False, True):
+        name = f'read_{cls.__name__}{"_complete" if complete else ""}'
+        arguments = []
+        for spec in specs.values():
+            if complete or spec.required:
+                value = f'data[{spec.key!r}]'
+            elif spec.default is None:
+                value = f'data.get({spec.key!r})'
+            else:
+                value = f'data.get({spec.key!r}, {spec.default!r})'
+            arguments.append(spec.convert % value if spec.convert else value)
+        source = f'def {name}(data):\n    return cls(\n' + ''.join(f'        {argument},\n' for argument in arguments) + '    )\n'
+        namespace = {'cls': cls, **{dependency: pair[complete] for dependency, pair in (dependencies or {}).items()}}
+        readers.append(generate_function(name, source, namespace))
+    return readers[0], readers[1]
+
+
+@dataclass(slots=True)
 class AnnualIncome:
     """Annual income breakdown for an individual."""
     employment: float = 0.0
@@ -24,19 +92,19 @@ class AnnualIncome:
         return self.employment + self.rrq + self.psv + self.rrif + self.rrpe + self.other
 
     @classmethod
-    def from_dict(cls, data: Dict) -> 'AnnualIncome':
-        """Create AnnualIncome from dictionary."""
-        return cls(
-            employment=data.get('employment', 0.0),
-            rrq=data.get('rrq', 0.0),
-            psv=data.get('psv', 0.0),
-            rrif=data.get('rrif', 0.0),
-            rrpe=data.get('rrpe', 0.0),
-            other=data.get('other', 0.0),
-        )
-
-
-@dataclass
+    def from_dict(cls, data: Dict, complete: bool = False) -> 'AnnualIncome':
+        """Create AnnualIncome from dictionary (complete=True: every source must be present)."""
+        return (_read_income_complete if complete else _read_income)(data)
+
+
+ANNUAL_INCOME_FIELDS = {
+    name: FieldSpec(name, default=0.0) for name in ('employment', 'rrq', 'psv', 'rrif', 'rrpe', 'other')
+}
+
+_read_income, _read_income_complete = compile_readers(AnnualIncome, ANNUAL_INCOME_FIELDS)
+
+
+@dataclass(slots=True)
 class YearlyProjection:
     """Projection data for a single year."""
     year: int
@@ -68,45 +136,55 @@ class YearlyProjection:
     shortfall_amount: float = 0.0
 
     @classmethod
-    def from_dict(cls, data: Dict) -> 'YearlyProjection':
-        """Create YearlyProjection from dictionary."""
-        # Parse income by individual
-        income_by_individual = {}
-        for individual_id, income_data in data.get('incomeByIndividual', {}).items():
-            income_by_individual[individual_id] = AnnualIncome.from_dict(income_data)
-
-        return cls(
-            year=data['year'],
-            years_from_start=data['yearsFromStart'],
-            primary_age=data.get('primaryAge'),
-            spouse_age=data.get('spouseAge'),
-            income_by_individual=income_by_individual,
-            total_income=data['totalIncome'],
-            taxable_income=data.get('taxableIncome', 0.0),
-            federal_tax=data.get('federalTax', 0.0),
-            quebec_tax=data.get('quebecTax', 0.0),
-            total_tax=data.get('totalTax', 0.0),
-            after_tax_income=data.get('afterTaxIncome', 0.0),
-            total_expenses=data['totalExpenses'],
-            expenses_by_category=data.get('expensesByCategory', {}),
-            withdrawals_by_account=data.get('withdrawalsByAccount', {}),
-            contributions_by_account=data.get('contributionsByAccount', {}),
-            total_withdrawals=data.get('totalWithdrawals', 0.0),
-            total_contributions=data.get('totalContributions', 0.0),
-            celi_contribution_room=data.get('celiContributionRoom', 0.0),
-            net_cash_flow=data['netCashFlow'],
-            assets_start_of_year=data['assetsStartOfYear'],
-            assets_end_of_year=data['assetsEndOfYear'],
-            asset_returns=data.get('assetReturns', {}),
-            net_worth_start_of_year=data['netWorthStartOfYear'],
-            net_worth_end_of_year=data['netWorthEndOfYear'],
-            events_occurred=data.get('eventsOccurred', []),
-            has_shortfall=data.get('hasShortfall', False),
-            shortfall_amount=data.get('shortfallAmount', 0.0),
-        )
-
-
-@dataclass
+    def from_dict(cls, data: Dict, complete: bool = False) -> 'YearlyProjection':
+        """
+        Create YearlyProjection from dictionary.
+
+        With complete=True every key must be present (KeyError otherwise) and
+        no defaults are looked up, which is faster for known-complete payloads.
+        """
+        return (_read_year_complete if complete else _read_year)(data)
+
+
+YEARLY_PROJECTION_FIELDS = {
+    'year': FieldSpec('year', required=True),
+    'years_from_start': FieldSpec('yearsFromStart', required=True),
+    'primary_age': FieldSpec('primaryAge'),
+    'spouse_age': FieldSpec('spouseAge'),
+    'income_by_individual': FieldSpec(
+        'incomeByIndividual', default={},
+        convert='{individual_id: read_income(income) for individual_id, income in %s.items()}'),
+    'total_income': FieldSpec('totalIncome', required=True),
+    'taxable_income': FieldSpec('taxableIncome', default=0.0),
+    'federal_tax': FieldSpec('federalTax', default=0.0),
+    'quebec_tax': FieldSpec('quebecTax', default=0.0),
+    'total_tax': FieldSpec('totalTax', default=0.0),
+    'after_tax_income': FieldSpec('afterTaxIncome', default=0.0),
+    'total_expenses': FieldSpec('totalExpenses', required=True),
+    'expenses_by_category': FieldSpec('expensesByCategory', default={}),
+    'withdrawals_by_account': FieldSpec('withdrawalsByAccount', default={}),
+    'contributions_by_account': FieldSpec('contributionsByAccount', default={}),
+    'total_withdrawals': FieldSpec('totalWithdrawals', default=0.0),
+    'total_contributions': FieldSpec('totalContributions', default=0.0),
+    'celi_contribution_room': FieldSpec('celiContributionRoom', default=0.0),
+    'net_cash_flow': FieldSpec('netCashFlow', required=True),
+    'assets_start_of_year': FieldSpec('assetsStartOfYear', required=True),
+    'assets_end_of_year': FieldSpec('assetsEndOfYear', required=True),
+    'asset_returns': FieldSpec('assetReturns', default={}),
+    'net_worth_start_of_year': FieldSpec('netWorthStartOfYear', required=True),
+    'net_worth_end_of_year': FieldSpec('netWorthEndOfYear', required=True),
+    'events_occurred': FieldSpec('eventsOccurred', default=[]),
+    'has_shortfall': FieldSpec('hasShortfall', default=False),
+    'shortfall_amount': FieldSpec('shortfallAmount', default=0.0),
+}
+
+_read_year, _read_year_complete = compile_readers(
+    YearlyProjection, YEARLY_PROJECTION_FIELDS,
+    dependencies={'read_income': (_read_income, _read_income_complete)},
+)
+
+
+@dataclass(slots=True)
 class Projection:
     """Complete projection for a scenario over the planning period."""
     scenario_id: str
@@ -119,31 +197,42 @@ class Projection:
     calculated_at: datetime
 
     @classmethod
-    def from_dict(cls, data: Dict) -> 'Projection':
-        """Create Projection from dictionary."""
-        # Parse yearly projections
-        years = [YearlyProjection.from_dict(year_data) for year_data in data['years']]
-
-        # Parse datetime
-        calculated_at_str = data['calculatedAt']
-        if isinstance(calculated_at_str, str):
-            calculated_at = datetime.fromisoformat(calculated_at_str.replace('Z', '+00:00'))
-        else:
-            calculated_at = datetime.now()
-
-        return cls(
-            scenario_id=data['scenarioId'],
-            project_id=data['projectId'],
-            start_year=data['startYear'],
-            end_year=data['endYear'],
-            use_constant_dollars=data['useConstantDollars'],
-            inflation_rate=data['inflationRate'],
-            years=years,
-            calculated_at=calculated_at,
-        )
-
-
-@dataclass
+    def from_dict(cls, data: Dict, complete: bool = False) -> 'Projection':
+        """Create Projection from dictionary (complete=True: every year carries every field)."""
+        return (_read_projection_complete if complete else _read_projection)(data)
+
+
+PROJECTION_FIELDS = {
+    'scenario_id': FieldSpec('scenarioId', required=True),
+    'project_id': FieldSpec('projectId', required=True),
+    'start_year': FieldSpec('startYear', required=True),
+    'end_year': FieldSpec('endYear', required=True),
+    'use_constant_dollars': FieldSpec('useConstantDollars', required=True),
+    'inflation_rate': FieldSpec('inflationRate', required=True),
+    'years': FieldSpec('years', required=True, convert='[read_year(year) for year in %s]'),
+    'calculated_at': FieldSpec('calculatedAt', required=True, convert='parse_calculated_at(%s)'),
+}
+
+_read_projection, _read_projection_complete = compile_readers(
+    Projection, PROJECTION_FIELDS,
+    dependencies={
+        'read_year': (_read_year, _read_year_complete),
+        'parse_calculated_at': (parse_calculated_at, parse_calculated_at),
+    },
+)
+
+
+# Asset runtimeType (lowercased) -> internal type name
+ASSET_TYPES = {
+    'realestate': 'realEstate',
+    'rrsp': 'rrsp',
+    'celi': 'celi',
+    'cri': 'cri',
+    'cash': 'cash',
+}
+
+
+@dataclass(slots=True)
 class Asset:
     """Asset information for categorization."""
     id: str
@@ -154,17 +243,4 @@ class Asset:
         """Create Asset from dictionary."""
         # The asset type is stored in the 'runtimeType' field from Freezed unions
         asset_type = data.get('runtimeType', '').lower()
-
-        # Map runtimeType to our internal type names
-        type_mapping = {
-            'realestate': 'realEstate',
-            'rrsp': 'rrsp',
-            'celi': 'celi',
-            'cri': 'cri',
-            'cash': 'cash',
-        }
-
-        return cls(
-            id=data['id'],
-            type=type_mapping.get(asset_type, asset_type),
-        )
+        return cls(data['id'], ASSET_TYPES.get(asset_type, asset_type))
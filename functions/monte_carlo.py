@@ -0,0 +1,141 @@
+"""
+Stochastic (Monte Carlo) projections.
+Runs thousands of return paths per scenario through the projection engine's
+batched year loop. Paths are simulated in fixed-size chunks, each with its
+own seed derived from the request seed, so memory stays bounded and results
+do not depend on how chunks are spread across worker processes.
+"""
+
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from project_models import Project
+from projection_engine import ProjectionPlan, plan_projection, simulate, DEFAULT_INFLATION_RATE
+
+
+DEFAULT_PATHS = 1000
+MAX_PATHS = 20000
+CHUNK_PATHS = 1000
+
+# Net worth percentiles reported per year (fan chart bands)
+PERCENTILES = [5, 25, 50, 75, 95]
+
+# Annual standard deviation of returns by account type
+DEFAULT_VOLATILITY = {
+    'realEstate': 0.05,
+    'rrsp': 0.10,
+    'celi': 0.10,
+    'cri': 0.10,
+    'cash': 0.01,
+}
+
+# Returns are floored so a balance can at worst be wiped out
+MIN_RETURN_RATE = -1.0
+
+
+@dataclass
+class MonteCarloResult:
+    """Per-year outcome distribution over all simulated paths."""
+    scenario_id: str
+    paths: int
+    seed: int
+    percentiles: List[int]
+    year: np.ndarray                   # int64 [years]
+    primary_age: np.ndarray            # float64 [years], NaN when absent
+    net_worth_bands: np.ndarray        # float64 [percentiles, years], end-of-year net worth
+    shortfall_probability: np.ndarray  # float64 [years], share of paths with a shortfall that year
+    expected_shortfall: np.ndarray     # float64 [years], mean shortfall amount over all paths
+    any_shortfall_probability: float   # share of paths with a shortfall in any year
+
+    @property
+    def num_years(self) -> int:
+        """Number of projected years."""
+        return len(self.year)
+
+    def column(self, name: str) -> List:
+        """Per-year column as plain Python values for cell writing (ages as int or None)."""
+        if name == 'primary_age':
+            return [None if age != age else int(age) for age in self.primary_age.tolist()]
+        return getattr(self, name).tolist()
+
+
+def _path_returns(plan: ProjectionPlan, rng: np.random.Generator, paths: int,
+                  volatility: Dict[str, float]) -> np.ndarray:
+    """
+    Random annual returns [years, paths, accounts]: the expected rate plus one
+    normal shock per account type and year, shared by accounts of that type.
+    """
+    types = sorted(set(plan.account_types))
+    type_index = np.array([types.index(asset_type) for asset_type in plan.account_types], dtype=np.int64)
+    sigma = np.array([volatility.get(asset_type, 0.0) for asset_type in plan.account_types])
+    shocks = rng.standard_normal((plan.num_years, paths, len(types)))
+    return np.maximum(plan.return_rates + shocks[:, :, type_index] * sigma, MIN_RETURN_RATE)
+
+
+def _simulate_chunk(args: Tuple[ProjectionPlan, np.random.SeedSequence, int, Dict[str, float]]
+                    ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Simulate one chunk of paths (module-level so process pools can pickle it).
+
+    Returns:
+        (end-of-year net worth [years, paths], shortfall amount [years, paths])
+    """
+    plan, seed_sequence, paths, volatility = args
+    rng = np.random.default_rng(seed_sequence)
+    results = simulate(plan, _path_returns(plan, rng, paths, volatility), paths=paths)
+    return results['net_worth_end_of_year'], results['shortfall_amount']
+
+
+def run_monte_carlo(project: Project, scenario_id: Optional[str] = None, paths: int = DEFAULT_PATHS,
+                    seed: int = 0, volatility: Optional[Dict[str, float]] = None,
+                    start_year: Optional[int] = None, projection_years: Optional[int] = None,
+                    inflation_rate: float = DEFAULT_INFLATION_RATE, chunk_size: int = CHUNK_PATHS,
+                    executor: Optional[Executor] = None) -> MonteCarloResult:
+    """
+    Simulate a scenario over many random return paths.
+
+    Args:
+        project: Parsed project export
+        scenario_id: Scenario whose overrides apply (defaults to the base scenario)
+        paths: Number of return paths (capped at MAX_PATHS)
+        seed: Seed of the random returns; the same seed gives the same result
+        volatility: Per account type overrides of DEFAULT_VOLATILITY
+        start_year: First projected year
+        projection_years: Number of years
+        inflation_rate: Indexation rate for income, expenses and benefits
+        chunk_size: Paths simulated together in one batch
+        executor: Optional pool the chunks are spread across
+
+    Returns:
+        MonteCarloResult
+    """
+    paths = min(max(int(paths), 1), MAX_PATHS)
+    plan = plan_projection(project, scenario_id, start_year, projection_years, inflation_rate)
+    sigma = {**DEFAULT_VOLATILITY, **(volatility or {})}
+
+    sizes = [min(chunk_size, paths - offset) for offset in range(0, paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    chunks = [(plan, chunk_seed, size, sigma) for chunk_seed, size in zip(seeds, sizes)]
+    if executor is not None and len(chunks) > 1:
+        outcomes = list(executor.map(_simulate_chunk, chunks))
+    else:
+        outcomes = [_simulate_chunk(chunk) for chunk in chunks]
+
+    net_worth = np.concatenate([outcome[0] for outcome in outcomes], axis=1)
+    shortfall = np.concatenate([outcome[1] for outcome in outcomes], axis=1)
+    has_shortfall = shortfall > 0
+
+    return MonteCarloResult(
+        scenario_id=plan.scenario_id,
+        paths=paths,
+        seed=seed,
+        percentiles=list(PERCENTILES),
+        year=plan.years,
+        primary_age=plan.ages[:, 0].astype(np.float64) if plan.individual_ids else np.full(plan.num_years, np.nan),
+        net_worth_bands=np.percentile(net_worth, PERCENTILES, axis=1),
+        shortfall_probability=has_shortfall.mean(axis=1),
+        expected_shortfall=shortfall.mean(axis=1),
+        any_shortfall_probability=float(has_shortfall.any(axis=0).mean()),
+    )
@@ -0,0 +1,83 @@
+"""
+Cold-start support.
+The function module loads only what every request needs; the export stack
+(numpy, ijson, XlsxWriter and the parsing/generator modules) is imported on
+first real use, so preflight and rejected requests on a cold instance answer
+without it. When an instance gets its first request, the stack starts
+importing on a background thread ahead of the next export. That thread only
+gets CPU while a request is in flight on Cloud Functions (the CPU is
+throttled between requests); the self-hosted server keeps it allocated.
+"""
+
+import functools
+import importlib
+import os
+import threading
+import time
+import traceback
+from typing import Callable, List, Sequence
+
+
+# Modules imported lazily by main, heaviest dependencies first
+EXPORT_MODULES = [
+    'numpy',
+    'xlsxwriter',
+    'ijson',
+    'request_parser',
+    'binary_format',
+    'excel_generator',
+    'tax',
+    'bulk_export',
+]
+
+# EXPORT_PREWARM=0 leaves every import to the first request that needs it
+PREWARM_ENABLED = os.environ.get('EXPORT_PREWARM', '1').lower() not in ('0', 'false', 'off')
+
+_started = False
+_lock = threading.Lock()
+
+
+def _import_all(modules: Sequence[str]):
+    """Import modules in order and log how long it took."""
+    start_time = time.time()
+    loaded: List[str] = []
+    try:
+        for name in modules:
+            importlib.import_module(name)
+            loaded.append(name)
+    except Exception as e:
+        # A failed pre-warm only means the first export imports it instead
+        print(f'Pre-warm stopped at {name}: {str(e)}')
+        traceback.print_exc()
+    print(f'Pre-warmed {len(loaded)} modules in {(time.time() - start_time)*1000:.1f}ms')
+
+
+def prewarm(modules: Sequence[str] = EXPORT_MODULES) -> bool:
+    """
+    Import modules on a daemon thread, once per process.
+
+    Returns:
+        True when this call started the pre-warm
+    """
+    global _started
+    if not PREWARM_ENABLED:
+        return False
+    with _lock:
+        if _started:
+            return False
+        _started = True
+    threading.Thread(target=_import_all, args=(list(modules),), name='export-prewarm', daemon=True).start()
+    return True
+
+
+def prewarm_on_first_request(handler: Callable):
+    """
+    Decorate an HTTP handler so its first request starts prewarm() before
+    the handler runs, while the instance still has CPU for the request.
+    """
+    @functools.wraps(handler)
+    def wrapper(req):
+        if PREWARM_ENABLED and not _started:
+            prewarm()
+        return handler(req)
+    return wrapper
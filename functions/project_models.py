@@ -0,0 +1,311 @@
+"""
+Data models for project inputs (individuals, assets, events, expenses, scenarios).
+These mirror the Dart/Flutter domain models so a project export file can be
+projected server-side. Keys from the older plan-file layout (e.g.
+currentAnnualIncome, psvEligibilityAge) are accepted as aliases.
+"""
+
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from models import parse_calculated_at
+
+
+# Defaults from the Dart Individual / Project models
+DEFAULT_RRQ_START_AGE = 65
+DEFAULT_PSV_START_AGE = 65
+DEFAULT_RRQ_AT_60 = 12000.0
+DEFAULT_RRQ_AT_65 = 16000.0
+DEFAULT_RETURN_RATES = {
+    'inflationRate': 0.02,
+    'reerReturnRate': 0.05,
+    'celiReturnRate': 0.05,
+    'criReturnRate': 0.05,
+    'cashReturnRate': 0.015,
+}
+
+
+def _first(data: Dict, *keys, default=None):
+    """Value of the first key present and not null."""
+    for key in keys:
+        value = data.get(key)
+        if value is not None:
+            return value
+    return default
+
+
+def _year_of(value) -> Optional[int]:
+    """Calendar year of an ISO-8601 date string (None when absent)."""
+    if value is None:
+        return None
+    return int(str(value)[:4])
+
+
+@dataclass
+class Timing:
+    """EventTiming union: when an event happens or an expense starts/ends."""
+    kind: str  # 'relative', 'absolute', 'age', 'eventRelative', 'projectionEnd'
+    years_from_start: int = 0
+    calendar_year: int = 0
+    individual_id: Optional[str] = None
+    age: int = 0
+    event_id: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> 'Timing':
+        """Create Timing from dictionary (missing timing never occurs)."""
+        if not data:
+            return cls(kind='projectionEnd')
+        return cls(
+            kind=data.get('runtimeType', 'projectionEnd'),
+            years_from_start=int(data.get('yearsFromStart', 0)),
+            calendar_year=int(data.get('calendarYear', 0)),
+            individual_id=data.get('individualId'),
+            age=int(data.get('age', 0)),
+            event_id=data.get('eventId'),
+        )
+
+
+@dataclass
+class Individual:
+    """A person in the plan."""
+    id: str
+    name: str
+    birth_year: int
+    employment_income: float = 0.0
+    rrq_start_age: int = DEFAULT_RRQ_START_AGE
+    psv_start_age: int = DEFAULT_PSV_START_AGE
+    projected_rrq_at_60: float = DEFAULT_RRQ_AT_60
+    projected_rrq_at_65: float = DEFAULT_RRQ_AT_65
+    initial_celi_room: float = 0.0
+    has_rrpe: bool = False
+    rrpe_start_year: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Individual':
+        """Create Individual from dictionary."""
+        return cls(
+            id=data['id'],
+            name=data.get('name', ''),
+            birth_year=_year_of(data['birthdate']),
+            employment_income=float(_first(data, 'employmentIncome', 'currentAnnualIncome', default=0.0)),
+            rrq_start_age=int(_first(data, 'rrqStartAge', default=DEFAULT_RRQ_START_AGE)),
+            psv_start_age=int(_first(data, 'psvStartAge', 'psvEligibilityAge', default=DEFAULT_PSV_START_AGE)),
+            projected_rrq_at_60=float(_first(data, 'projectedRrqAt60', default=DEFAULT_RRQ_AT_60)),
+            projected_rrq_at_65=float(_first(data, 'projectedRrqAt65', 'rrqAnnualBenefit', default=DEFAULT_RRQ_AT_65)),
+            initial_celi_room=float(_first(data, 'initialCeliRoom', default=0.0)),
+            has_rrpe=bool(data.get('hasRrpe', False)),
+            rrpe_start_year=_year_of(data.get('rrpeParticipationStartDate')),
+        )
+
+
+@dataclass
+class ProjectAsset:
+    """An account or property with its starting value."""
+    id: str
+    type: str  # 'realEstate', 'rrsp', 'celi', 'cri', 'cash'
+    value: float
+    individual_id: Optional[str] = None
+    custom_return_rate: Optional[float] = None
+    annual_contribution: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ProjectAsset':
+        """Create ProjectAsset from dictionary."""
+        custom_rate = data.get('customReturnRate')
+        contribution = data.get('annualContribution')
+        return cls(
+            id=data['id'],
+            type=data['runtimeType'],
+            value=float(data.get('value') or 0.0),
+            individual_id=data.get('individualId'),
+            custom_return_rate=float(custom_rate) if custom_rate is not None else None,
+            annual_contribution=float(contribution) if contribution is not None else None,
+        )
+
+
+@dataclass
+class ProjectEvent:
+    """Retirement, death or real estate transaction."""
+    id: str
+    type: str  # 'retirement', 'death', 'realEstateTransaction'
+    timing: Timing
+    individual_id: Optional[str] = None
+    asset_sold_id: Optional[str] = None
+    asset_purchased_id: Optional[str] = None
+    withdraw_account_id: Optional[str] = None
+    deposit_account_id: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ProjectEvent':
+        """Create ProjectEvent from dictionary."""
+        return cls(
+            id=data['id'],
+            type=data['runtimeType'],
+            timing=Timing.from_dict(data.get('timing')),
+            individual_id=data.get('individualId'),
+            asset_sold_id=data.get('assetSoldId'),
+            asset_purchased_id=data.get('assetPurchasedId'),
+            withdraw_account_id=data.get('withdrawAccountId'),
+            deposit_account_id=data.get('depositAccountId'),
+        )
+
+
+@dataclass
+class ProjectExpense:
+    """Recurring expense in today's dollars, active between two timings."""
+    id: str
+    category: str  # 'housing', 'transport', 'dailyLiving', 'recreation', 'health', 'family'
+    annual_amount: float
+    start_timing: Timing
+    end_timing: Timing
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ProjectExpense':
+        """Create ProjectExpense from dictionary."""
+        return cls(
+            id=data['id'],
+            category=data['runtimeType'],
+            annual_amount=float(data.get('annualAmount') or 0.0),
+            start_timing=Timing.from_dict(data.get('startTiming')),
+            end_timing=Timing.from_dict(data.get('endTiming')),
+        )
+
+
+@dataclass
+class Scenario:
+    """Named set of parameter overrides."""
+    id: str
+    name: str
+    is_base: bool = False
+    overrides: List[Dict] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Scenario':
+        """Create Scenario from dictionary."""
+        return cls(
+            id=data['id'],
+            name=data.get('name', data['id']),
+            is_base=bool(data.get('isBase', False)),
+            overrides=list(data.get('overrides') or []),
+        )
+
+
+@dataclass
+class Project:
+    """Complete project export: plan settings and every input entity."""
+    id: str
+    name: str
+    individuals: List[Individual]
+    assets: List[ProjectAsset]
+    events: List[ProjectEvent]
+    expenses: List[ProjectExpense]
+    scenarios: List[Scenario]
+    rates: Dict[str, float]  # inflationRate, reerReturnRate, celiReturnRate, criReturnRate, cashReturnRate
+    start_year: Optional[int] = None
+    end_year: Optional[int] = None
+    updated_at: Optional[datetime] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Project':
+        """
+        Create Project from a project export file.
+
+        Args:
+            data: Export JSON with 'project', 'assets', 'events', 'expenses'
+                  and 'scenarios' at the top level
+
+        Returns:
+            Project
+        """
+        project = data['project']
+        # Plan files only carry a single default rate for the investment accounts
+        default_rate = project.get('defaultReturnRate')
+        rates = {}
+        for key, fallback in DEFAULT_RETURN_RATES.items():
+            if key != 'inflationRate' and default_rate is not None:
+                fallback = default_rate
+            rates[key] = float(_first(project, key, default=fallback))
+
+        updated_at = project.get('updatedAt')
+        return cls(
+            id=project['id'],
+            name=project.get('name', ''),
+            individuals=[Individual.from_dict(item) for item in project.get('individuals') or []],
+            assets=[ProjectAsset.from_dict(item) for item in data.get('assets') or []],
+            events=[ProjectEvent.from_dict(item) for item in data.get('events') or []],
+            expenses=[ProjectExpense.from_dict(item) for item in data.get('expenses') or []],
+            scenarios=[Scenario.from_dict(item) for item in data.get('scenarios') or []],
+            rates=rates,
+            start_year=project.get('projectionStartYear'),
+            end_year=project.get('projectionEndYear'),
+            updated_at=parse_calculated_at(updated_at) if updated_at else None,
+        )
+
+    def scenario(self, scenario_id: Optional[str] = None) -> Scenario:
+        """
+        Look up a scenario by id (defaults to the base scenario).
+
+        Raises:
+            KeyError: If the scenario does not exist
+        """
+        if scenario_id is None:
+            for scenario in self.scenarios:
+                if scenario.is_base:
+                    return scenario
+            return self.scenarios[0] if self.scenarios else Scenario(id='base', name='Base Scenario', is_base=True)
+        for scenario in self.scenarios:
+            if scenario.id == scenario_id:
+                return scenario
+        raise KeyError(f'scenario {scenario_id}')
+
+    def with_overrides(self, scenario: Scenario) -> 'Project':
+        """
+        Apply a scenario's overrides (asset values, event and expense timing,
+        expense amounts), matching ProjectionCalculator in the app.
+        """
+        asset_values = {}
+        event_timings = {}
+        expense_amounts = {}
+        expense_timings = {}
+        # The first override of each kind for an id wins
+        for override in scenario.overrides:
+            kind = override.get('runtimeType')
+            if kind == 'assetValue':
+                asset_values.setdefault(override['assetId'], float(override['value']))
+            elif kind == 'eventTiming':
+                event_timings.setdefault(override['eventId'], int(override['yearsFromStart']))
+            elif kind == 'expenseAmount':
+                expense_amounts.setdefault(override['expenseId'], override)
+            elif kind == 'expenseTiming':
+                expense_timings.setdefault(override['expenseId'], override)
+
+        assets = [
+            replace(asset, value=asset_values[asset.id]) if asset.id in asset_values else asset
+            for asset in self.assets
+        ]
+        events = [
+            replace(event, timing=Timing(kind='relative', years_from_start=event_timings[event.id]))
+            if event.id in event_timings else event
+            for event in self.events
+        ]
+
+        expenses = []
+        for expense in self.expenses:
+            amount_override = expense_amounts.get(expense.id)
+            if amount_override is not None:
+                if amount_override.get('overrideAmount') is not None:
+                    expense = replace(expense, annual_amount=float(amount_override['overrideAmount']))
+                elif amount_override.get('amountMultiplier') is not None:
+                    expense = replace(expense, annual_amount=expense.annual_amount *
+                                      float(amount_override['amountMultiplier']))
+            timing_override = expense_timings.get(expense.id)
+            if timing_override is not None:
+                if timing_override.get('overrideStartTiming') is not None:
+                    expense = replace(expense, start_timing=Timing.from_dict(timing_override['overrideStartTiming']))
+                if timing_override.get('overrideEndTiming') is not None:
+                    expense = replace(expense, end_timing=Timing.from_dict(timing_override['overrideEndTiming']))
+            expenses.append(expense)
+
+        return replace(self, assets=assets, events=events, expenses=expenses)
@@ -0,0 +1,628 @@
+"""
+Projection engine.
+Computes a projection from a project export on the server, following the
+app's ProjectionCalculator year by year. Everything that does not depend on
+account balances (ages, event and expense schedules, income, taxes, CRI
+minimum rates) is computed up front as [years, ...] arrays; the remaining
+per-year loop works on [paths, accounts] balance arrays, so the deterministic
+projection and batches of stochastic return paths share one code path.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from columnar import ColumnarProjection, SCALAR_METRICS, ACCOUNT_MAPS, INCOME_SOURCES
+from aggregates import EXPENSE_CATEGORIES
+from models import Asset
+from project_models import Project, Timing
+from tax import income_tax
+
+
+# Defaults of ProjectionCalculator.calculateProjection
+DEFAULT_PROJECTION_YEARS = 40
+# Longest projection (a lifetime and then some; rows and arrays grow with it)
+MAX_PROJECTION_YEARS = 120
+DEFAULT_INFLATION_RATE = 0.02
+
+# Income constants (income_constants.dart)
+RRQ_LATE_BONUS_PER_MONTH = 0.007
+PSV_BASE_AMOUNT = 8500.0
+PSV_CLAWBACK_THRESHOLD = 90000.0
+PSV_CLAWBACK_RATE = 0.15
+SURVIVOR_BENEFIT_RATE = 0.60
+RRPE_MGA_2024 = 68500.0
+RRPE_ACCRUAL_RATE = 0.02
+RRPE_REDUCTION_RATE = 0.007
+RRPE_MAX_SERVICE_YEARS_FOR_REDUCTION = 35
+
+# RRIF/CRI minimum withdrawal rates for ages 65..95 (0 below 65, 20% from 95)
+RRIF_MINIMUM_RATES = np.zeros(96)
+RRIF_MINIMUM_RATES[65:] = [
+    0.0400, 0.0417, 0.0435, 0.0455, 0.0476, 0.0500, 0.0528, 0.0540, 0.0553, 0.0567,
+    0.0582, 0.0598, 0.0617, 0.0636, 0.0658, 0.0682, 0.0708, 0.0738, 0.0771, 0.0808,
+    0.0851, 0.0899, 0.0955, 0.1021, 0.1099, 0.1192, 0.1306, 0.1449, 0.1634, 0.1879,
+    0.2000,
+]
+
+# Surplus goes to CELI (up to room), then cash; CELI room grows every year
+ANNUAL_CELI_ROOM = 7000.0
+
+# Withdrawal order for shortfalls
+WITHDRAWAL_ORDER = ['celi', 'cash', 'cri', 'rrsp']
+
+# Cash-flow iteration (REER withdrawals feed back into income)
+MAX_CASH_FLOW_ITERATIONS = 5
+CONVERGENCE_THRESHOLD = 1.0
+SHORTFALL_THRESHOLD = 0.01
+
+# Longest span (in years) any amount is indexed over, beyond the projection itself
+COMPOUNDING_HORIZON = 150
+
+# Years that never occur (e.g. projectionEnd, unresolvable event references)
+NEVER = np.iinfo(np.int64).max
+
+
+def compound_factors(rate: float, count: int) -> np.ndarray:
+    """
+    (1 + rate)^n for n = 0..count, built by repeated multiplication.
+
+    Matches the app's compounding loops bit for bit (pow() would round
+    differently). Index with np.clip(n, 0, None): negative spans compound
+    zero times.
+    """
+    return np.concatenate(([1.0], np.cumprod(np.full(count, 1.0 + rate))))
+
+
+class _Schedule:
+    """Resolves timings to calendar years for one set of events."""
+
+    def __init__(self, project: Project, events, start_year: int):
+        self.birth_years = {individual.id: individual.birth_year for individual in project.individuals}
+        self.events = {}
+        for event in events:
+            self.events.setdefault(event.id, event)
+        self.start_year = start_year
+
+    def year_of(self, timing: Timing, visited: frozenset = frozenset()) -> int:
+        """Calendar year a timing falls on (NEVER when it cannot be resolved)."""
+        if timing.kind == 'relative':
+            return self.start_year + timing.years_from_start
+        if timing.kind == 'absolute':
+            return timing.calendar_year
+        if timing.kind == 'age':
+            birth_year = self.birth_years.get(timing.individual_id)
+            return NEVER if birth_year is None else birth_year + timing.age
+        if timing.kind == 'eventRelative':
+            event = self.events.get(timing.event_id)
+            if event is None or timing.event_id in visited:
+                return NEVER
+            return self.year_of(event.timing, visited | {timing.event_id})
+        return NEVER
+
+
+@dataclass
+class ProjectionPlan:
+    """
+    Everything about one scenario that does not depend on account balances,
+    computed once and shared by every path simulated from it.
+    """
+    scenario_id: str
+    project_id: str
+    first_year: int
+    inflation_rate: float
+    years: np.ndarray                 # int64 [years]
+    years_from_start: np.ndarray      # int64 [years]
+    ages: np.ndarray                  # int64 [years, individuals]
+    individual_ids: List[str]
+    income: np.ndarray                # float64 [years, individuals, INCOME_SOURCES]
+    federal_tax: np.ndarray           # float64 [years]
+    quebec_tax: np.ndarray            # float64 [years]
+    expenses_by_category: np.ndarray  # float64 [years, EXPENSE_CATEGORIES]
+    expense_totals: np.ndarray        # float64 [years]
+    all_retired: np.ndarray           # bool [years]
+    events_occurred: List[List[str]]
+    # Real estate transactions per year: (sold, deposit, purchased, withdraw, purchase value), -1 when absent
+    transactions: List[List[Tuple[int, int, int, int, float]]]
+    account_ids: List[str]
+    account_types: List[str]
+    initial_balances: np.ndarray      # float64 [accounts]
+    return_rates: np.ndarray          # float64 [accounts], expected annual returns
+    annual_contributions: np.ndarray  # float64 [accounts]
+    cri_rates: np.ndarray             # float64 [years, accounts]
+    withdrawal_order: np.ndarray      # int64 account indices
+    is_rrsp: np.ndarray               # bool [accounts]
+    first_celi: int                   # -1 when there is no CELI
+    first_cash: int                   # -1 when there is no cash account
+    initial_celi_room: float
+
+    @property
+    def num_years(self) -> int:
+        """Number of projected years."""
+        return len(self.years)
+
+    @property
+    def total_tax(self) -> np.ndarray:
+        """Federal plus Quebec tax per year."""
+        return self.federal_tax + self.quebec_tax
+
+
+def projection_length(project: Project, start_year: Optional[int] = None,
+                      projection_years: Optional[int] = None) -> int:
+    """
+    Number of years projected: projection_years, else the project's range
+    from the first year, else 40, within 1..MAX_PROJECTION_YEARS.
+    """
+    first_year = start_year or project.start_year or datetime.now().year
+    if projection_years is None:
+        projection_years = (project.end_year - first_year + 1) if project.end_year else DEFAULT_PROJECTION_YEARS
+    return min(max(int(projection_years), 1), MAX_PROJECTION_YEARS)
+
+
+def plan_projection(project: Project, scenario_id: Optional[str] = None, start_year: Optional[int] = None,
+                    projection_years: Optional[int] = None,
+                    inflation_rate: float = DEFAULT_INFLATION_RATE) -> ProjectionPlan:
+    """
+    Precompute the balance-independent part of a scenario's projection.
+
+    Args:
+        project: Parsed project export
+        scenario_id: Scenario whose overrides apply (defaults to the base scenario)
+        start_year: First projected year (defaults to the project's, then the current year)
+        projection_years: Number of years (defaults to the project's range, then 40)
+        inflation_rate: Indexation rate for income, expenses and benefits
+
+    Returns:
+        ProjectionPlan for simulate()
+    """
+    scenario = project.scenario(scenario_id)
+    effective = project.with_overrides(scenario)
+    individuals = project.individuals
+    assets = effective.assets
+
+    first_year = start_year or project.start_year or datetime.now().year
+    num_years = projection_length(project, first_year, projection_years)
+    years = first_year + np.arange(num_years, dtype=np.int64)
+    years_from_start = np.arange(num_years, dtype=np.int64)
+
+    # Ages [years, individuals] and compounding tables long enough for any age
+    birth_years = np.array([individual.birth_year for individual in individuals], dtype=np.int64)
+    ages = years[:, None] - birth_years[None, :]
+    growth = compound_factors(inflation_rate, COMPOUNDING_HORIZON + num_years)
+
+    def inflate(spans: np.ndarray) -> np.ndarray:
+        return growth[np.clip(spans, 0, len(growth) - 1)]
+
+    # Event schedule: events happen in exactly one year (scenario timings apply)
+    schedule = _Schedule(project, effective.events, first_year)
+    events = effective.events
+    event_years = np.array([schedule.year_of(event.timing) for event in events], dtype=np.int64)
+    occurs = years[:, None] == event_years[None, :]                                     # [years, events]
+    occurred = (event_years[None, :] >= first_year) & (event_years[None, :] <= years[:, None])
+
+    def occurred_for(event_type: str, individual_id: str) -> np.ndarray:
+        mask = np.array([event.type == event_type and event.individual_id == individual_id for event in events],
+                        dtype=bool)
+        return occurred[:, mask].any(axis=1) if mask.any() else np.zeros(num_years, dtype=bool)
+
+    deceased = np.stack([occurred_for('death', individual.id) for individual in individuals], axis=1) \
+        if individuals else np.zeros((num_years, 0), dtype=bool)
+    retired = np.stack([occurred_for('retirement', individual.id) for individual in individuals], axis=1) \
+        if individuals else np.zeros((num_years, 0), dtype=bool)
+
+    # Expenses: active from the start timing until the end timing has occurred.
+    # Like the app, event references in expense timings ignore scenario overrides.
+    expense_schedule = _Schedule(project, project.events, first_year)
+    expense_start = np.array([expense_schedule.year_of(expense.start_timing) for expense in effective.expenses],
+                             dtype=np.int64)
+    expense_end = np.array([expense_schedule.year_of(expense.end_timing) for expense in effective.expenses],
+                           dtype=np.int64)
+    active = (expense_start[None, :] <= years[:, None]) & ~(expense_end[None, :] <= years[:, None])
+    amounts = np.array([expense.annual_amount for expense in effective.expenses])
+    expense_values = np.where(active, amounts[None, :] * growth[years_from_start][:, None], 0.0)
+    category_membership = np.zeros((len(effective.expenses), len(EXPENSE_CATEGORIES)))
+    for idx, expense in enumerate(effective.expenses):
+        if expense.category in EXPENSE_CATEGORIES:
+            category_membership[idx, EXPENSE_CATEGORIES.index(expense.category)] = 1.0
+
+    income = _income(project, events, years, ages, deceased, retired, occurred, first_year, inflation_rate, inflate)
+    federal_by_individual, quebec_by_individual = income_tax(income.sum(axis=2), ages)
+
+    # Account vectors
+    account_index = {asset.id: idx for idx, asset in enumerate(assets)}
+    types = np.array([asset.type for asset in assets], dtype=object)
+    is_type = {asset_type: types == asset_type for asset_type in ('realEstate', 'rrsp', 'celi', 'cri', 'cash')}
+    type_rates = {
+        'realEstate': project.rates['inflationRate'],
+        'rrsp': project.rates['reerReturnRate'],
+        'celi': project.rates['celiReturnRate'],
+        'cri': project.rates['criReturnRate'],
+        'cash': project.rates['cashReturnRate'],
+    }
+
+    # CRI minimum rates [years, accounts] from each owner's age
+    owner_index = {individual.id: idx for idx, individual in enumerate(individuals)}
+    cri_rates = np.zeros((num_years, len(assets)))
+    for idx, asset in enumerate(assets):
+        if asset.type == 'cri' and asset.individual_id in owner_index:
+            cri_rates[:, idx] = RRIF_MINIMUM_RATES[np.clip(ages[:, owner_index[asset.individual_id]], 0, 95)]
+
+    # Real estate transactions resolved to account indices, in event order
+    transactions = []
+    for row in range(num_years):
+        year_transactions = []
+        for event, happens in zip(events, occurs[row]):
+            if not happens or event.type != 'realEstateTransaction':
+                continue
+            sold = account_index.get(event.asset_sold_id, -1) if event.asset_sold_id is not None else -1
+            purchased = account_index.get(event.asset_purchased_id, -1) \
+                if event.asset_purchased_id is not None else -1
+            if purchased >= 0 and assets[purchased].type != 'realEstate':
+                purchased = -1
+            year_transactions.append((
+                sold,
+                account_index.get(event.deposit_account_id, -1),
+                purchased,
+                account_index.get(event.withdraw_account_id, -1),
+                assets[purchased].value if purchased >= 0 else 0.0,
+            ))
+        transactions.append(year_transactions)
+
+    return ProjectionPlan(
+        scenario_id=scenario.id,
+        project_id=project.id,
+        first_year=first_year,
+        inflation_rate=inflation_rate,
+        years=years,
+        years_from_start=years_from_start,
+        ages=ages,
+        individual_ids=[individual.id for individual in individuals],
+        income=income,
+        federal_tax=federal_by_individual.sum(axis=1),
+        quebec_tax=quebec_by_individual.sum(axis=1),
+        expenses_by_category=expense_values @ category_membership,
+        expense_totals=expense_values.sum(axis=1),
+        all_retired=retired.all(axis=1),
+        events_occurred=[[event.id for event, happens in zip(events, occurs[row]) if happens]
+                         for row in range(num_years)],
+        transactions=transactions,
+        account_ids=[asset.id for asset in assets],
+        account_types=[asset.type for asset in assets],
+        initial_balances=np.array([asset.value for asset in assets], dtype=np.float64),
+        return_rates=np.array([
+            asset.custom_return_rate if asset.custom_return_rate is not None else type_rates.get(asset.type, 0.0)
+            for asset in assets
+        ]),
+        annual_contributions=np.array([
+            asset.annual_contribution if asset.type != 'realEstate' and asset.annual_contribution
+            and asset.annual_contribution > 0 else 0.0
+            for asset in assets
+        ]),
+        cri_rates=cri_rates,
+        withdrawal_order=np.array([idx for asset_type in WITHDRAWAL_ORDER
+                                   for idx in np.flatnonzero(is_type[asset_type])], dtype=np.int64),
+        is_rrsp=is_type['rrsp'],
+        first_celi=int(np.flatnonzero(is_type['celi'])[0]) if is_type['celi'].any() else -1,
+        first_cash=int(np.flatnonzero(is_type['cash'])[0]) if is_type['cash'].any() else -1,
+        initial_celi_room=sum(individual.initial_celi_room for individual in individuals),
+    )
+
+
+def simulate(plan: ProjectionPlan, return_rates: Optional[np.ndarray] = None, paths: int = 1,
+             record_accounts: bool = False) -> Dict[str, np.ndarray]:
+    """
+    Run the balance-dependent year loop for a batch of paths at once.
+
+    Every path starts from the same balances; paths differ only by their
+    return rates. Each year is one set of array operations over
+    [paths, accounts], so thousands of paths cost little more than one.
+
+    Args:
+        plan: Output of plan_projection()
+        return_rates: Annual returns [years, paths, accounts] (defaults to the
+                      plan's expected rates on every path)
+        paths: Number of paths in the batch
+        record_accounts: Also record the per-account arrays of ACCOUNT_MAPS
+
+    Returns:
+        Balance-dependent SCALAR_METRICS as [years, paths] arrays, plus
+        [years, paths, accounts] arrays keyed by ACCOUNT_MAPS when requested
+    """
+    num_years = plan.num_years
+    num_accounts = len(plan.account_ids)
+    total_tax = plan.total_tax
+    income_from_work = plan.income.sum(axis=(1, 2))
+    if return_rates is None:
+        return_rates = np.broadcast_to(plan.return_rates, (num_years, paths, num_accounts))
+
+    metrics = {name: np.zeros((num_years, paths)) for name in SCALAR_METRICS
+               if name not in ('federal_tax', 'quebec_tax', 'total_tax')}
+    accounts = {name: np.zeros((num_years, paths, num_accounts)) for name in ACCOUNT_MAPS} if record_accounts else {}
+
+    balances = np.tile(plan.initial_balances, (paths, 1))
+    celi_room = np.full(paths, plan.initial_celi_room)
+
+    for row in range(num_years):
+        if record_accounts:
+            accounts['assets_start_of_year'][row] = balances
+        metrics['net_worth_start_of_year'][row] = balances.sum(axis=1)
+
+        # CRI minimum withdrawals are forced and count as income
+        cri_minimums = np.where(balances > 0, balances * plan.cri_rates[row], 0.0)
+        balances -= cri_minimums
+        base_income = income_from_work[row] + cri_minimums.sum(axis=1)
+
+        # Real estate transactions
+        event_income = np.zeros(paths)
+        event_expenses = 0.0
+        for sold, deposit, purchased, withdraw, purchase_value in plan.transactions[row]:
+            if sold >= 0:
+                sale_value = balances[:, sold].copy()
+                if deposit >= 0:
+                    balances[:, deposit] += sale_value
+                balances[:, sold] = 0.0
+                event_income += sale_value
+            if purchased >= 0:
+                if withdraw >= 0:
+                    balances[:, withdraw] -= purchase_value
+                balances[:, purchased] = purchase_value
+                event_expenses += purchase_value
+        total_expenses = event_expenses + plan.expense_totals[row]
+
+        withdrawals, taxable_income, shortfall = _cash_flow(
+            base_income + event_income, total_expenses, total_tax[row], balances, cri_minimums,
+            plan.withdrawal_order, plan.is_rrsp)
+        balances = np.where(withdrawals > 0, np.maximum(balances - withdrawals, 0.0), balances)
+
+        # Surplus is saved once everyone has retired: CELI up to its room, then cash
+        net_cash_flow = base_income - total_expenses - total_tax[row]
+        contributions = np.zeros_like(balances)
+        if plan.all_retired[row]:
+            surplus = np.maximum(net_cash_flow, 0.0)
+            if plan.first_celi >= 0:
+                to_celi = np.where(celi_room > 0, np.minimum(surplus, celi_room), 0.0)
+                contributions[:, plan.first_celi] = to_celi
+                surplus = surplus - to_celi
+                celi_room = celi_room - to_celi
+            if plan.first_cash >= 0:
+                contributions[:, plan.first_cash] += surplus
+            balances = balances + contributions
+        celi_room = celi_room + ANNUAL_CELI_ROOM
+
+        returns = np.where(balances > 0, balances * return_rates[row], 0.0)
+        balances = balances + returns + plan.annual_contributions
+
+        if record_accounts:
+            accounts['withdrawals_by_account'][row] = withdrawals
+            accounts['contributions_by_account'][row] = contributions
+            accounts['asset_returns'][row] = returns
+            accounts['assets_end_of_year'][row] = balances
+        metrics['total_income'][row] = base_income
+        metrics['taxable_income'][row] = taxable_income
+        metrics['after_tax_income'][row] = base_income - total_tax[row]
+        metrics['total_expenses'][row] = total_expenses
+        metrics['total_withdrawals'][row] = withdrawals.sum(axis=1)
+        metrics['total_contributions'][row] = contributions.sum(axis=1)
+        metrics['celi_contribution_room'][row] = celi_room
+        metrics['net_cash_flow'][row] = net_cash_flow
+        metrics['net_worth_end_of_year'][row] = balances.sum(axis=1)
+        metrics['shortfall_amount'][row] = shortfall
+
+    metrics.update(accounts)
+    return metrics
+
+
+def calculate_projection(project: Project, scenario_id: Optional[str] = None, start_year: Optional[int] = None,
+                         projection_years: Optional[int] = None, inflation_rate: float = DEFAULT_INFLATION_RATE,
+                         use_constant_dollars: bool = False,
+                         calculated_at: Optional[datetime] = None) -> ColumnarProjection:
+    """
+    Project a scenario of a project.
+
+    Args:
+        project: Parsed project export
+        scenario_id: Scenario whose overrides apply (defaults to the base scenario)
+        start_year: First projected year (defaults to the project's, then the current year)
+        projection_years: Number of years (defaults to the project's range, then 40)
+        inflation_rate: Indexation rate for income, expenses and benefits
+        use_constant_dollars: Recorded on the projection
+        calculated_at: Timestamp recorded on the projection (defaults to now)
+
+    Returns:
+        ColumnarProjection ready for ExcelGenerator
+    """
+    plan = plan_projection(project, scenario_id, start_year, projection_years, inflation_rate)
+    # The deterministic projection is a single path at the expected returns
+    results = simulate(plan, record_accounts=True)
+    metrics = {name: results[name][:, 0] for name in SCALAR_METRICS if name in results}
+    metrics['federal_tax'] = plan.federal_tax
+    metrics['quebec_tax'] = plan.quebec_tax
+    metrics['total_tax'] = plan.total_tax
+
+    def age_column(idx: int) -> np.ndarray:
+        if idx < len(plan.individual_ids):
+            return plan.ages[:, idx].astype(np.float64)
+        return np.full(plan.num_years, np.nan)
+
+    return ColumnarProjection(
+        scenario_id=plan.scenario_id,
+        project_id=plan.project_id,
+        start_year=plan.first_year,
+        end_year=plan.first_year + plan.num_years - 1,
+        use_constant_dollars=use_constant_dollars,
+        inflation_rate=inflation_rate,
+        calculated_at=calculated_at or datetime.now(),
+        year=plan.years,
+        years_from_start=plan.years_from_start,
+        primary_age=age_column(0),
+        spouse_age=age_column(1),
+        has_shortfall=metrics['shortfall_amount'] > 0,
+        metrics=metrics,
+        individual_ids=plan.individual_ids,
+        income=plan.income,
+        category_ids=list(EXPENSE_CATEGORIES),
+        expenses_by_category=plan.expenses_by_category,
+        account_ids=plan.account_ids,
+        accounts={name: results[name][:, 0] for name in ACCOUNT_MAPS},
+        events_occurred=plan.events_occurred,
+    )
+
+
+def _income(project: Project, events, years: np.ndarray, ages: np.ndarray, deceased: np.ndarray,
+            retired: np.ndarray, occurred: np.ndarray, first_year: int, inflation_rate: float,
+            inflate) -> np.ndarray:
+    """
+    Income [years, individuals, INCOME_SOURCES] following IncomeCalculator.
+
+    Employment stops at retirement, RRQ/PSV start at their ages (PSV with
+    clawback), RRPE starts at retirement, survivors receive 60% of a deceased
+    spouse's RRQ and PSV, and deceased individuals have no income.
+    """
+    individuals = project.individuals
+    num_years = len(years)
+    income = np.zeros((num_years, len(individuals), len(INCOME_SOURCES)))
+    if not individuals:
+        return income
+    years_from_start = years - first_year
+    source = {name: idx for idx, name in enumerate(INCOME_SOURCES)}
+
+    rrq_start = np.array([individual.rrq_start_age for individual in individuals])
+    psv_start = np.array([individual.psv_start_age for individual in individuals])
+    employment_base = np.array([individual.employment_income for individual in individuals])
+
+    employment = np.where(retired, 0.0, employment_base[None, :] * inflate(years_from_start)[:, None])
+
+    # RRQ: amount at 60, at 65 with the late bonus, or interpolated in between
+    rrq_base = np.array([
+        individual.projected_rrq_at_60 if individual.rrq_start_age <= 60 else
+        individual.projected_rrq_at_65 * (1.0 + (individual.rrq_start_age - 65) * 12 * RRQ_LATE_BONUS_PER_MONTH)
+        if individual.rrq_start_age >= 65 else
+        individual.projected_rrq_at_60 + (individual.projected_rrq_at_65 - individual.projected_rrq_at_60) *
+        ((individual.rrq_start_age - 60) / 5.0)
+        for individual in individuals
+    ])
+    rrq = np.where(ages >= rrq_start[None, :], rrq_base[None, :] * inflate(ages - rrq_start[None, :]), 0.0)
+
+    psv_factor = inflate(ages - psv_start[None, :])
+    psv_base = PSV_BASE_AMOUNT * psv_factor
+    threshold = PSV_CLAWBACK_THRESHOLD * psv_factor
+    other_income = employment + rrq
+    clawback = np.where(other_income > threshold, (other_income - threshold) * PSV_CLAWBACK_RATE, 0.0)
+    psv = np.where(ages >= psv_start[None, :], np.maximum(psv_base - clawback, 0.0), 0.0)
+
+    rrpe = np.zeros((num_years, len(individuals)))
+    for idx, individual in enumerate(individuals):
+        rrpe[:, idx] = _rrpe(individual, events, years, ages[:, idx], occurred, first_year, inflation_rate, inflate)
+
+    # Survivor benefits: 60% of what each deceased spouse would have received
+    spouse_benefit = SURVIVOR_BENEFIT_RATE * (rrq + np.where(ages >= psv_start[None, :], psv_base, 0.0))
+    spouse_benefit = np.where(deceased, spouse_benefit, 0.0)
+    survivor = spouse_benefit.sum(axis=1, keepdims=True) - spouse_benefit
+
+    income[:, :, source['employment']] = employment
+    income[:, :, source['rrq']] = rrq
+    income[:, :, source['psv']] = psv
+    income[:, :, source['rrpe']] = rrpe
+    income[:, :, source['other']] = survivor
+    income[deceased] = 0.0
+    return income
+
+
+def _rrpe(individual, events, years: np.ndarray, ages: np.ndarray, occurred: np.ndarray, first_year: int,
+          inflation_rate: float, inflate) -> np.ndarray:
+    """RRPE pension for one individual over all years (zero until retirement)."""
+    num_years = len(years)
+    if not individual.has_rrpe or individual.rrpe_start_year is None:
+        return np.zeros(num_years)
+
+    # The first retirement event to have occurred sets the retirement year
+    candidates = [idx for idx, event in enumerate(events)
+                  if event.type == 'retirement' and event.individual_id == individual.id]
+    if not candidates:
+        return np.zeros(num_years)
+    has_retired = occurred[:, candidates].any(axis=1)
+    first_idx = np.where(occurred[:, candidates], np.arange(num_years)[:, None], num_years).min(axis=0)
+    event = events[candidates[int(np.argmin(first_idx))]]
+
+    timing = event.timing
+    if timing.kind == 'absolute':
+        retirement_year = np.full(num_years, timing.calendar_year, dtype=np.int64)
+    elif timing.kind == 'age':
+        retirement_year = np.full(num_years, individual.birth_year + timing.age, dtype=np.int64)
+    else:
+        # Relative, event-relative and projection-end timings fall back to the current year
+        retirement_year = years.copy()
+
+    service = retirement_year - individual.rrpe_start_year
+    salary_years = np.minimum(service, 5)
+    salary_at_retirement = individual.employment_income * inflate(retirement_year - first_year)
+
+    # Average of the last salary_years salaries, deflated back from retirement
+    total_salary = np.zeros(num_years)
+    year_salary = salary_at_retirement.copy()
+    for offset in range(5):
+        if offset:
+            year_salary = year_salary / (1.0 + inflation_rate)
+        total_salary += np.where(offset < salary_years, year_salary, 0.0)
+    average_salary = np.where(salary_years > 0, total_salary / np.maximum(salary_years, 1), 0.0)
+
+    pension = service * average_salary * RRPE_ACCRUAL_RATE * inflate(years - retirement_year)
+    mga = RRPE_MGA_2024 * inflate(years - 2024)
+    reduction = RRPE_REDUCTION_RATE * np.minimum(service, RRPE_MAX_SERVICE_YEARS_FOR_REDUCTION) * \
+        np.minimum(average_salary, mga)
+    pension = np.where(ages >= 65, np.maximum(pension - reduction, 0.0), pension)
+    return np.where(has_retired & (salary_years > 0), pension, 0.0)
+
+
+def _withdraw(shortfall: np.ndarray, balances: np.ndarray, already_withdrawn: np.ndarray,
+              order: np.ndarray) -> np.ndarray:
+    """Cover each path's shortfall from accounts in withdrawal order (greedy, per account)."""
+    withdrawals = np.zeros_like(balances)
+    if not len(order):
+        return withdrawals
+    available = np.maximum(balances[:, order] - already_withdrawn[:, order], 0.0)
+    before = np.cumsum(available, axis=1) - available
+    withdrawals[:, order] = np.clip(shortfall[:, None] - before, 0.0, available)
+    return withdrawals
+
+
+def _cash_flow(income: np.ndarray, total_expenses: float, total_tax: float, balances: np.ndarray,
+               cri_minimums: np.ndarray, order: np.ndarray,
+               is_rrsp: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Withdrawals covering the year's shortfall, iterated like the app so REER
+    withdrawals count towards taxable income. Paths settle independently;
+    a settled path keeps its withdrawals while the others iterate.
+
+    Returns:
+        (withdrawals [paths, accounts], taxable income [paths], uncovered shortfall [paths])
+    """
+    current_income = income.copy()
+    previous_rrsp = np.zeros_like(income)
+    withdrawals = np.zeros_like(balances)
+    uncovered = np.zeros_like(income)
+    settled = np.zeros(len(income), dtype=bool)
+    for _ in range(MAX_CASH_FLOW_ITERATIONS):
+        shortfall = total_expenses + total_tax - current_income
+        settled |= shortfall <= 0
+        pending = ~settled
+        if not pending.any():
+            return withdrawals, current_income, uncovered
+        attempt = _withdraw(shortfall, balances, cri_minimums, order)
+        withdrawals = np.where(pending[:, None], attempt, withdrawals)
+        remaining = shortfall - attempt.sum(axis=1)
+        rrsp = attempt[:, is_rrsp].sum(axis=1)
+        current_income = np.where(pending, income + rrsp, current_income)
+        converged = pending & (np.abs(rrsp - previous_rrsp) < CONVERGENCE_THRESHOLD)
+        uncovered = np.where(converged & (remaining > SHORTFALL_THRESHOLD), remaining, uncovered)
+        settled |= converged
+        previous_rrsp = rrsp
+
+    remaining = total_expenses + total_tax - current_income - withdrawals.sum(axis=1)
+    return withdrawals, current_income, np.where(~settled & (remaining > SHORTFALL_THRESHOLD), remaining, uncovered)
+
+
+def project_assets(project: Project) -> List[Asset]:
+    """Asset id/type list for the Excel generators."""
+    return [Asset(id=asset.id, type=asset.type) for asset in project.assets]
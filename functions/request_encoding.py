@@ -0,0 +1,130 @@
+"""
+Request body decoding.
+Export bodies may be compressed (Content-Encoding: gzip, or zstd when the
+optional zstandard package is installed). Bodies read up front are
+decompressed in one go; streamed bodies are wrapped in a decompressing reader,
+so the JSON parser still reads plain bytes as they arrive. Either way decoding
+stops at MAX_DECODED_BODY_BYTES, so a small compressed body cannot expand
+without bound.
+"""
+
+import gzip
+import io
+import os
+import zlib
+from typing import BinaryIO, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # Optional: without it zstd bodies are refused with 415
+    zstandard = None
+
+
+# Largest decompressed body accepted (compressed bodies only)
+MAX_DECODED_BODY_BYTES = int(os.environ.get('EXPORT_DECODED_MAX_BYTES', 64 * 1024 * 1024))
+
+# Content-Type of the compact columnar payload (see binary_format.py)
+BINARY_CONTENT_TYPE = 'application/vnd.retire1.projection+msgpack'
+
+_DECODE_CHUNK_SIZE = 1024 * 1024
+_DECODE_ERRORS = (OSError, EOFError, zlib.error) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+
+class BodyDecodingError(ValueError):
+    """A request body that cannot be read or decoded, with the HTTP status to answer (400, 413 or 415)."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def supported_encodings() -> List[str]:
+    """Content-Encoding values accepted on export requests."""
+    return ['gzip', 'zstd'] if zstandard is not None else ['gzip']
+
+
+def is_binary_payload(content_type: Optional[str]) -> bool:
+    """Whether a request's Content-Type is the compact columnar format."""
+    return (content_type or '').split(';')[0].strip().lower() == BINARY_CONTENT_TYPE
+
+
+def body_encoding(content_encoding: Optional[str]) -> str:
+    """Normalized body encoding ('' for an uncompressed body)."""
+    codings = [coding.strip().lower() for coding in (content_encoding or '').split(',')]
+    codings = [coding for coding in codings if coding and coding != 'identity']
+    if not codings:
+        return ''
+    if len(codings) > 1 or codings[0] not in ('gzip', 'x-gzip', 'zstd'):
+        raise BodyDecodingError(f'Unsupported Content-Encoding: {content_encoding} '
+                                f'(supported: {", ".join(supported_encodings())})', 415)
+    return 'gzip' if codings[0] == 'x-gzip' else codings[0]
+
+
+def decoding_stream(stream: BinaryIO, content_encoding: Optional[str]) -> BinaryIO:
+    """
+    Wrap a request stream so that reads return the decoded body.
+
+    Uncompressed streams are returned as they are. Reads of the wrapper raise
+    BodyDecodingError for corrupt data (400) and once the decoded body
+    exceeds MAX_DECODED_BODY_BYTES (413).
+
+    Raises:
+        BodyDecodingError: The encoding is not supported (415)
+    """
+    encoding = body_encoding(content_encoding)
+    if not encoding:
+        return stream
+    if encoding == 'gzip':
+        raw = gzip.GzipFile(fileobj=stream, mode='rb')
+    elif zstandard is not None:
+        raw = zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+    else:
+        raise BodyDecodingError('Unsupported Content-Encoding: zstd (install zstandard to enable it)', 415)
+    return _DecodedReader(raw, encoding, MAX_DECODED_BODY_BYTES)
+
+
+def decode_body(body: bytes, content_encoding: Optional[str]) -> bytes:
+    """
+    Decode a request body read up front.
+
+    Returns:
+        The body itself when it is not compressed, else the decompressed bytes
+
+    Raises:
+        BodyDecodingError: Unsupported encoding (415), corrupt data (400) or
+                           a decoded body over MAX_DECODED_BODY_BYTES (413)
+    """
+    reader = decoding_stream(io.BytesIO(body), content_encoding)
+    if not isinstance(reader, _DecodedReader):
+        return body
+    chunks = []
+    while True:
+        chunk = reader.read(_DECODE_CHUNK_SIZE)
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+
+
+class _DecodedReader:
+    """Decompressing reader that turns codec errors into BodyDecodingError and caps the output size."""
+
+    def __init__(self, raw, encoding: str, max_bytes: int):
+        self._raw = raw
+        self._encoding = encoding
+        self._max_bytes = max_bytes
+        self._size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if size == 0:
+            return b''
+        if size < 0:
+            # Never more than one byte past the cap, so oversized bodies are caught
+            size = self._max_bytes - self._size + 1
+        try:
+            chunk = self._raw.read(size)
+        except _DECODE_ERRORS as e:
+            raise BodyDecodingError(f'Invalid {self._encoding} request body: {str(e)}') from e
+        self._size += len(chunk)
+        if self._size > self._max_bytes:
+            raise BodyDecodingError(f'Decoded request body exceeds {self._max_bytes:,} bytes', 413)
+        return chunk
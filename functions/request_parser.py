@@ -0,0 +1,444 @@
+"""
+Streaming parser for export request bodies.
+Walks the JSON event stream with ijson and feeds each projection year straight
+into a ColumnarProjectionBuilder, so the raw request dict is never materialized.
+Requests carrying a project export instead of a projection are projected
+server-side with the projection engine (and optionally simulated over many
+random return paths).
+"""
+
+import math
+from dataclasses import dataclass, field
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+import ijson
+
+from models import Asset
+from columnar import ColumnarProjectionBuilder
+from project_models import Project
+from projection_engine import (
+    calculate_projection, project_assets, projection_length, DEFAULT_INFLATION_RATE, MAX_PROJECTION_YEARS,
+)
+from monte_carlo import run_monte_carlo, DEFAULT_PATHS, MAX_PATHS
+from admission import RequestCost, request_cost
+from worker_pool import get_process_pool
+from tracing import span
+from request_encoding import BodyDecodingError
+
+
+# Default scenario names, matching the previous dict-based handler
+SINGLE_SCENARIO_NAME = 'Projection'
+MULTI_SCENARIO_NAME = 'Scenario'
+
+_SCALAR_EVENTS = ('string', 'number', 'boolean', 'null')
+_SCENARIO_PREFIX = 'scenarios.item'
+_BULK_PREFIX = 'exports.item'
+
+# Most scenarios a comparison export can hold
+MAX_COMPARISON_SCENARIOS = 5
+
+# The C backend rejects integers beyond 64 bits (e.g. runaway balances in long
+# projections); the pure-Python backend parses them as arbitrary-precision ints
+_PYTHON_BACKEND = ijson.get_backend('python')
+
+# Top-level options of a project request: JSON key -> calculate_projection argument
+_PROJECT_OPTIONS = {
+    'scenarioId': 'scenario_id',
+    'startYear': 'start_year',
+    'projectionYears': 'projection_years',
+    'inflationRate': 'inflation_rate',
+    'useConstantDollars': 'use_constant_dollars',
+}
+
+# Numeric project options: calculate_projection argument -> (JSON key, type, minimum, maximum)
+_NUMERIC_PROJECT_OPTIONS = {
+    'start_year': ('startYear', int, None, None),
+    'projection_years': ('projectionYears', int, 1, MAX_PROJECTION_YEARS),
+    'inflation_rate': ('inflationRate', float, None, None),
+}
+
+
+class InvalidFieldError(BodyDecodingError):
+    """A request field whose value cannot be used, answered with 400 like malformed binary columns."""
+
+    def __init__(self, message: str):
+        super().__init__(message, 400)
+
+
+def _number_field(value, field_name: str, kind: type, minimum: Optional[float] = None,
+                  maximum: Optional[float] = None):
+    """
+    A numeric request field converted to kind (int or float).
+
+    Raises:
+        InvalidFieldError: Not a finite number (a whole one for int), or outside [minimum, maximum]
+    """
+    try:
+        if isinstance(value, bool):
+            raise TypeError(value)
+        number = kind(value)
+        if not math.isfinite(number) or (kind is int and number != float(value)):
+            raise ValueError(value)
+    except (TypeError, ValueError, OverflowError):
+        expected = 'an integer' if kind is int else 'a number'
+        raise InvalidFieldError(f'Invalid {field_name}: expected {expected}, got {value!r}') from None
+    if minimum is not None and number < minimum:
+        raise InvalidFieldError(f'Invalid {field_name}: must be at least {minimum}, got {value!r}')
+    if maximum is not None and number > maximum:
+        raise InvalidFieldError(f'Invalid {field_name}: must be at most {maximum}, got {value!r}')
+    return number
+
+
+@dataclass
+class ParsedExportRequest:
+    """Export request parsed into generator-ready scenarios."""
+    is_multi_scenario: bool
+    scenarios: List[Dict] = field(default_factory=list)  # 'projection', 'scenario_name', 'assets'
+
+
+class _ScenarioState:
+    """Accumulates one scenario (projection header, years, name, assets)."""
+
+    def __init__(self):
+        self.builder = ColumnarProjectionBuilder()
+        self.header: Dict = {}
+        self.has_projection = False
+        self.has_years = False
+        self.scenario_name: Optional[str] = None
+        self.assets: List[Asset] = []
+        self.project: Optional[Dict] = None
+        self.project_options: Dict = {}
+        self.scenario_ids: List[str] = []
+        self.monte_carlo: Optional[Dict] = None
+
+    def finish(self, default_name: str) -> Dict:
+        """Build the generator-ready scenario dict."""
+        if not self.has_projection:
+            raise KeyError('projection')
+        if not self.has_years:
+            raise KeyError('years')
+        return {
+            'projection': self.builder.build(self.header),
+            'scenario_name': self.scenario_name if self.scenario_name is not None else default_name,
+            'assets': self.assets,
+        }
+
+
+def parse_export_request(stream: BinaryIO) -> Optional[ParsedExportRequest]:
+    """
+    Parse a single- or multi-scenario export request from a byte stream.
+
+    Returns None when the body is not a non-empty JSON object. Raises
+    ijson.JSONError for malformed JSON, KeyError for missing required fields and
+    InvalidFieldError for unusable option values.
+
+    Buffered (seekable) bodies are parsed with the C backend and parsed again
+    from the start with the pure-Python backend when they hold an integer
+    beyond 64 bits. Streamed bodies cannot be rewound, so they go through the
+    Python backend from the start rather than being kept in memory.
+    """
+    if not (hasattr(stream, 'seekable') and stream.seekable()):
+        return _parse_events(_PYTHON_BACKEND.parse(_ByteReader(stream), use_float=True))
+
+    start = stream.tell()
+    try:
+        return _parse_events(ijson.parse(_ByteReader(stream), use_float=True))
+    except ijson.JSONError as e:
+        if 'integer overflow' not in str(e):
+            raise
+        stream.seek(start)
+        return _parse_events(_PYTHON_BACKEND.parse(_ByteReader(stream), use_float=True))
+
+
+def iter_bulk_requests(stream: BinaryIO, admit: Optional[Callable[[RequestCost], None]] = None
+                       ) -> Iterator[Tuple[Optional[ParsedExportRequest], Optional[str]]]:
+    """
+    Parse the payloads of a bulk request ({"exports": [...]}) one at a time.
+
+    Each item is any body parse_export_request accepts. Items are parsed as
+    the stream is read, so only the payload being parsed is held in memory.
+    A payload that is empty or misses required fields yields (None, error)
+    and parsing carries on with the next one. Raises ijson.JSONError for
+    malformed JSON. The body is parsed with the pure-Python backend, which
+    accepts integers beyond 64 bits: a failed item could not be replayed
+    without buffering the whole body.
+
+    Project payloads are projected (and simulated) as they are parsed; admit,
+    when given, is called with the estimated cost of each one first, so the
+    caller can wait for room. An exception it raises ends the iteration.
+
+    Yields:
+        (parsed request, None) or (None, error message), in request order
+    """
+    events = _PYTHON_BACKEND.parse(_ByteReader(stream), use_float=True)
+    for prefix, event, _ in events:
+        if prefix != _BULK_PREFIX or event != 'start_map':
+            continue
+        try:
+            parsed = _parse_events(_item_events(events), admit)
+        except KeyError as e:
+            # The rest of the item is skipped by the outer loop
+            yield None, f'Missing required field: {str(e)}'
+            continue
+        except InvalidFieldError as e:
+            yield None, str(e)
+            continue
+        if parsed is None:
+            yield None, 'Empty export payload'
+        else:
+            yield parsed, None
+
+
+def _item_events(events):
+    """Events of the bulk item that just started, re-rooted at '' and ending with its end_map."""
+    yield '', 'start_map', None
+    for prefix, event, value in events:
+        if prefix == _BULK_PREFIX:
+            yield '', event, value
+            if event == 'end_map':
+                return
+        else:
+            yield prefix[len(_BULK_PREFIX) + 1:], event, value
+
+
+def _parse_events(events, admit: Optional[Callable[[RequestCost], None]] = None) -> Optional[ParsedExportRequest]:
+    """Build the parsed request from an ijson (prefix, event, value) stream."""
+    single = _ScenarioState()
+    scenarios: List[Dict] = []
+    current: Optional[_ScenarioState] = None
+    is_multi = False
+    top_level_keys = 0
+
+    # Object currently being assembled for a year or asset, and where it goes
+    object_builder: Optional[ijson.ObjectBuilder] = None
+    object_prefix = ''
+    on_complete: Optional[Callable[[Dict], None]] = None
+
+    for prefix, event, value in events:
+        if object_builder is not None:
+            object_builder.event(event, value)
+            if prefix == object_prefix and event == 'end_map':
+                on_complete(object_builder.value)
+                object_builder = None
+            continue
+
+        if prefix == '':
+            if event == 'map_key':
+                top_level_keys += 1
+                if value == 'scenarios':
+                    is_multi = True
+            continue
+
+        # Route events to the scenario they belong to, relative to its root
+        if prefix == 'scenarios' or prefix.startswith(_SCENARIO_PREFIX):
+            if prefix == _SCENARIO_PREFIX and event == 'start_map':
+                current = _ScenarioState()
+                continue
+            if prefix == _SCENARIO_PREFIX and event == 'end_map':
+                scenarios.append(current.finish(MULTI_SCENARIO_NAME))
+                current = None
+                continue
+            if current is None:
+                continue
+            state = current
+            relative = prefix[len(_SCENARIO_PREFIX) + 1:]
+        else:
+            state = single
+            relative = prefix
+
+        if relative == 'projection':
+            if event == 'start_map':
+                state.has_projection = True
+        elif relative == 'projection.years':
+            if event == 'start_array':
+                state.has_years = True
+        elif relative == 'projection.years.item':
+            if event == 'start_map':
+                object_builder, object_prefix, on_complete = _start_object(prefix, state.builder.add_year)
+        elif relative.startswith('projection.') and relative.count('.') == 1:
+            if event in _SCALAR_EVENTS:
+                state.header[relative[len('projection.'):]] = value
+        elif relative == 'scenarioName':
+            if event in _SCALAR_EVENTS:
+                state.scenario_name = value
+        elif relative == 'assets.item':
+            if event == 'start_map':
+                object_builder, object_prefix, on_complete = _start_object(
+                    prefix, lambda data, assets=state.assets: assets.append(Asset.from_dict(data))
+                )
+        elif state is single and relative == 'project':
+            if event == 'start_map':
+                object_builder, object_prefix, on_complete = _start_object(
+                    prefix, lambda data: setattr(single, 'project', data)
+                )
+        elif state is single and relative == 'monteCarlo':
+            if event == 'start_map':
+                object_builder, object_prefix, on_complete = _start_object(
+                    prefix, lambda data: setattr(single, 'monte_carlo', data)
+                )
+            elif event != 'null':
+                got = 'an array' if event == 'start_array' else repr(value)
+                raise InvalidFieldError(f'Invalid monteCarlo: expected an object, got {got}')
+        elif state is single and relative in _PROJECT_OPTIONS:
+            if event in _SCALAR_EVENTS and value is not None:
+                single.project_options[_PROJECT_OPTIONS[relative]] = value
+        elif state is single and relative == 'scenarioIds.item':
+            if event == 'string':
+                single.scenario_ids.append(value)
+
+    if top_level_keys == 0:
+        return None
+
+    if is_multi:
+        return ParsedExportRequest(is_multi_scenario=True, scenarios=scenarios)
+
+    if single.project is not None and not single.has_projection:
+        return _project_request(single, admit)
+
+    parsed = ParsedExportRequest(is_multi_scenario=False)
+    if single.has_projection:
+        parsed.scenarios.append(single.finish(SINGLE_SCENARIO_NAME))
+    return parsed
+
+
+def _project_request(state: _ScenarioState, admit: Optional[Callable[[RequestCost], None]] = None
+                     ) -> ParsedExportRequest:
+    """
+    Project the scenarios of a project export.
+
+    One scenario (scenarioId, default base) gives a single-scenario export;
+    two to MAX_COMPARISON_SCENARIOS scenarioIds give a comparison export.
+    With a monteCarlo object ({"paths", "seed", "volatility", "fanChart"})
+    each scenario is also simulated over random return paths. The scenario
+    count and ids are checked and admit is called with the estimated cost of
+    the export before any projection work.
+    """
+    # Options are checked before any projection work
+    options = dict(state.project_options)
+    for name, (key, kind, minimum, maximum) in _NUMERIC_PROJECT_OPTIONS.items():
+        if name in options:
+            options[name] = _number_field(options[name], key, kind, minimum, maximum)
+    simulation = _monte_carlo_settings(state.monte_carlo) if state.monte_carlo is not None else None
+    scenario_ids = state.scenario_ids or [options.pop('scenario_id', None)]
+    options.pop('scenario_id', None)
+    if len(scenario_ids) > MAX_COMPARISON_SCENARIOS:
+        raise InvalidFieldError(f'Maximum {MAX_COMPARISON_SCENARIOS} scenarios allowed for comparison')
+
+    project = Project.from_dict(state.project)
+    options.setdefault('inflation_rate', DEFAULT_INFLATION_RATE)
+    project_scenarios = [_project_scenario(project, scenario_id) for scenario_id in scenario_ids]
+    assets = project_assets(project)
+    birth_years = {individual.id: individual.birth_year for individual in project.individuals}
+    if admit is not None:
+        years = projection_length(project, options.get('start_year'), options.get('projection_years'))
+        paths = simulation['paths'] if simulation is not None else 0
+        admit(request_cost(len(scenario_ids), years, len(assets), len(project.individuals), paths, 0))
+
+    scenarios = []
+    with span('calculate', scenarios=len(scenario_ids)):
+        for scenario in project_scenarios:
+            scenarios.append({
+                'projection': calculate_projection(project, scenario.id, calculated_at=project.updated_at, **options),
+                'scenario_name': scenario.name,
+                'assets': assets,
+                'birth_years': birth_years,  # Ages of every individual, for the tax check
+            })
+
+    if simulation is not None:
+        simulation_options = {key: value for key, value in options.items() if key != 'use_constant_dollars'}
+        with span('monte_carlo', scenarios=len(scenarios)) as simulation_span:
+            for scenario in scenarios:
+                scenario['monte_carlo'] = run_monte_carlo(
+                    project, scenario['projection'].scenario_id,
+                    paths=simulation['paths'],
+                    seed=simulation['seed'],
+                    volatility=simulation['volatility'],
+                    executor=get_process_pool(),
+                    **simulation_options,
+                )
+                scenario['fan_chart'] = simulation['fan_chart']
+            simulation_span.set(paths=scenarios[0]['monte_carlo'].paths)
+
+    is_multi = len(scenario_ids) > 1
+    if not is_multi and state.scenario_name is not None:
+        scenarios[0]['scenario_name'] = state.scenario_name
+    return ParsedExportRequest(is_multi_scenario=is_multi, scenarios=scenarios)
+
+
+def _project_scenario(project: Project, scenario_id: Optional[str]):
+    """
+    A scenario of the project by id (the base scenario for None).
+
+    Raises:
+        InvalidFieldError: No scenario has this id
+        KeyError: No id given and the project has no base scenario
+    """
+    try:
+        return project.scenario(scenario_id)
+    except KeyError:
+        if scenario_id is None:
+            raise
+        raise InvalidFieldError(f'Unknown scenarioId: {scenario_id}') from None
+
+
+def export_request_cost(export_request: ParsedExportRequest) -> RequestCost:
+    """
+    Admission cost of a parsed export request.
+
+    Dimensions come from the projections (the largest scenario counts for all
+    of them) and any Monte Carlo results; the body size is not known here.
+    """
+    years = accounts = individuals = paths = 0
+    for scenario in export_request.scenarios:
+        projection = scenario['projection']
+        years = max(years, projection.num_years)
+        accounts = max(accounts, len(projection.account_ids))
+        individuals = max(individuals, len(projection.individual_ids))
+        if scenario.get('monte_carlo') is not None:
+            paths = max(paths, scenario['monte_carlo'].paths)
+    return request_cost(max(1, len(export_request.scenarios)), years, accounts, max(1, individuals), paths, 0)
+
+
+def _monte_carlo_settings(settings: Dict) -> Dict:
+    """
+    Checked paths, seed, volatility and fanChart of a monteCarlo object.
+
+    Raises:
+        InvalidFieldError: A value that is not a usable number (or a boolean, for fanChart)
+    """
+    volatility = settings.get('volatility') or {}
+    if not isinstance(volatility, dict):
+        raise InvalidFieldError('Invalid monteCarlo.volatility: expected an object of account type -> volatility')
+    fan_chart = settings.get('fanChart', True)
+    if not isinstance(fan_chart, bool):
+        raise InvalidFieldError(f'Invalid monteCarlo.fanChart: expected true or false, got {fan_chart!r}')
+    return {
+        'paths': _number_field(settings.get('paths', DEFAULT_PATHS), 'monteCarlo.paths', int, 1, MAX_PATHS),
+        'seed': _number_field(settings.get('seed') or 0, 'monteCarlo.seed', int, 0),
+        'volatility': {asset_type: _number_field(value, f'monteCarlo.volatility.{asset_type}', float, 0)
+                       for asset_type, value in volatility.items()},
+        'fan_chart': fan_chart,
+    }
+
+
+class _ByteReader:
+    """
+    Minimal reader over a request stream.
+
+    ijson probes the stream with read(0), which werkzeug's LimitedStream treats
+    as a client disconnect, so zero-length reads are answered locally.
+    """
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+
+    def read(self, size: int = -1) -> bytes:
+        if size == 0:
+            return b''
+        return self._stream.read(size)
+
+
+def _start_object(prefix: str, on_complete: Callable[[Dict], None]):
+    """Begin assembling the object that starts at prefix."""
+    object_builder = ijson.ObjectBuilder()
+    object_builder.event('start_map', None)
+    return object_builder, prefix, on_complete
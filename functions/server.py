@@ -0,0 +1,273 @@
+"""
+Self-hosted server for the export functions.
+Serves the Cloud Function handlers of main.py (generate_projection_excel,
+generate_projection_excel_bulk, export_job_status) from one WSGI app, outside
+Firebase. Under gunicorn each worker is a process with a few threads, so CPU
+bound workbook builds scale across cores while threads keep connections
+alive and wait on uploads. The app adds a /healthz endpoint and a request
+body size limit. On SIGTERM a worker drains: /healthz turns 503, in-flight
+requests and queued async jobs finish (up to the drain timeout) and the
+shared process pool is shut down.
+
+Usage (from the functions/ directory):
+    python server.py                                  # one worker per core, port 8080
+    python server.py --port 9000 --workers 4 --threads 8
+    gunicorn -c server.py -k gthread --threads 4 'server:create_app()'   # same hooks, gunicorn's own CLI
+
+Any WSGI server can host create_app(); draining and the per-worker pre-warm
+come from the gunicorn hooks below.
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+from request_encoding import BodyDecodingError
+
+
+# Server workers are the process pool: one build per worker rather than a pool
+# in each. Set on import, before main is loaded, so every way of running the
+# app (python server.py, gunicorn -c server.py, another WSGI server) gets it.
+os.environ.setdefault('EXPORT_WORKERS', '1')
+
+# The server keeps its CPU between requests and clients poll the instance that
+# took the job, so async jobs can use the local result store (off on Cloud Functions)
+os.environ.setdefault('EXPORT_JOB_STORE', 'local')
+
+# URL path -> handler in main.py (the Cloud Function names)
+ROUTES = {
+    '/generate_projection_excel': 'generate_projection_excel',
+    '/generate_projection_excel_bulk': 'generate_projection_excel_bulk',
+    '/export_job_status': 'export_job_status',
+}
+
+HEALTH_PATH = '/healthz'
+
+
+@dataclass
+class ServerConfig:
+    """Listening address, worker pool and limits of the self-hosted server."""
+    host: str = '0.0.0.0'
+    port: int = 8080
+    workers: int = 1             # processes
+    threads: int = 4             # threads per process
+    keepalive: int = 5           # seconds an idle keep-alive connection stays open
+    timeout: int = 120           # seconds a request may run before its worker is restarted
+    drain_seconds: int = 30      # seconds a stopping worker has to finish its requests
+    max_body_bytes: int = 64 * 1024 * 1024
+
+
+def create_server_config_from_env() -> ServerConfig:
+    """
+    Build the server configuration from environment variables.
+
+    EXPORT_SERVER_HOST            Listening address (default 0.0.0.0)
+    EXPORT_SERVER_PORT            Listening port (default $PORT or 8080)
+    EXPORT_SERVER_WORKERS         Worker processes (default: CPU count)
+    EXPORT_SERVER_THREADS         Threads per worker (default 4)
+    EXPORT_SERVER_KEEPALIVE       Keep-alive idle timeout in seconds (default 5)
+    EXPORT_SERVER_TIMEOUT         Longest request in seconds before the worker is restarted (default 120)
+    EXPORT_SERVER_DRAIN_SECONDS   Time a stopping worker has to finish its requests (default 30)
+    EXPORT_SERVER_MAX_BODY_BYTES  Largest request body (default 64 MB)
+    """
+    return ServerConfig(
+        host=os.environ.get('EXPORT_SERVER_HOST', '0.0.0.0'),
+        port=int(os.environ.get('EXPORT_SERVER_PORT', os.environ.get('PORT', 8080))),
+        workers=max(1, int(os.environ.get('EXPORT_SERVER_WORKERS', os.cpu_count() or 1))),
+        threads=max(1, int(os.environ.get('EXPORT_SERVER_THREADS', 4))),
+        keepalive=int(os.environ.get('EXPORT_SERVER_KEEPALIVE', 5)),
+        timeout=int(os.environ.get('EXPORT_SERVER_TIMEOUT', 120)),
+        drain_seconds=int(os.environ.get('EXPORT_SERVER_DRAIN_SECONDS', 30)),
+        max_body_bytes=int(os.environ.get('EXPORT_SERVER_MAX_BODY_BYTES', 64 * 1024 * 1024)),
+    )
+
+
+class ExportServerApp:
+    """WSGI app routing requests to the main.py handlers, with health checks and a body size limit."""
+
+    def __init__(self, max_body_bytes: int):
+        self.max_body_bytes = max_body_bytes
+        self.draining = False
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+        # Counters reported by /healthz
+        self.in_flight = 0
+        self.served = 0
+
+    def __call__(self, environ: Dict, start_response: Callable) -> Iterable[bytes]:
+        path = environ.get('PATH_INFO', '').rstrip('/')
+        if path == HEALTH_PATH:
+            return self._health(start_response)
+
+        name = ROUTES.get(path)
+        if name is None:
+            return _json(start_response, 404, {'error': f'Unknown path: {path or "/"}'})
+        if self.draining:
+            return _json(start_response, 503, {'error': 'Server is shutting down, retry on another instance'},
+                         [('Connection', 'close'), ('Retry-After', '1')])
+
+        content_length = environ.get('CONTENT_LENGTH')
+        if content_length and content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            return _json(start_response, 413,
+                         {'error': f'Request body exceeds {self.max_body_bytes:,} bytes'}, [('Connection', 'close')])
+        if not content_length:
+            # Chunked upload: the size is only known as it is read
+            environ['wsgi.input'] = _LimitedInput(environ['wsgi.input'], self.max_body_bytes)
+
+        # Handlers load with the first request, after the worker has forked
+        import main
+        from firebase_functions import https_fn
+
+        with self._lock:
+            self.in_flight += 1
+        try:
+            response = getattr(main, name)(https_fn.Request(environ))
+        except BaseException:
+            self._finished()
+            raise
+        # Streamed responses count as in flight until the server has sent them
+        response.call_on_close(self._finished)
+        return response(environ, start_response)
+
+    def start_draining(self):
+        """Refuse new exports and report 503 on /healthz; in-flight requests carry on."""
+        self.draining = True
+
+    def _finished(self):
+        with self._lock:
+            self.in_flight -= 1
+            self.served += 1
+
+    def _health(self, start_response: Callable) -> Iterable[bytes]:
+        with self._lock:
+            payload = {
+                'status': 'draining' if self.draining else 'ok',
+                'pid': os.getpid(),
+                'in_flight': self.in_flight,
+                'served': self.served,
+                'uptime_seconds': round(time.time() - self.started_at, 1),
+            }
+        return _json(start_response, 503 if self.draining else 200, payload)
+
+
+class _LimitedInput:
+    """Request input that fails once more than max_bytes have been read."""
+
+    def __init__(self, stream, max_bytes: int):
+        self._stream = stream
+        self._max_bytes = max_bytes
+        self._size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        return self._count(self._stream.read(size))
+
+    def readline(self, size: int = -1) -> bytes:
+        return self._count(self._stream.readline(size))
+
+    def _count(self, chunk: bytes) -> bytes:
+        self._size += len(chunk)
+        if self._size > self._max_bytes:
+            raise BodyDecodingError(f'Request body exceeds {self._max_bytes:,} bytes', 413)
+        return chunk
+
+
+def _json(start_response: Callable, status: int, payload: Dict, headers: Optional[List] = None) -> List[bytes]:
+    """Plain WSGI JSON response (health checks and requests refused before any handler runs)."""
+    body = json.dumps(payload).encode()
+    reasons = {200: 'OK', 404: 'Not Found', 413: 'Payload Too Large', 503: 'Service Unavailable'}
+    start_response(f'{status} {reasons[status]}', [
+        ('Content-Type', 'application/json'),
+        ('Content-Length', str(len(body))),
+        *(headers or []),
+    ])
+    return [body]
+
+
+def create_app(config: Optional[ServerConfig] = None) -> ExportServerApp:
+    """WSGI app for the export handlers."""
+    config = config or create_server_config_from_env()
+    return ExportServerApp(config.max_body_bytes)
+
+
+# gunicorn server hooks (also read by 'gunicorn -c server.py')
+
+def post_worker_init(worker):
+    """Drain on SIGTERM and pre-warm the export stack as soon as the worker is up."""
+    from prewarm import prewarm
+
+    app = worker.wsgi
+    stop = signal.getsignal(signal.SIGTERM)
+
+    def drain(signum, frame):
+        if isinstance(app, ExportServerApp):
+            app.start_draining()
+        stop(signum, frame)
+
+    signal.signal(signal.SIGTERM, drain)
+    prewarm()
+
+
+def worker_exit(server, worker):
+    """Let queued async jobs finish and stop the process pool before the worker exits."""
+    if 'main' in sys.modules and sys.modules['main'].export_jobs is not None:
+        sys.modules['main'].export_jobs.shutdown(wait=True)
+    from worker_pool import shutdown_process_pool
+    shutdown_process_pool(wait=True)
+
+
+def gunicorn_options(config: ServerConfig) -> Dict:
+    """gunicorn settings for a configuration (threaded workers, keep-alive, drain timeout)."""
+    return {
+        'bind': f'{config.host}:{config.port}',
+        'workers': config.workers,
+        'worker_class': 'gthread',
+        'threads': config.threads,
+        'keepalive': config.keepalive,
+        'timeout': config.timeout,
+        'graceful_timeout': config.drain_seconds,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+    }
+
+
+def serve(config: ServerConfig) -> int:
+    """Run the app under gunicorn until it is stopped (SIGTERM drains, SIGINT stops)."""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print('The self-hosted server needs gunicorn (pip install gunicorn)', file=sys.stderr)
+        return 1
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in gunicorn_options(config).items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return create_app(config)
+
+    Application().run()
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    config = create_server_config_from_env()
+    parser = argparse.ArgumentParser(description='Run the export functions as a standalone server')
+    parser.add_argument('--host', default=config.host)
+    parser.add_argument('--port', type=int, default=config.port)
+    parser.add_argument('--workers', type=int, default=config.workers, help='Worker processes')
+    parser.add_argument('--threads', type=int, default=config.threads, help='Threads per worker')
+    args = parser.parse_args(argv)
+    config.host, config.port, config.workers, config.threads = args.host, args.port, args.workers, args.threads
+    return serve(config)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""
+Declarative column schemas for the projection sheets.
+Each column is described once (header, group, width, outline level, value
+extractor), and the sheet builders and chart ranges are all derived from the
+same list, so adding or reordering a column is a one-line change.
+"""
+
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+from columnar import ColumnarProjection
+from aggregates import ProjectionAggregates
+
+
+# Column kinds for data cells: (value kind, is_total)
+INTEGER = ('integer', False)
+CURRENCY = ('currency', False)
+CURRENCY_TOTAL = ('currency', True)
+PERCENT = ('percent', False)
+
+# Column widths (16.5 chars = 114 pixels, shared by every currency column)
+YEAR_WIDTH = 7
+AGE_WIDTH = 8
+CURRENCY_WIDTH = 16.5
+PERCENT_WIDTH = 12
+
+
+@dataclass(frozen=True)
+class ColumnSpec:
+    """One worksheet column: layout, formatting and where its values come from."""
+    id: str
+    header: str
+    kind: Tuple[str, bool]  # (value kind, is_total), see INTEGER / CURRENCY / CURRENCY_TOTAL / PERCENT
+    # (sheet data source, aggregates) -> whole column, one value per year; the
+    # source is the ColumnarProjection, or the MonteCarloResult for that sheet
+    extract: Callable[[object, ProjectionAggregates], List]
+    width: float = CURRENCY_WIDTH
+    header_format: str = 'header'  # format name for the column header cell
+    group: Optional[str] = None    # merged group header above consecutive columns
+    outline_level: int = 0         # 1 = collapsible detail column, hidden by default
+    is_key: bool = False           # Year/Ages: frozen, header spans both header rows
+
+    @property
+    def is_total(self) -> bool:
+        """Whether cells use the emphasized total format."""
+        return self.kind[1]
+
+
+# Value extractors. Module-level functions bound with partial, so schemas stay
+# picklable and each one pulls a whole column with a single call.
+
+def _metric(name: str, projection: ColumnarProjection, aggregates: ProjectionAggregates) -> List:
+    return projection.column(name)
+
+
+def _age(name: str, projection: ColumnarProjection, aggregates: ProjectionAggregates) -> List:
+    return [age or None for age in projection.column(name)]
+
+
+def _shortfall(projection: ColumnarProjection, aggregates: ProjectionAggregates) -> List:
+    return [amount if flag else None for amount, flag in
+            zip(projection.column('shortfall_amount'), projection.column('has_shortfall'))]
+
+
+def _aggregate(attribute: str, key: str, projection: ColumnarProjection,
+               aggregates: ProjectionAggregates) -> List:
+    return getattr(aggregates, attribute)[key]
+
+
+def _total_returns(projection: ColumnarProjection, aggregates: ProjectionAggregates) -> List:
+    return aggregates.total_returns
+
+
+def _band(idx: int, result, aggregates: ProjectionAggregates) -> List:
+    return result.net_worth_bands[idx].tolist()
+
+
+def _band_width(idx: int, result, aggregates: ProjectionAggregates) -> List:
+    if idx == 0:
+        return result.net_worth_bands[0].tolist()
+    return (result.net_worth_bands[idx] - result.net_worth_bands[idx - 1]).tolist()
+
+
+def _key_columns(has_couples: bool, header_format: str) -> List[ColumnSpec]:
+    """Year and age columns leading every projection sheet."""
+    columns = [
+        ColumnSpec('year', 'Year', INTEGER, partial(_metric, 'year'), YEAR_WIDTH, header_format, is_key=True),
+        ColumnSpec('primary_age', 'Age 1', INTEGER, partial(_age, 'primary_age'), AGE_WIDTH, header_format,
+                   is_key=True),
+    ]
+    if has_couples:
+        columns.append(ColumnSpec('spouse_age', 'Age 2', INTEGER, partial(_age, 'spouse_age'), AGE_WIDTH,
+                                  header_format, is_key=True))
+    return columns
+
+
+def _metric_column(name: str, header: str, kind: Tuple[str, bool] = CURRENCY_TOTAL,
+                   header_format: str = 'header_group') -> ColumnSpec:
+    """Column read straight from a per-year projection metric."""
+    return ColumnSpec(name, header, kind, partial(_metric, name), header_format=header_format)
+
+
+def _detail_columns(group: str, attribute: str, entries: List[Tuple[str, str]]) -> List[ColumnSpec]:
+    """Collapsible per-type columns read from a ProjectionAggregates mapping."""
+    return [
+        ColumnSpec(f'{attribute}.{key}', header, CURRENCY, partial(_aggregate, attribute, key),
+                   group=group, outline_level=1)
+        for key, header in entries
+    ]
+
+
+def base_projection_columns(has_couples: bool) -> List[ColumnSpec]:
+    """Columns of the simplified 'Base Projection' sheet."""
+    columns = _key_columns(has_couples, 'header_group')
+    columns.extend(
+        _metric_column(name, header, CURRENCY)
+        for name, header in (
+            ('total_income', 'Total Income'),
+            ('total_expenses', 'Total Expenses'),
+            ('total_tax', 'Total Tax'),
+            ('after_tax_income', 'After-Tax Income'),
+            ('net_cash_flow', 'Net Cash Flow'),
+            ('total_withdrawals', 'Total Withdrawals'),
+            ('total_contributions', 'Total Contributions'),
+            ('net_worth_start_of_year', 'Net Worth (Start)'),
+            ('net_worth_end_of_year', 'Net Worth (End)'),
+        )
+    )
+    columns.append(ColumnSpec('shortfall_amount', 'Shortfall Amount', CURRENCY, _shortfall,
+                              header_format='header_group'))
+    return columns
+
+
+def detailed_projection_columns(has_couples: bool) -> List[ColumnSpec]:
+    """
+    Columns of the 'Detailed Projection' sheet.
+
+    Each group's detail columns collapse into an outline, with the group's
+    total column (outline level 0) following it to break the grouping.
+    """
+    columns = _key_columns(has_couples, 'header')
+
+    # Income sources (totals from all individuals)
+    columns += _detail_columns('Income Sources', 'income_by_source', [
+        ('employment', 'Employment Income'),
+        ('rrq', 'RRQ Income'),
+        ('psv', 'PSV Income'),
+        ('rrpe', 'RRPE Income'),
+        ('other', 'Other Income'),
+    ])
+    columns.append(_metric_column('total_income', 'Total Income'))
+
+    # Expenses by category
+    columns += _detail_columns('Expenses', 'expenses_by_category', [
+        ('housing', 'Housing Expenses'),
+        ('transport', 'Transport Expenses'),
+        ('dailyLiving', 'Daily Living Expenses'),
+        ('recreation', 'Recreation Expenses'),
+        ('health', 'Health Expenses'),
+        ('family', 'Family Expenses'),
+    ])
+    columns.append(_metric_column('total_expenses', 'Total Expenses'))
+
+    # Taxes
+    columns += [
+        ColumnSpec('federal_tax', 'Federal Tax', CURRENCY, partial(_metric, 'federal_tax'),
+                   group='Taxes', outline_level=1),
+        ColumnSpec('quebec_tax', 'Quebec Tax', CURRENCY, partial(_metric, 'quebec_tax'),
+                   group='Taxes', outline_level=1),
+    ]
+    columns.append(_metric_column('total_tax', 'Total Tax'))
+
+    # Cash flow
+    columns.append(_metric_column('after_tax_income', 'After-Tax Income'))
+    columns.append(_metric_column('net_cash_flow', 'Net Cash Flow', header_format='header'))
+
+    # Withdrawals by account type
+    columns += _detail_columns('Withdrawals', 'withdrawals_by_type', [
+        ('celi', 'CELI Withdrawals'),
+        ('cash', 'Cash Withdrawals'),
+        ('cri', 'CRI Withdrawals'),
+        ('rrsp', 'REER Withdrawals'),
+    ])
+    columns.append(_metric_column('total_withdrawals', 'Total Withdrawals'))
+
+    # Contributions by account type
+    columns += _detail_columns('Contributions', 'contributions_by_type', [
+        ('celi', 'CELI Contributions'),
+        ('cash', 'Cash Contributions'),
+    ])
+    columns.append(_metric_column('total_contributions', 'Total Contributions'))
+
+    # Asset balances by type
+    columns += _detail_columns('Asset Balances', 'balances_by_type', [
+        ('realEstate', 'Real Estate Balance'),
+        ('rrsp', 'REER Balance'),
+        ('celi', 'CELI Balance'),
+        ('cri', 'CRI Balance'),
+        ('cash', 'Cash Balance'),
+    ])
+    columns.append(ColumnSpec('total_returns', 'Total Asset Returns', CURRENCY_TOTAL, _total_returns,
+                              header_format='header_group'))
+
+    # Net worth
+    columns.append(_metric_column('net_worth_start_of_year', 'Net Worth (Start)'))
+    columns.append(_metric_column('net_worth_end_of_year', 'Net Worth (End)'))
+
+    # Warnings
+    columns.append(ColumnSpec('shortfall_amount', 'Shortfall Amount', CURRENCY_TOTAL, _shortfall))
+    return columns
+
+
+def monte_carlo_columns(percentiles: List[int]) -> List[ColumnSpec]:
+    """
+    Columns of the 'Monte Carlo' sheet: net worth percentiles and shortfall
+    odds per year, followed by hidden band widths that the fan chart stacks.
+    """
+    columns = [
+        ColumnSpec('year', 'Year', INTEGER, partial(_metric, 'year'), YEAR_WIDTH, is_key=True),
+        ColumnSpec('primary_age', 'Age 1', INTEGER, partial(_age, 'primary_age'), AGE_WIDTH, is_key=True),
+    ]
+    columns += [
+        ColumnSpec(f'net_worth_p{percentile}', 'Median Net Worth' if percentile == 50 else f'P{percentile} Net Worth',
+                   CURRENCY_TOTAL if percentile == 50 else CURRENCY, partial(_band, idx))
+        for idx, percentile in enumerate(percentiles)
+    ]
+    columns += [
+        ColumnSpec('shortfall_probability', 'Shortfall Probability', PERCENT,
+                   partial(_metric, 'shortfall_probability'), PERCENT_WIDTH),
+        ColumnSpec('expected_shortfall', 'Expected Shortfall', CURRENCY, partial(_metric, 'expected_shortfall')),
+    ]
+    columns += [
+        ColumnSpec(f'band_p{percentile}', f'P{percentiles[idx - 1]}-P{percentile} Band' if idx else
+                   f'P{percentile} Base', CURRENCY, partial(_band_width, idx), group='Fan Chart Bands',
+                   outline_level=1)
+        for idx, percentile in enumerate(percentiles)
+    ]
+    return columns
+
+
+def column_index(columns: List[ColumnSpec]) -> Dict[str, int]:
+    """Map column id -> 0-based column number."""
+    return {spec.id: idx for idx, spec in enumerate(columns)}
+
+
+def group_spans(columns: List[ColumnSpec]) -> List[Tuple[int, int, str]]:
+    """(first, last, label) for each run of consecutive columns sharing a group."""
+    spans = []
+    for idx, spec in enumerate(columns):
+        if spec.group is None:
+            continue
+        if spans and spans[-1][1] == idx - 1 and spans[-1][2] == spec.group:
+            spans[-1] = (spans[-1][0], idx, spec.group)
+        else:
+            spans.append((idx, idx, spec.group))
+    return spans
+
+
+def col_letter(col_num: int) -> str:
+    """Convert 0-based column number to Excel letter (A, B, C...)."""
+    result = ''
+    while col_num >= 0:
+        result = chr(65 + (col_num % 26)) + result
+        col_num = col_num // 26 - 1
+    return result
@@ -0,0 +1,190 @@
+"""
+Federal and Quebec income tax.
+The 2025 bracket tables and credits (tax_constants.dart) are compiled once at
+import into sorted threshold arrays with the tax owed at each threshold, so
+tax on any array of incomes is a searchsorted lookup plus one multiply-add.
+Whole [years, individuals, scenarios] blocks are taxed in a single call.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import numpy as np
+
+from columnar import ColumnarProjection
+
+
+# Year the tables below apply to (indexation factors are relative to it)
+TAX_YEAR = 2025
+
+# Age from which the age amount is added to the credits
+AGE_CREDIT_AGE = 65
+
+# Largest per-year difference (in dollars) accepted when cross-checking client taxes
+TAX_CHECK_TOLERANCE = 1.0
+
+
+@dataclass(frozen=True)
+class TaxSchedule:
+    """One jurisdiction's brackets and non-refundable credits, compiled for lookup."""
+    name: str
+    thresholds: np.ndarray  # float64 [brackets], sorted lower bounds starting at 0
+    rates: np.ndarray       # float64 [brackets], marginal rate of each bracket
+    base_tax: np.ndarray    # float64 [brackets], tax owed on income up to each threshold
+    basic_amount: float     # basic personal amount
+    age_amount: float       # added from AGE_CREDIT_AGE
+    credit_rate: float      # credits are amounts times this (lowest) rate
+
+    @classmethod
+    def compile(cls, name: str, brackets: Sequence[Tuple[float, float]], basic_amount: float,
+                age_amount: float, credit_rate: float) -> 'TaxSchedule':
+        """
+        Build a schedule from (threshold, rate) brackets.
+
+        Args:
+            name: Jurisdiction name
+            brackets: (lower bound, marginal rate) pairs, the first starting at 0
+            basic_amount: Basic personal amount
+            age_amount: Age amount for AGE_CREDIT_AGE and over
+            credit_rate: Rate applied to credit amounts
+        """
+        brackets = sorted(brackets)
+        thresholds = np.array([threshold for threshold, _ in brackets], dtype=np.float64)
+        rates = np.array([rate for _, rate in brackets], dtype=np.float64)
+        if not len(thresholds) or thresholds[0] != 0.0:
+            raise ValueError(f'{name} brackets must start at 0')
+        base_tax = np.concatenate(([0.0], np.cumsum(np.diff(thresholds) * rates[:-1])))
+        return cls(name, thresholds, rates, base_tax, basic_amount, age_amount, credit_rate)
+
+    def tax_before_credits(self, income: np.ndarray) -> np.ndarray:
+        """Progressive tax on an array of incomes (any shape)."""
+        income = np.asarray(income, dtype=np.float64)
+        bracket = np.maximum(np.searchsorted(self.thresholds, income, side='right') - 1, 0)
+        tax = self.base_tax[bracket] + (income - self.thresholds[bracket]) * self.rates[bracket]
+        return np.where(income > 0, tax, 0.0)
+
+    def tax(self, income: np.ndarray, ages: np.ndarray,
+            indexation: Union[float, np.ndarray] = 1.0) -> np.ndarray:
+        """
+        Tax owed after credits.
+
+        Indexing every threshold and credit by a factor f taxes income x like
+        the base tables tax x / f, scaled back by f, so indexed years reuse the
+        same compiled arrays.
+
+        Args:
+            income: Taxable income (any shape)
+            ages: Ages, broadcastable against income
+            indexation: Threshold/credit factors, broadcastable against income
+
+        Returns:
+            Tax owed, zero where income <= 0
+        """
+        income = np.asarray(income, dtype=np.float64)
+        credits = (self.basic_amount + np.where(np.asarray(ages) >= AGE_CREDIT_AGE, self.age_amount, 0.0)) * \
+            self.credit_rate
+        tax = np.maximum(self.tax_before_credits(income / indexation) - credits, 0.0) * indexation
+        return np.where(income > 0, tax, 0.0)
+
+
+# 2025 tables (tax_constants.dart)
+FEDERAL = TaxSchedule.compile(
+    'federal',
+    [(0.0, 0.15), (55867.0, 0.205), (111733.0, 0.26), (173205.0, 0.29), (246752.0, 0.33)],
+    basic_amount=15705.0, age_amount=8790.0, credit_rate=0.15,
+)
+QUEBEC = TaxSchedule.compile(
+    'quebec',
+    [(0.0, 0.14), (51780.0, 0.19), (103545.0, 0.24), (126000.0, 0.2575)],
+    basic_amount=18056.0, age_amount=3458.0, credit_rate=0.14,
+)
+
+
+def indexation_factors(years: np.ndarray, indexation_rate: float = 0.0, base_year: int = TAX_YEAR) -> np.ndarray:
+    """
+    Factor each year's thresholds and credits are indexed by, relative to base_year.
+
+    The app keeps the 2025 tables for every year, which is indexation_rate=0.
+    """
+    years = np.asarray(years)
+    return (1.0 + indexation_rate) ** (years - base_year).astype(np.float64)
+
+
+def income_tax(income: np.ndarray, ages: np.ndarray,
+               indexation: Union[float, np.ndarray] = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Federal and Quebec tax for arrays of individual incomes.
+
+    Args:
+        income: Taxable income per individual, e.g. [years, individuals] or
+                [years, individuals, scenarios]
+        ages: Ages broadcastable against income
+        indexation: Factors from indexation_factors(), broadcastable against income
+
+    Returns:
+        (federal, quebec) arrays shaped like income
+    """
+    return FEDERAL.tax(income, ages, indexation), QUEBEC.tax(income, ages, indexation)
+
+
+@dataclass
+class TaxCheck:
+    """Client-sent household taxes compared with a recomputation."""
+    years_checked: int
+    mismatched_years: List[int]
+    max_difference: float  # largest absolute per-year difference, federal or Quebec
+    unchecked_years: List[int] = field(default_factory=list)  # an individual with income has no known age
+
+    @property
+    def ok(self) -> bool:
+        """Whether every year is within tolerance."""
+        return not self.mismatched_years
+
+
+def check_projection_taxes(projection: ColumnarProjection, indexation_rate: float = 0.0,
+                           tolerance: float = TAX_CHECK_TOLERANCE,
+                           birth_years: Optional[Dict[str, int]] = None) -> TaxCheck:
+    """
+    Recompute each year's federal and Quebec tax from the per-individual
+    income and ages of a projection, and compare with the values it carries.
+
+    Args:
+        projection: Projection with per-individual income and the client's taxes
+        indexation_rate: Yearly indexation of thresholds and credits
+        tolerance: Largest per-year difference (dollars) still counted as a match
+        birth_years: Individual id -> birth year, when known (project exports).
+                     Otherwise individuals are matched to ages in order
+                     (primary, then spouse), the way the app builds
+                     incomeByIndividual, and any further individual has no age.
+
+    Returns:
+        TaxCheck. Years where an individual with income has no known age
+        cannot be recomputed; they are listed as unchecked, not as mismatches.
+    """
+    num_years = projection.num_years
+    num_individuals = projection.income.shape[1]
+    if not num_years:
+        return TaxCheck(0, [], 0.0)
+
+    ages = np.full((num_years, num_individuals), np.nan)
+    if birth_years is not None:
+        for idx, individual_id in enumerate(projection.individual_ids):
+            if individual_id in birth_years:
+                ages[:, idx] = projection.year - birth_years[individual_id]
+    else:
+        for idx, column in enumerate((projection.primary_age, projection.spouse_age)[:num_individuals]):
+            ages[:, idx] = column
+    income = projection.income.sum(axis=2)
+    indexation = indexation_factors(projection.year, indexation_rate)[:, None]
+    federal, quebec = income_tax(income, np.nan_to_num(ages), indexation)
+
+    checked = ~(np.isnan(ages) & (income != 0)).any(axis=1)
+    difference = np.maximum(np.abs(federal.sum(axis=1) - projection.metrics['federal_tax']),
+                            np.abs(quebec.sum(axis=1) - projection.metrics['quebec_tax']))
+    difference = np.where(checked, difference, 0.0)
+    mismatched = difference > tolerance
+    return TaxCheck(
+        years_checked=int(checked.sum()),
+        mismatched_years=projection.year[mismatched].tolist(),
+        max_difference=float(difference.max()),
+        unchecked_years=projection.year[~checked].tolist(),
+    )
@@ -0,0 +1,148 @@
+"""
+Lightweight tracing for the export hot path.
+Nested timing spans are emitted as one structured JSON log line each when they
+finish (Cloud Logging parses JSON written to stdout). Outside a sampled trace,
+span() hands back a shared no-op object, so instrumented code pays only a
+context-variable lookup.
+"""
+
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+
+def _sample_rate_from_env() -> float:
+    """
+    EXPORT_TRACING: '1'/'true' traces every request, a number in [0, 1] traces
+    that fraction of requests, unset or '0' disables tracing.
+    """
+    value = os.environ.get('EXPORT_TRACING', '').strip().lower()
+    if value in ('', '0', 'false', 'off'):
+        return 0.0
+    if value in ('1', 'true', 'on'):
+        return 1.0
+    try:
+        return min(1.0, max(0.0, float(value)))
+    except ValueError:
+        return 0.0
+
+
+TRACE_SAMPLE_RATE = _sample_rate_from_env()
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('export_trace_span', default=None)
+
+
+def emit_json(record: Dict):
+    """Default sink: one JSON object per line on stdout."""
+    # A single write keeps lines whole when concurrent requests log at once
+    sys.stdout.write(json.dumps(record, default=str) + '\n')
+
+
+class _NoopSpan:
+    """Stand-in returned when tracing is off; every method does nothing."""
+    recording = False
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Trace:
+    """State shared by all spans of one trace."""
+
+    def __init__(self, trace_id: str, emit: Callable[[Dict], None]):
+        self.trace_id = trace_id
+        self.emit = emit
+        self.next_span_id = 0
+
+
+class Span:
+    """A timed, named section of work with structured attributes."""
+    recording = True
+
+    def __init__(self, trace: _Trace, name: str, parent: Optional['Span'], attributes: Dict):
+        trace.next_span_id += 1
+        self.trace = trace
+        self.name = name
+        self.span_id = trace.next_span_id
+        self.parent_id = parent.span_id if parent is not None else None
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.attributes = attributes
+        self._start = 0.0
+        self._token = None
+
+    def set(self, **attributes):
+        """Attach attributes (row/cell counts, bytes, ...) to the span record."""
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> 'Span':
+        self._token = _current_span.set(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self._start) * 1000
+        _current_span.reset(self._token)
+
+        record = {
+            'severity': 'ERROR' if exc_type is not None else 'INFO',
+            'message': f'span {self.name} {duration_ms:.1f}ms',
+            'trace_id': self.trace.trace_id,
+            'span': self.name,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'depth': self.depth,
+            'duration_ms': round(duration_ms, 3),
+        }
+        record.update(self.attributes)
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+        self.trace.emit(record)
+        return False
+
+
+def start_trace(name: str, trace_id: Optional[str] = None, emit: Callable[[Dict], None] = emit_json,
+                sample_rate: Optional[float] = None, **attributes):
+    """
+    Open the root span of a new trace, subject to sampling.
+
+    Args:
+        name: Root span name (e.g. 'export')
+        trace_id: Correlation id (defaults to a random id)
+        emit: Sink receiving each finished span record
+        sample_rate: Overrides EXPORT_TRACING for this trace
+
+    Returns:
+        A Span to use as a context manager, or a no-op span when not sampled
+    """
+    rate = TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate <= 0.0 or (rate < 1.0 and random.random() >= rate):
+        return _NOOP_SPAN
+    trace = _Trace(trace_id or uuid.uuid4().hex, emit)
+    return Span(trace, name, None, attributes)
+
+
+def span(name: str, **attributes):
+    """Open a child of the current span, or a no-op span outside a trace."""
+    parent = _current_span.get()
+    if parent is None:
+        return _NOOP_SPAN
+    return Span(parent.trace, name, parent, attributes)
+
+
+def current_span():
+    """The innermost open span (no-op span outside a trace)."""
+    return _current_span.get() or _NOOP_SPAN
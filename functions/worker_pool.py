@@ -0,0 +1,46 @@
+"""
+Shared worker pool for CPU-bound export work.
+The pool is created lazily on first use and reused across requests on the
+same instance, so worker start-up is paid once.
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def export_worker_count() -> int:
+    """Number of worker processes (EXPORT_WORKERS, defaulting to the CPU count)."""
+    return max(1, int(os.environ.get('EXPORT_WORKERS', os.cpu_count() or 1)))
+
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Return the shared process pool, creating it on first use.
+
+    Returns None when only one worker is configured, in which case callers
+    should run the work inline.
+    """
+    global _process_pool
+    workers = export_worker_count()
+    if workers < 2:
+        return None
+
+    with _pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=workers)
+        return _process_pool
+
+
+def shutdown_process_pool(wait: bool = True):
+    """Shut the shared process pool down (a later get_process_pool() starts a new one)."""
+    global _process_pool
+    with _pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait)
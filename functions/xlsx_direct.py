@@ -0,0 +1,544 @@
+"""
+Direct-XML workbook engine.
+The projection sheets have a fixed layout (the same columns and formats, one
+row per projected year), so their data rows do not need XlsxWriter's general
+cell path: a cell object per value in the sheet's cell table, dispatched by
+type and turned into XML when the workbook closes. DirectWorkbook worksheets
+render those rows straight into sheet XML from per-column templates. Every
+named style is pinned to a fixed index up front, so styles.xml and the row
+templates do not depend on write order.
+
+Parts that do not depend on the data (sheet header rows and row templates,
+chart parts outside their cached series data) are rendered once per layout
+variant and kept in a process-wide SkeletonCache, so on a warm instance a
+request only renders its own values.
+
+XlsxWriter still writes everything else (summary cells, column layout,
+drawings, styles) and assembles the package. It stays the reference engine;
+benchmarks/engine_check.py checks that both engines produce the same cell
+values and styles. The engine hooks into XlsxWriter internals, so it is only
+used with the XlsxWriter releases it was checked against
+(SUPPORTED_XLSXWRITER); with any other release workbooks fall back to the
+reference engine.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from io import StringIO
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import xlsxwriter
+from xlsxwriter.exceptions import EmptyChartSeries
+from xlsxwriter.format import Format
+from xlsxwriter.packager import Packager
+from xlsxwriter.worksheet import Worksheet
+from xlsxwriter.xmlwriter import XMLwriter
+
+from sheet_schema import col_letter
+
+
+# XlsxWriter releases benchmarks/engine_check.py has passed on: [first, end)
+# as (major, minor). Widen only after the check passes on the new release.
+SUPPORTED_XLSXWRITER = ((3, 2), (3, 3))
+
+
+def xlsxwriter_supported(version: str = xlsxwriter.__version__) -> bool:
+    """Whether an XlsxWriter version is in the range the direct engine was checked against."""
+    try:
+        release = tuple(int(part) for part in version.split('.')[:2])
+    except ValueError:
+        return False
+    first, end = SUPPORTED_XLSXWRITER
+    return first <= release < end
+
+
+# Whether the installed XlsxWriter can run the direct engine
+DIRECT_ENGINE_SUPPORTED = xlsxwriter_supported()
+
+
+def xf_index(cell_format: Format) -> int:
+    """Style index of a format, assigned now if it has none yet."""
+    return cell_format._get_xf_index()
+
+
+# Escaping of XML text exactly as XlsxWriter does it
+_XML = XMLwriter()
+
+# Text that needs xml:space="preserve" (leading or trailing whitespace, as in XlsxWriter)
+_PRESERVE_WHITESPACE = re.compile(r'^\s|\s$')
+
+# Text that XlsxWriter would change when escaping it
+_NEEDS_ESCAPING = re.compile(r'[&<>\x00-\x08\x0b-\x1f]|_x[0-9a-fA-F]{4}_')
+
+# Marks the data caches in a chart part rendered for its skeleton (control
+# characters never appear unescaped in chart XML)
+_CACHE_MARK = '\x00'
+
+
+def _xml_text(value) -> str:
+    """Text of a data element, escaped as XlsxWriter escapes it."""
+    if isinstance(value, str) and _NEEDS_ESCAPING.search(value):
+        return _XML._escape_control_characters(_XML._escape_data(value))
+    return f'{value}'
+
+
+class RowTemplate:
+    """
+    Sheet XML of one row style, compiled per column.
+
+    Each column has one str.format template per cell variant (value >= 0,
+    value < 0, blank), with the column letter and style index baked in; only
+    the row number and value are filled in per cell.
+    """
+
+    def __init__(self, positive: List[Format], negative: List[Format], blank: List[Format]):
+        """
+        Args:
+            positive: Per-column format of values >= 0
+            negative: Per-column format of values < 0
+            blank: Per-column format of empty cells
+        """
+        self.num_columns = len(positive)
+        self.cells = [
+            (
+                f'<c r="{col_letter(col)}{{0}}" s="{xf_index(positive[col])}"><v>{{1:.16G}}</v></c>',
+                f'<c r="{col_letter(col)}{{0}}" s="{xf_index(negative[col])}"><v>{{1:.16G}}</v></c>',
+                f'<c r="{col_letter(col)}{{0}}" s="{xf_index(blank[col])}"/>',
+            )
+            for col in range(self.num_columns)
+        ]
+
+
+class StaticRows:
+    """
+    Sheet XML of fixed rows (sheet headers), with their merged ranges.
+
+    Strings are written inline rather than through the workbook's shared
+    string table, so the XML is the same in every workbook.
+    """
+
+    def __init__(self, num_columns: int, cells: List[Tuple[int, int, int, str, Format]]):
+        """
+        Args:
+            num_columns: Width of the rows
+            cells: (row, first column, last column, text, format) in sheet order;
+                   a cell over several columns is merged, empty text is a formatted blank
+        """
+        self.num_columns = num_columns
+        self.merges: List[Tuple[int, int, int, int]] = []
+        cells_xml: Dict[int, List[str]] = {}
+        values: Dict[int, List[str]] = {}
+        for row, first_col, last_col, text, cell_format in cells:
+            style = xf_index(cell_format)
+            parts = cells_xml.setdefault(row, [])
+            if text:
+                preserve = ' xml:space="preserve"' if _PRESERVE_WHITESPACE.search(text) else ''
+                parts.append(f'<c r="{col_letter(first_col)}{row + 1}" s="{style}" t="inlineStr">'
+                             f'<is><t{preserve}>{_xml_text(text)}</t></is></c>')
+            else:
+                parts.append(f'<c r="{col_letter(first_col)}{row + 1}" s="{style}"/>')
+            # Merged cells after the first are formatted blanks
+            for col in range(first_col + 1, last_col + 1):
+                parts.append(f'<c r="{col_letter(col)}{row + 1}" s="{style}"/>')
+            if last_col > first_col:
+                self.merges.append((row, first_col, row, last_col))
+            values.setdefault(row, [''] * num_columns)[first_col] = text
+
+        # (row, cells XML, cell values) in row order
+        self.rows = [(row, ''.join(cells_xml[row]), values[row]) for row in sorted(cells_xml)]
+
+
+@dataclass
+class SheetSkeleton:
+    """Static XML of a projection sheet: header rows and data row templates."""
+    header: StaticRows
+    row_xml: RowTemplate      # odd sheet rows
+    alt_row_xml: RowTemplate  # even sheet rows
+
+
+class SkeletonCache:
+    """Process-wide LRU of rendered skeletons, keyed by layout variant."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[tuple, object]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters for benchmarks and logs
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple):
+        """Cached skeleton, or None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value):
+        """Cache a skeleton, evicting the least recently used beyond max_entries."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every skeleton (benchmarks use it to time cold workbooks)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current entry count."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+
+def create_skeleton_cache_from_env() -> Optional[SkeletonCache]:
+    """
+    Build the process-wide skeleton cache from environment variables.
+
+    EXPORT_SKELETON_CACHE_ENTRIES  Skeletons kept per process (default 256, 0 disables caching)
+
+    Skeletons are rendered with XlsxWriter internals, so there is no cache
+    when the installed XlsxWriter is outside SUPPORTED_XLSXWRITER.
+    """
+    max_entries = int(os.environ.get('EXPORT_SKELETON_CACHE_ENTRIES', 256))
+    if max_entries <= 0 or not DIRECT_ENGINE_SUPPORTED:
+        return None
+    return SkeletonCache(max_entries)
+
+
+# Shared by every direct workbook in the process
+skeleton_cache = create_skeleton_cache_from_env()
+
+
+def _data_type(data) -> str:
+    """Type of a chart range's cached data, as Chart._get_data_type() decides it."""
+    if data is None or len(data) == 0:
+        return 'none'
+    if isinstance(data[0], list):
+        return 'multi_str'
+    for token in data:
+        if token is None:
+            continue
+        if isinstance(token, str) and ('_' in token or ' ' in token):
+            return 'str'
+        try:
+            float(token)
+        except ValueError:
+            return 'str'
+    return 'num'
+
+
+def _num_cache_xml(data) -> str:
+    """<c:numCache> of a range, as Chart._write_num_cache() writes it."""
+    count = len(data) if data else 0
+    parts = [f'<c:numCache><c:formatCode>General</c:formatCode><c:ptCount val="{count}"/>']
+    for idx in range(count):
+        token = data[idx]
+        if token is None:
+            continue
+        try:
+            float(token)
+        except ValueError:
+            # Non-numeric data is cached as 0
+            token = 0
+        parts.append(f'<c:pt idx="{idx}"><c:v>{_xml_text(token)}</c:v></c:pt>')
+    parts.append('</c:numCache>')
+    return ''.join(parts)
+
+
+def _str_cache_xml(data) -> str:
+    """<c:strCache> of a range, as Chart._write_str_cache() writes it."""
+    parts = [f'<c:strCache><c:ptCount val="{len(data)}"/>']
+    for idx, token in enumerate(data):
+        if token is not None:
+            parts.append(f'<c:pt idx="{idx}"><c:v>{_xml_text(token)}</c:v></c:pt>')
+    parts.append('</c:strCache>')
+    return ''.join(parts)
+
+
+class ChartSkeleton:
+    """
+    Chart part XML with its data caches (numCache/strCache) cut out.
+
+    The rest of the part depends only on the chart's definition, its id and
+    the types of its range data, so it is rendered once; each workbook then
+    fills in the caches from its own range data.
+    """
+
+    def __init__(self, segments: List[str], slots: List[Tuple[int, int, str]]):
+        """
+        Args:
+            segments: XML before, between and after the caches
+            slots: (chart, formula data id, 'num' or 'str') of each cache, in
+                   document order; chart 1 is the combined chart
+        """
+        self.segments = segments
+        self.slots = slots
+
+    def render(self, charts: List) -> str:
+        """Chart part XML filled in with the charts' range data."""
+        parts = [self.segments[0]]
+        for (chart_idx, data_id, kind), segment in zip(self.slots, self.segments[1:]):
+            data = charts[chart_idx].formula_data[data_id]
+            parts.append(_num_cache_xml(data) if kind == 'num' else _str_cache_xml(data))
+            parts.append(segment)
+        return ''.join(parts)
+
+
+def _chart_group(chart) -> List:
+    """A chart and the chart combined with it, if any."""
+    return [chart, chart.combined] if chart.combined is not None else [chart]
+
+
+def capture_chart(chart) -> Tuple[str, Optional[ChartSkeleton]]:
+    """
+    Render a chart part with XlsxWriter, recording where its data caches go.
+
+    Returns:
+        (chart part XML, its skeleton or None when a cache could not be traced
+        back to the chart's range data)
+    """
+    charts = _chart_group(chart)
+    slots = []
+
+    def recorder(chart_idx: int, owner, kind: str):
+        write_cache = getattr(type(owner), f'_write_{kind}_cache')
+
+        def record(data):
+            data_id = next((idx for idx, entry in enumerate(owner.formula_data) if entry is data), None)
+            slots.append(None if data_id is None else (chart_idx, data_id, kind))
+            owner.fh.write(_CACHE_MARK)
+            write_cache(owner, data)
+            owner.fh.write(_CACHE_MARK)
+        return record
+
+    for chart_idx, owner in enumerate(charts):
+        owner._write_num_cache = recorder(chart_idx, owner, 'num')
+        owner._write_str_cache = recorder(chart_idx, owner, 'str')
+    buffer = StringIO()
+    try:
+        chart._set_filehandle(buffer)
+        chart._assemble_xml_file()
+    finally:
+        for owner in charts:
+            del owner._write_num_cache, owner._write_str_cache
+
+    # Even parts are the skeleton, odd parts XlsxWriter's caches
+    parts = buffer.getvalue().split(_CACHE_MARK)
+    skeleton = None
+    if None not in slots and len(parts) == 2 * len(slots) + 1:
+        skeleton = ChartSkeleton(parts[0::2], slots)
+    return ''.join(parts), skeleton
+
+
+class DirectWorksheet(Worksheet):
+    """Worksheet that can also take whole blocks of rows as precompiled XML."""
+
+    def __init__(self):
+        super().__init__()
+        self._row_xml: List[str] = []
+        # (first row, rows) of each block, read back for chart caches in memory mode
+        self._row_blocks: List[Tuple[int, List[Sequence]]] = []
+
+    def _row_sink(self, first_row: int, num_columns: int) -> Tuple[Callable[[str], object], str]:
+        """Where row XML goes from first_row on, and the spans attribute of its rows."""
+        if self.constant_memory:
+            # Flush the last row written through the regular API; the rows
+            # then go straight to the row data file, without spans
+            if first_row > self.previous_row:
+                self._write_single_row(first_row)
+            return self.fh.write, ''
+        return self._row_xml.append, f' spans="1:{num_columns}"'
+
+    def write_static_rows(self, static_rows: StaticRows):
+        """
+        Write pre-rendered rows and their merged ranges.
+
+        Like write_rows(), they must come after any cell written through the
+        regular API.
+        """
+        if not static_rows.rows:
+            return
+        emit, spans = self._row_sink(static_rows.rows[0][0], static_rows.num_columns)
+        for row, cells_xml, values in static_rows.rows:
+            emit(f'<row r="{row + 1}"{spans}>{cells_xml}</row>')
+            if not self.constant_memory:
+                self._row_blocks.append((row, [values]))
+        self.merge.extend(list(merge) for merge in static_rows.merges)
+
+        last_row = static_rows.rows[-1][0]
+        self._check_dimensions(static_rows.rows[0][0], 0)
+        self._check_dimensions(last_row, static_rows.num_columns - 1)
+        if self.constant_memory:
+            self.previous_row = last_row
+
+    def write_rows(self, first_row: int, rows: Iterable[Sequence], row_template: RowTemplate,
+                   alt_row_template: Optional[RowTemplate] = None) -> int:
+        """
+        Write data rows of numbers (None for a formatted blank) from row templates.
+
+        The rows must be the last ones of the sheet: cells written through the
+        regular API go before them.
+
+        Args:
+            first_row: Sheet row of the first data row (0-based)
+            rows: One value per template column for each row
+            row_template: Template of odd sheet rows
+            alt_row_template: Template of even sheet rows (defaults to row_template)
+
+        Returns:
+            Number of rows written
+        """
+        alt_row_template = alt_row_template or row_template
+        num_columns = row_template.num_columns
+        plain_cells = row_template.cells
+        alt_cells = alt_row_template.cells
+
+        emit, spans = self._row_sink(first_row, num_columns)
+        if not self.constant_memory:
+            rows = list(rows)
+            self._row_blocks.append((first_row, rows))
+
+        row_idx = first_row - 1
+        for row_idx, values in enumerate(rows, start=first_row):
+            row_number = row_idx + 1
+            parts = [f'<row r="{row_number}"{spans}>']
+            append = parts.append
+            for (positive, negative, blank), value in zip(alt_cells if row_idx % 2 == 0 else plain_cells, values):
+                if value is None:
+                    append(blank.format(row_number))
+                elif value < 0:
+                    append(negative.format(row_number, value))
+                else:
+                    append(positive.format(row_number, value))
+            append('</row>')
+            row_xml = ''.join(parts)
+            if 'NAN' in row_xml or 'INF' in row_xml:
+                # Same rule as Worksheet.write_number()
+                raise TypeError("NAN/INF not supported in write_rows()")
+            emit(row_xml)
+
+        written = row_idx - first_row + 1
+        if written:
+            self._check_dimensions(first_row, 0)
+            self._check_dimensions(row_idx, num_columns - 1)
+            if self.constant_memory:
+                self.previous_row = row_idx
+        return written
+
+    def _get_range_data(self, row_start, col_start, row_end, col_end):
+        # Chart cache data: values of the precompiled rows, the cell table for the rest
+        if not self._row_blocks:
+            return super()._get_range_data(row_start, col_start, row_end, col_end)
+        data = []
+        for row_num in range(row_start, row_end + 1):
+            values = self._block_row(row_num)
+            if values is None:
+                data.extend(super()._get_range_data(row_num, col_start, row_num, col_end))
+                continue
+            for col_num in range(col_start, col_end + 1):
+                if col_num >= len(values):
+                    data.append(None)
+                elif values[col_num] is None:
+                    data.append('')
+                elif isinstance(values[col_num], str):
+                    data.append(values[col_num])
+                else:
+                    data.append(f'{values[col_num]:.16g}')
+        return data
+
+    def _block_row(self, row_num: int) -> Optional[Sequence]:
+        """Values of a precompiled row, or None when the row is not in a block."""
+        for first_row, rows in self._row_blocks:
+            if first_row <= row_num < first_row + len(rows):
+                return rows[row_num - first_row]
+        return None
+
+    def _write_rows(self):
+        # Cells from the regular API first, then the precompiled rows
+        super()._write_rows()
+        for row_xml in self._row_xml:
+            self.fh.write(row_xml)
+
+
+class DirectPackager(Packager):
+    """Packager that writes chart parts through DirectWorkbook.chart_xml()."""
+
+    def _write_chart_files(self):
+        for index, chart in enumerate(self.workbook.charts, start=1):
+            # Check that the chart has at least one data series
+            if not chart.series:
+                raise EmptyChartSeries(f"Chart{index} must contain at least one data series. "
+                                       f"See chart.add_series().")
+            chart._set_xml_writer(self._filename(f'xl/charts/chart{index}.xml'))
+            chart.fh.write(self.workbook.chart_xml(chart))
+            chart._xml_close()
+
+
+class DirectWorkbook(xlsxwriter.Workbook):
+    """XlsxWriter workbook whose worksheets accept precompiled rows and whose charts reuse skeletons."""
+    worksheet_class = DirectWorksheet
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._chart_keys: Dict[int, tuple] = {}
+
+        # Skeletons reused from / added to the cache by this workbook
+        self.skeleton_hits = 0
+        self.skeleton_misses = 0
+
+    def add_chart(self, options: Dict, skeleton_key: Optional[tuple] = None):
+        """
+        Add a chart. skeleton_key names everything the chart's definition
+        depends on (ranges, titles, series); charts with the same key, id and
+        range data types share one rendered skeleton.
+        """
+        chart = super().add_chart(options)
+        if skeleton_key is not None:
+            self._chart_keys[id(chart)] = skeleton_key
+        return chart
+
+    def skeleton(self, key: tuple, build: Callable[[], object]):
+        """Cached skeleton for key, built and cached on a miss."""
+        if skeleton_cache is None:
+            return build()
+        value = skeleton_cache.get(key)
+        if value is not None:
+            self.skeleton_hits += 1
+            return value
+        value = build()
+        skeleton_cache.put(key, value)
+        self.skeleton_misses += 1
+        return value
+
+    def chart_xml(self, chart) -> str:
+        """XML of a chart part, from its cached skeleton when there is one."""
+        key = self._chart_keys.get(id(chart))
+        if key is None or skeleton_cache is None:
+            return capture_chart(chart)[0]
+
+        charts = _chart_group(chart)
+        key = ('chart', key, chart.id, tuple(_data_type(data) for owner in charts for data in owner.formula_data))
+        skeleton = skeleton_cache.get(key)
+        if skeleton is not None:
+            self.skeleton_hits += 1
+            return skeleton.render(charts)
+
+        xml, skeleton = capture_chart(chart)
+        if skeleton is not None:
+            skeleton_cache.put(key, skeleton)
+            self.skeleton_misses += 1
+        return xml
+
+    def _get_packager(self):
+        return DirectPackager()